@@ -1,25 +1,55 @@
+import bisect
+import hashlib
 import heapq
-from collections import defaultdict
+from array import array
+from collections import deque
+
+import numpy as np
 
 # --- árvore  ---
 class NoAVL:
+    __slots__ = ("chave", "valor", "esquerda", "direita", "altura", "tamanho")
+
     def __init__(self, chave, valor):
         self.chave = chave
         self.valor = valor
         self.esquerda = None
         self.direita = None
         self.altura = 1
+        self.tamanho = 1  # nós na subárvore, para as estatísticas de ordem
 
 class ArvoreAVL:
- 
+    """
+    índice ordenado por chave. Inserção, busca e remoção são iterativas
+    (O(log n), sem limite de recursão); cada nó guarda o tamanho da
+    subárvore, o que dá k-ésima chave e posto em O(log n).
+    """
+
+    def __init__(self):
+        self.raiz = None
+
+    def __len__(self):
+        return self._tamanho(self.raiz)
+
+    def __contains__(self, chave):
+        return self.buscar(chave) is not None
+
+    def __iter__(self):
+        return self.travessia_em_ordem()
+
     def _altura(self, no):
         if not no:
             return 0
         return no.altura
 
+    @staticmethod
+    def _tamanho(no):
+        return no.tamanho if no else 0
+
     def _atualizar_altura(self, no):
         if no:
             no.altura = 1 + max(self._altura(no.esquerda), self._altura(no.direita))
+            no.tamanho = 1 + self._tamanho(no.esquerda) + self._tamanho(no.direita)
 
     def _get_balance(self, no):
         if not no:
@@ -50,155 +80,676 @@ class ArvoreAVL:
 
         return y
 
-    def inserir(self, chave, valor):
-        """Insere um novo nó na árvore AVL."""
-        self.raiz = self._inserir(self.raiz, chave, valor)
-
-    def _inserir(self, no, chave, valor):
-        if not no:
-            return NoAVL(chave, valor)
-
-        if chave < no.chave:
-            no.esquerda = self._inserir(no.esquerda, chave, valor)
-        elif chave > no.chave:
-            no.direita = self._inserir(no.direita, chave, valor)
-        else:
-            no.valor = valor 
-            return no
-
+    def _rebalancear(self, no):
         self._atualizar_altura(no)
-
         balance = self._get_balance(no)
 
-
-        if balance > 1 and chave < no.esquerda.chave:
+        if balance > 1:
+            if self._get_balance(no.esquerda) < 0:
+                no.esquerda = self._rotacao_esquerda(no.esquerda)
             return self._rotacao_direita(no)
 
-        if balance < -1 and chave > no.direita.chave:
+        if balance < -1:
+            if self._get_balance(no.direita) > 0:
+                no.direita = self._rotacao_direita(no.direita)
             return self._rotacao_esquerda(no)
 
-        if balance > 1 and chave > no.esquerda.chave:
-            no.esquerda = self._rotacao_esquerda(no.esquerda)
-            return self._rotacao_direita(no)
+        return no
 
-        if balance < -1 and chave < no.direita.chave:
-            no.direita = self._rotacao_direita(no.direita)
-            return self._rotacao_esquerda(no)
+    def _religar_caminho(self, caminho, no):
+        # sobe pelo caminho (lista de (pai, foi_pela_esquerda)) rebalanceando
+        # cada ancestral e religando a subárvore resultante ao pai
+        while caminho:
+            pai, pela_esquerda = caminho.pop()
+            if pela_esquerda:
+                pai.esquerda = no
+            else:
+                pai.direita = no
+            no = self._rebalancear(pai)
+        self.raiz = no
 
-        return no
+    def inserir(self, chave, valor):
+        """Insere um novo nó na árvore AVL."""
+        caminho = []
+        no = self.raiz
+        while no:
+            if chave < no.chave:
+                caminho.append((no, True))
+                no = no.esquerda
+            elif chave > no.chave:
+                caminho.append((no, False))
+                no = no.direita
+            else:
+                no.valor = valor
+                return
+        self._religar_caminho(caminho, NoAVL(chave, valor))
+
+    def remover(self, chave):
+        """remove a chave da árvore; retorna o valor removido, ou None se ela não existir."""
+        caminho = []
+        no = self.raiz
+        while no and no.chave != chave:
+            pela_esquerda = chave < no.chave
+            caminho.append((no, pela_esquerda))
+            no = no.esquerda if pela_esquerda else no.direita
+        if not no:
+            return None
+        valor = no.valor
+
+        if no.esquerda and no.direita:
+            # troca pelo sucessor (mínimo da subárvore direita) e remove o sucessor
+            caminho.append((no, False))
+            sucessor = no.direita
+            while sucessor.esquerda:
+                caminho.append((sucessor, True))
+                sucessor = sucessor.esquerda
+            no.chave, no.valor = sucessor.chave, sucessor.valor
+            no = sucessor
+
+        substituto = no.esquerda or no.direita
+        if caminho:
+            self._religar_caminho(caminho, substituto)
+        else:
+            self.raiz = substituto
+        return valor
 
     def buscar(self, chave):
         """busca um nó na árvore AVL pela chave."""
-        return self._buscar(self.raiz, chave)
+        no = self.raiz
+        while no and no.chave != chave:
+            no = no.esquerda if chave < no.chave else no.direita
+        return no
 
-    def _buscar(self, no, chave):
-        if not no or no.chave == chave:
+    def travessia_em_ordem(self, no=None):
+        """gera os pares (chave, valor) em ordem a partir de `no` (por padrão, a raiz)."""
+        pilha = []
+        no = self.raiz if no is None else no
+        while pilha or no:
+            while no:
+                pilha.append(no)
+                no = no.esquerda
+            no = pilha.pop()
+            yield no.chave, no.valor
+            no = no.direita
+
+    def intervalo(self, chave_inicio=None, chave_fim=None):
+        """gera em ordem os pares com chave_inicio <= chave <= chave_fim (None = sem limite)."""
+        pilha = []
+        no = self.raiz
+        while pilha or no:
+            while no:
+                if chave_inicio is not None and no.chave < chave_inicio:
+                    no = no.direita  # a subárvore esquerda inteira está antes do intervalo
+                else:
+                    pilha.append(no)
+                    no = no.esquerda
+            if not pilha:
+                return
+            no = pilha.pop()
+            if chave_fim is not None and no.chave > chave_fim:
+                return
+            yield no.chave, no.valor
+            no = no.direita
+
+    def k_esimo(self, k):
+        """retorna o par (chave, valor) de posição k (a partir de 0) na ordem das chaves."""
+        if not 0 <= k < len(self):
+            raise IndexError("posição fora da árvore")
+        no = self.raiz
+        while True:
+            esquerda = self._tamanho(no.esquerda)
+            if k < esquerda:
+                no = no.esquerda
+            elif k == esquerda:
+                return no.chave, no.valor
+            else:
+                k -= esquerda + 1
+                no = no.direita
+
+    def posto(self, chave):
+        """quantidade de chaves estritamente menores que `chave`."""
+        posto = 0
+        no = self.raiz
+        while no:
+            if chave <= no.chave:
+                no = no.esquerda
+            else:
+                posto += self._tamanho(no.esquerda) + 1
+                no = no.direita
+        return posto
+
+    @classmethod
+    def de_ordenados(cls, itens):
+        """
+        constrói a árvore em O(n) a partir de pares (chave, valor) com chaves
+        estritamente crescentes, escolhendo a mediana de cada faixa como raiz.
+        """
+        itens = list(itens)
+        for anterior, atual in zip(itens, itens[1:]):
+            if not anterior[0] < atual[0]:
+                raise ValueError("as chaves devem estar em ordem estritamente crescente")
+        arvore = cls()
+
+        def construir(inicio, fim):
+            # a profundidade da recursão é O(log n)
+            if inicio >= fim:
+                return None
+            meio = (inicio + fim) // 2
+            no = NoAVL(*itens[meio])
+            no.esquerda = construir(inicio, meio)
+            no.direita = construir(meio + 1, fim)
+            arvore._atualizar_altura(no)
             return no
 
-        if chave < no.chave:
-            return self._buscar(no.esquerda, chave)
-        return self._buscar(no.direita, chave)
-
-    def travessia_em_ordem(self, no):
-        """faz a travessia em-ordem na árvore (para depuração/visualização)."""
-        if no:
-            self.travessia_em_ordem(no.esquerda)
-            print(f"  - {no.chave}: {no.valor}")
-            self.travessia_em_ordem(no.direita)
-
-    def __init__(self):
-        self.raiz = None
+        arvore.raiz = construir(0, len(itens))
+        return arvore
 
 
 class MinHeap:
  
     def __init__(self):
         self.heap = []
-        self.tamanho = 0
+
+    @property
+    def tamanho(self):
+        return len(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
 
     def inserir(self, prioridade, item):
         """insere um item no heap com uma dada prioridade."""
         # heapq 
         heapq.heappush(self.heap, (prioridade, item))
-        self.tamanho += 1
 
     def extrair_minimo(self):
         """remove e retorna o item de maior prioridade (menor valor)."""
-        if self.tamanho == 0:
+        if not self.heap:
             return None
-        self.tamanho -= 1
         return heapq.heappop(self.heap)
 
     def esta_vazio(self):
         """verifica se o heap está vazio."""
-        return self.tamanho == 0
+        return not self.heap
 
-class Grafo:
 
+class FilaPrioridadeIndexada:
+    """
+    heap binário de mínimo indexado por chave (ex.: (unidade, material)).
+    Cada chave aparece uma única vez; `atualizar` altera a prioridade no lugar
+    em O(log n), `remover` tira qualquer chave em O(log n) e `topo` é O(1).
+    Empates são desfeitos pela ordem de inserção, sem comparar as chaves.
+    """
+
+    def __init__(self):
+        self._heap = []  # entradas [prioridade, sequencia, chave]
+        self._posicoes = {}  # chave -> índice no heap
+        self._sequencia = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, chave):
+        return chave in self._posicoes
+
+    def esta_vazio(self):
+        return not self._heap
+
+    def prioridade(self, chave):
+        """prioridade atual da chave, ou None se ela não estiver na fila."""
+        posicao = self._posicoes.get(chave)
+        return None if posicao is None else self._heap[posicao][0]
+
+    def atualizar(self, chave, prioridade):
+        """insere a chave ou altera sua prioridade (diminuição ou aumento)."""
+        posicao = self._posicoes.get(chave)
+        if posicao is None:
+            self._heap.append([prioridade, self._sequencia, chave])
+            self._sequencia += 1
+            posicao = len(self._heap) - 1
+            self._posicoes[chave] = posicao
+            self._subir(posicao)
+            return
+        anterior = self._heap[posicao][0]
+        self._heap[posicao][0] = prioridade
+        if prioridade < anterior:
+            self._subir(posicao)
+        elif prioridade > anterior:
+            self._descer(posicao)
+
+    def remover(self, chave):
+        """remove a chave; retorna sua prioridade, ou None se ela não estiver na fila."""
+        posicao = self._posicoes.pop(chave, None)
+        if posicao is None:
+            return None
+        entrada = self._heap[posicao]
+        ultima = self._heap.pop()
+        if posicao < len(self._heap):
+            self._heap[posicao] = ultima
+            self._posicoes[ultima[2]] = posicao
+            self._subir(posicao)
+            self._descer(self._posicoes[ultima[2]])
+        return entrada[0]
+
+    def topo(self):
+        """retorna (prioridade, chave) de menor prioridade sem removê-la, ou None."""
+        if not self._heap:
+            return None
+        prioridade, _, chave = self._heap[0]
+        return prioridade, chave
+
+    def extrair_minimo(self):
+        """remove e retorna (prioridade, chave) de menor prioridade, ou None."""
+        topo = self.topo()
+        if topo is not None:
+            self.remover(topo[1])
+        return topo
+
+    def menores(self, k):
+        """
+        os k pares (prioridade, chave) de menor prioridade, em ordem, sem alterar
+        a fila. Explora o heap a partir da raiz com um heap auxiliar: O(k log k).
+        """
+        resultado = []
+        if k <= 0 or not self._heap:
+            return resultado
+        candidatos = [(self._heap[0][0], self._heap[0][1], 0)]
+        while candidatos and len(resultado) < k:
+            prioridade, _, posicao = heapq.heappop(candidatos)
+            resultado.append((prioridade, self._heap[posicao][2]))
+            for filho in (2 * posicao + 1, 2 * posicao + 2):
+                if filho < len(self._heap):
+                    entrada = self._heap[filho]
+                    heapq.heappush(candidatos, (entrada[0], entrada[1], filho))
+        return resultado
+
+    def _menor(self, i, j):
+        a, b = self._heap[i], self._heap[j]
+        return (a[0], a[1]) < (b[0], b[1])
+
+    def _trocar(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._posicoes[heap[i][2]] = i
+        self._posicoes[heap[j][2]] = j
+
+    def _subir(self, posicao):
+        while posicao > 0:
+            pai = (posicao - 1) // 2
+            if not self._menor(posicao, pai):
+                break
+            self._trocar(posicao, pai)
+            posicao = pai
+
+    def _descer(self, posicao):
+        tamanho = len(self._heap)
+        while True:
+            menor = posicao
+            for filho in (2 * posicao + 1, 2 * posicao + 2):
+                if filho < tamanho and self._menor(filho, menor):
+                    menor = filho
+            if menor == posicao:
+                return
+            self._trocar(posicao, menor)
+            posicao = menor
+
+class Grafo:
+    """
+    grafo não direcionado com vértices internados como ids inteiros. As arestas
+    ficam em arrays compactos e a adjacência é montada sob demanda em formato
+    CSR (inicio/vizinhos/pesos, em array.array de int64 e, conforme os pesos,
+    int64 ou float64, com indexação escalar rápida para os laços de busca);
+    qualquer alteração da rede invalida a CSR, os componentes e a tabela de
+    caminhos em cache.
+    """
     def __init__(self):
-        self.grafo = defaultdict(list) 
-        self.vertices = set()
+        self._ids = {}  # vértice -> id
+        self._rotulos = []  # id -> vértice
+        self._origens = array('q')
+        self._destinos = array('q')
+        self._pesos = []
+        self._csr = None  # (inicio, vizinhos, pesos) como array.array
+        self._componentes = None
+        self._tabela = None  # matrizes (distancias, proximo_salto) de todos os pares, por id
+
+    @property
+    def vertices(self):
+        return self._ids.keys()
+
+    def _invalidar(self):
+        self._csr = None
+        self._componentes = None
+        self._tabela = None
+
+    def limpar_cache(self):
+        """descarta a adjacência, os componentes e a tabela de caminhos em cache (recalculados sob demanda)."""
+        self._invalidar()
 
     def adicionar_vertice(self, vertice):
         """adiciona um vértice ao grafo."""
-        self.vertices.add(vertice)
+        if vertice not in self._ids:
+            self._ids[vertice] = len(self._rotulos)
+            self._rotulos.append(vertice)
+            self._invalidar()
+        return self._ids[vertice]
+
+    def id_vertice(self, vertice):
+        """id interno do vértice (linha/coluna das matrizes de `tabela_caminhos`), ou None."""
+        return self._ids.get(vertice)
 
     def adicionar_aresta(self, u, v, peso=1):
-        """adiciona uma aresta (direcional) entre u e v com um peso."""
-        self.adicionar_vertice(u)
-        self.adicionar_vertice(v)
-        self.grafo[u].append((v, peso))
-        self.grafo[v].append((u, peso)) 
+        """adiciona uma aresta não direcionada entre u e v com um peso (percorrível nos dois sentidos)."""
+        id_u = self.adicionar_vertice(u)
+        id_v = self.adicionar_vertice(v)
+        self._origens.extend((id_u, id_v))
+        self._destinos.extend((id_v, id_u))
+        self._pesos.extend((peso, peso))
+        self._invalidar()
+
+    def num_vertices(self):
+        return len(self._rotulos)
+
+    def num_arestas(self):
+        return len(self._pesos) // 2
+
+    def _adjacencia(self):
+        # CSR: os vizinhos do vértice i são vizinhos[inicio[i]:inicio[i + 1]],
+        # na ordem de inserção das arestas
+        if self._csr is None:
+            n = len(self._rotulos)
+            origens = np.frombuffer(self._origens, dtype=np.int64) if self._origens else np.zeros(0, dtype=np.int64)
+            ordem = np.argsort(origens, kind="stable")
+            inicio = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(origens, minlength=n), out=inicio[1:])
+            vizinhos = np.frombuffer(self._destinos, dtype=np.int64)[ordem] if self._destinos else ordem
+            pesos = np.asarray(self._pesos)
+            # pesos inteiros continuam inteiros, para as distâncias saírem no mesmo tipo
+            tipo = "q" if pesos.dtype.kind in "iu" else "d"
+            pesos = pesos[ordem].astype(np.int64 if tipo == "q" else np.float64)
+            self._csr = (array("q", inicio.tobytes()), array("q", vizinhos.tobytes()), array(tipo, pesos.tobytes()))
+        return self._csr
+
+    def vizinhos(self, vertice):
+        """lista de (vizinho, peso) de um vértice."""
+        inicio, vizinhos, pesos = self._adjacencia()
+        i = self._ids[vertice]
+        return [(self._rotulos[vizinhos[k]], pesos[k]) for k in range(inicio[i], inicio[i + 1])]
 
     def bfs(self, inicio):
         """executa Busca em Largura (BFS) a partir de um vértice inicial."""
-        visitados = set()
-        fila = [inicio]
-        visitados.add(inicio)
+        if inicio not in self._ids:
+            return [inicio]
+        comeco, vizinhos, _ = self._adjacencia()
+        visitados = bytearray(len(self._rotulos))
+        origem = self._ids[inicio]
+        visitados[origem] = 1
+        fila = deque([origem])
         ordem_visita = []
 
         while fila:
-            vertice_atual = fila.pop(0)
+            vertice_atual = fila.popleft()
             ordem_visita.append(vertice_atual)
 
-            for vizinho, _ in self.grafo[vertice_atual]:
-                if vizinho not in visitados:
-                    visitados.add(vizinho)
+            for k in range(comeco[vertice_atual], comeco[vertice_atual + 1]):
+                vizinho = vizinhos[k]
+                if not visitados[vizinho]:
+                    visitados[vizinho] = 1
                     fila.append(vizinho)
-        return ordem_visita
+        return [self._rotulos[i] for i in ordem_visita]
 
     def dfs(self, inicio, visitados=None):
+        """busca em profundidade iterativa (mesma ordem de visita da versão recursiva)."""
         if visitados is None:
             visitados = set()
-        
-        ordem_visita = []
-
-        def _dfs_recursivo(vertice):
-            visitados.add(vertice)
-            ordem_visita.append(vertice)
-            for vizinho, _ in self.grafo[vertice]:
-                if vizinho not in visitados:
-                    _dfs_recursivo(vizinho)
-
-        _dfs_recursivo(inicio)
+        if inicio not in self._ids:
+            visitados.add(inicio)
+            return [inicio]
+        comeco, vizinhos, _ = self._adjacencia()
+        marcados = bytearray(len(self._rotulos))
+        for vertice in visitados:
+            if vertice in self._ids:
+                marcados[self._ids[vertice]] = 1
+
+        origem = self._ids[inicio]
+        marcados[origem] = 1
+        ordem_visita = [origem]
+        pilha = [(origem, comeco[origem])]  # (vértice, próximo vizinho a examinar)
+        while pilha:
+            vertice_atual, k = pilha[-1]
+            fim = comeco[vertice_atual + 1]
+            while k < fim and marcados[vizinhos[k]]:
+                k += 1
+            if k == fim:
+                pilha.pop()
+                continue
+            pilha[-1] = (vertice_atual, k + 1)
+            vizinho = vizinhos[k]
+            marcados[vizinho] = 1
+            ordem_visita.append(vizinho)
+            pilha.append((vizinho, comeco[vizinho]))
+
+        ordem_visita = [self._rotulos[i] for i in ordem_visita]
+        visitados.update(ordem_visita)
         return ordem_visita
 
-    def dijkstra(self, inicio):
-        """implementa o algoritmo de Dijkstra para encontrar o caminho mais curto."""
-        distancias = {vertice: float('inf') for vertice in self.vertices}
-        distancias[inicio] = 0
-        fila_prioridade = [(0, inicio)] # (distancia, vertice)
+    def _rotulos_componentes(self):
+        if self._componentes is None:
+            comeco, vizinhos, _ = self._adjacencia()
+            componente = [-1] * len(self._rotulos)
+            proximo = 0
+            for raiz in range(len(self._rotulos)):
+                if componente[raiz] != -1:
+                    continue
+                componente[raiz] = proximo
+                pilha = [raiz]
+                while pilha:
+                    vertice_atual = pilha.pop()
+                    for k in range(comeco[vertice_atual], comeco[vertice_atual + 1]):
+                        vizinho = vizinhos[k]
+                        if componente[vizinho] == -1:
+                            componente[vizinho] = proximo
+                            pilha.append(vizinho)
+                proximo += 1
+            self._componentes = componente
+        return self._componentes
+
+    def componentes_conexos(self):
+        """lista dos componentes conexos (listas de vértices), em tempo linear."""
+        componentes = {}
+        for i, componente in enumerate(self._rotulos_componentes()):
+            componentes.setdefault(componente, []).append(self._rotulos[i])
+        return list(componentes.values())
+
+    def alcancavel(self, origem, destino):
+        """indica se há rota entre os dois vértices; O(1) após o primeiro cálculo dos componentes."""
+        if origem not in self._ids or destino not in self._ids:
+            return False
+        componentes = self._rotulos_componentes()
+        return componentes[self._ids[origem]] == componentes[self._ids[destino]]
+
+    def _dijkstra_ids(self, origem, destino=None, alvos=None):
+        # retorna (distancias, anteriores) por id; com `destino` (ou o conjunto
+        # `alvos`), para quando ele (ou o último deles) sai da fila
+        comeco, vizinhos, pesos = self._adjacencia()
+        distancias = {origem: 0}
+        anteriores = {origem: None}
+        fila_prioridade = [(0, origem)] # (distancia, vertice)
+        pendentes = None if alvos is None else set(alvos)
 
         while fila_prioridade:
             dist_atual, vertice_atual = heapq.heappop(fila_prioridade)
 
             if dist_atual > distancias[vertice_atual]:
                 continue
-
-            for vizinho, peso in self.grafo[vertice_atual]:
-                distancia = dist_atual + peso
-                if distancia < distancias[vizinho]:
+            if vertice_atual == destino:
+                break
+            if pendentes is not None:
+                pendentes.discard(vertice_atual)
+                if not pendentes:
+                    break
+
+            for k in range(comeco[vertice_atual], comeco[vertice_atual + 1]):
+                vizinho = vizinhos[k]
+                distancia = dist_atual + pesos[k]
+                if distancia < distancias.get(vizinho, float('inf')):
                     distancias[vizinho] = distancia
+                    anteriores[vizinho] = vertice_atual
                     heapq.heappush(fila_prioridade, (distancia, vizinho))
-        
-        return {k: v for k, v in distancias.items() if v != float('inf')} 
\ No newline at end of file
+        return distancias, anteriores
+
+    def dijkstra(self, inicio):
+        """implementa o algoritmo de Dijkstra para encontrar o caminho mais curto."""
+        if inicio not in self._ids:
+            return {inicio: 0}
+        distancias, _ = self._dijkstra_ids(self._ids[inicio])
+        return {self._rotulos[i]: d for i, d in distancias.items()}
+
+    def caminho_mais_curto(self, origem, destino):
+        """
+        retorna (distancia, caminho) de origem até destino, ou None se não houver
+        rota. Usa a tabela de todos os pares se já calculada; senão executa um
+        Dijkstra que para assim que o destino sai da fila.
+        """
+        if origem not in self._ids or destino not in self._ids:
+            return None
+        if self._tabela is not None:
+            distancia = self.distancia(origem, destino)
+            return None if distancia is None else (distancia, self.rota(origem, destino))
+
+        id_destino = self._ids[destino]
+        distancias, anteriores = self._dijkstra_ids(self._ids[origem], id_destino)
+        if id_destino not in distancias:
+            return None
+        caminho = []
+        vertice = id_destino
+        while vertice is not None:
+            caminho.append(self._rotulos[vertice])
+            vertice = anteriores[vertice]
+        return distancias[id_destino], caminho[::-1]
+
+    def distancias_de(self, origem, destinos):
+        """
+        {destino: distância mínima} da origem a cada um dos `destinos` alcançáveis,
+        com um único Dijkstra que para quando o último destino sai da fila (ou
+        pela tabela de todos os pares, se já calculada).
+        """
+        if origem not in self._ids:
+            return {}
+        if self._tabela is not None:
+            return {destino: d for destino in destinos if (d := self.distancia(origem, destino)) is not None}
+        ids = {self._ids[destino]: destino for destino in destinos if destino in self._ids}
+        if not ids:
+            return {}
+        por_id, _ = self._dijkstra_ids(self._ids[origem], alvos=ids)
+        return {destino: por_id[i] for i, destino in ids.items() if i in por_id}
+
+    def tabela_caminhos(self):
+        """
+        tabela de distâncias e próximo salto entre todos os pares, calculada com
+        um Dijkstra por vértice e mantida em cache até a rede mudar
+        (`adicionar_vertice`/`adicionar_aresta`). Retorna (distancias, proximo):
+        matrizes NumPy n×n indexadas pelos ids dos vértices (`id_vertice`), com
+        proximo[u, v] = id do vértice seguinte a u na rota até v, ou -1 se não
+        houver rota (e então distancias[u, v] não tem significado).
+        """
+        if self._tabela is None:
+            n = len(self._rotulos)
+            inteiro = self._adjacencia()[2].typecode == "q"
+            distancias = np.zeros((n, n), dtype=np.int64 if inteiro else np.float64)
+            proximo = np.full((n, n), -1, dtype=np.int32)
+            for origem in range(n):
+                por_id, saltos = self._dijkstra_com_saltos(origem)
+                ids = np.fromiter(por_id, dtype=np.int64, count=len(por_id))
+                distancias[origem, ids] = np.fromiter(por_id.values(), dtype=distancias.dtype, count=len(por_id))
+                proximo[origem, ids] = np.fromiter((saltos[i] for i in por_id), dtype=proximo.dtype, count=len(por_id))
+            self._tabela = (distancias, proximo)
+        return self._tabela
+
+    def _dijkstra_com_saltos(self, origem):
+        # retorna (distancias, primeiro_salto) por id
+        por_id, anteriores = self._dijkstra_ids(origem)
+        # o primeiro salto de cada vértice é herdado do seu antecessor na árvore
+        # de caminhos mínimos; percorrer em ordem de distância garante que o
+        # antecessor já foi resolvido
+        primeiro_salto = {origem: origem}
+        for vertice in sorted(por_id, key=por_id.__getitem__):
+            anterior = anteriores[vertice]
+            if anterior is not None:
+                primeiro_salto[vertice] = vertice if anterior == origem else primeiro_salto[anterior]
+        return por_id, primeiro_salto
+
+    def distancia(self, origem, destino):
+        """distância mínima em O(1) pela tabela de todos os pares (None se não houver rota)."""
+        distancias, proximo = self.tabela_caminhos()
+        i, j = self._ids.get(origem), self._ids.get(destino)
+        if i is None or j is None or proximo[i, j] < 0:
+            return None
+        return distancias[i, j].item()
+
+    def rota(self, origem, destino):
+        """lista de vértices da rota mínima, reconstruída pelos próximos saltos ([] se não houver)."""
+        _, proximo = self.tabela_caminhos()
+        i, j = self._ids.get(origem), self._ids.get(destino)
+        if i is None or j is None or proximo[i, j] < 0:
+            return []
+        caminho = [i]
+        while caminho[-1] != j:
+            caminho.append(proximo.item(caminho[-1], j))
+        return [self._rotulos[k] for k in caminho]
+
+
+class AnelHashConsistente:
+    """
+    anel de hash consistente com nós virtuais: cada nó ocupa `replicas` pontos
+    do anel e uma chave pertence ao nó do primeiro ponto em sentido horário.
+    Adicionar um nó só move para ele as chaves dos arcos que passou a cobrir
+    (~1/n delas); as demais continuam onde estavam. O hash (blake2b sobre o
+    repr da chave) é estável entre processos, ao contrário de `hash()`.
+    """
+
+    def __init__(self, nos=(), replicas=64):
+        self.replicas = replicas
+        self._pontos = []  # posições ordenadas no anel
+        self._donos = []  # nó de cada posição
+        self._nos = []  # em ordem de inserção
+        for no in nos:
+            self.adicionar(no)
+
+    @staticmethod
+    def _hash(chave):
+        return int.from_bytes(hashlib.blake2b(repr(chave).encode(), digest_size=8).digest(), "big")
+
+    @property
+    def nos(self):
+        return list(self._nos)
+
+    def __len__(self):
+        return len(self._nos)
+
+    def __contains__(self, no):
+        return no in self._nos
+
+    def adicionar(self, no):
+        if no in self:
+            raise ValueError(f"nó já está no anel: {no!r}")
+        self._nos.append(no)
+        for replica in range(self.replicas):
+            ponto = self._hash((no, replica))
+            posicao = bisect.bisect_left(self._pontos, ponto)
+            self._pontos.insert(posicao, ponto)
+            self._donos.insert(posicao, no)
+
+    def remover(self, no):
+        if no not in self:
+            raise KeyError(no)
+        self._nos.remove(no)
+        restantes = [(p, d) for p, d in zip(self._pontos, self._donos) if d != no]
+        self._pontos = [p for p, _ in restantes]
+        self._donos = [d for _, d in restantes]
+
+    def no(self, chave):
+        """nó responsável pela chave."""
+        if not self._pontos:
+            raise LookupError("anel sem nós")
+        posicao = bisect.bisect_right(self._pontos, self._hash(chave))
+        return self._donos[posicao % len(self._pontos)]
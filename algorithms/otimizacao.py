@@ -0,0 +1,181 @@
+import numpy as np
+
+INFINITO = float('inf')
+
+
+class ProblemaTransporte:
+    """
+    problema de transporte de custo mínimo, resolvido pelo simplex de
+    transporte (solução inicial de menor custo + pivoteamentos MODI, com os
+    custos reduzidos calculados vetorialmente). `ofertas[i]` é o excedente
+    da origem i, `demandas[j]` a falta do destino j e `custos[i][j]` o custo
+    unitário de i para j (INFINITO = sem rota). Envia o máximo de fluxo
+    possível e, entre as soluções de fluxo máximo, a de menor custo.
+    """
+    MAX_PIVOTEAMENTOS = 100000
+
+    def __init__(self, ofertas, demandas, custos):
+        self.ofertas = list(ofertas)
+        self.demandas = list(demandas)
+        self.custos = custos
+
+    def resolver(self):
+        """retorna a lista de (origem, destino, quantidade) do plano ótimo."""
+        s, d = len(self.ofertas), len(self.demandas)
+        if s == 0 or d == 0:
+            return []
+        if s == 1 or d == 1:
+            return self._resolver_guloso()
+        return self._resolver_fluxo()
+
+    def _resolver_guloso(self):
+        # com uma única origem (ou destino) não há interação entre as rotas:
+        # atender pelos custos crescentes é ótimo
+        unica_origem = len(self.ofertas) == 1
+        if unica_origem:
+            restante = self.ofertas[0]
+            candidatos = sorted((self.custos[0][j], j) for j in range(len(self.demandas)))
+            necessidades = self.demandas
+        else:
+            restante = self.demandas[0]
+            candidatos = sorted((self.custos[i][0], i) for i in range(len(self.ofertas)))
+            necessidades = self.ofertas
+
+        plano = []
+        for custo, k in candidatos:
+            if restante <= 0 or custo == INFINITO:
+                break
+            quantidade = min(restante, necessidades[k])
+            if quantidade > 0:
+                plano.append((0, k, quantidade) if unica_origem else (k, 0, quantidade))
+                restante -= quantidade
+        return plano
+
+    def _resolver_fluxo(self):
+        # simplex de transporte (método MODI). Uma linha e uma coluna fictícias
+        # tornam o problema balanceado: enviar para/receber da ficção custa
+        # PENALIDADE, mais do que qualquer rota real, e rotas inexistentes
+        # custam ainda mais, de modo que o ótimo maximiza primeiro o fluxo real.
+        m, n = len(self.ofertas), len(self.demandas)
+        custos = np.array(self.custos, dtype=np.float64).reshape(m, n)
+        finitos = custos[np.isfinite(custos)]
+        maior = float(finitos.max()) if len(finitos) else 1.0
+        penalidade = (maior + 1) * (m + n + 1)
+        estendido = np.zeros((m + 1, n + 1))
+        estendido[:m, :n] = np.where(np.isfinite(custos), custos, 4 * penalidade)
+        estendido[:m, n] = penalidade
+        estendido[m, :n] = penalidade
+        ofertas = self.ofertas + [sum(self.demandas)]
+        demandas = self.demandas + [sum(self.ofertas)]
+
+        fluxo, base_linhas, base_colunas = self._solucao_inicial(estendido, ofertas, demandas)
+        tolerancia = 1e-9 * penalidade
+        for _ in range(self.MAX_PIVOTEAMENTOS):
+            u, v = self._duais(estendido, base_linhas, base_colunas)
+            reduzidos = estendido - u[:, None] - v[None, :]
+            entrada = int(reduzidos.argmin())
+            i, j = divmod(entrada, n + 1)
+            if reduzidos[i, j] >= -tolerancia:
+                break
+            self._pivotear(fluxo, base_linhas, base_colunas, i, j)
+
+        return [
+            (i, j, fluxo[(i, j)])
+            for i in range(m) for j in sorted(base_linhas[i])
+            if j < n and fluxo[(i, j)] > 0 and np.isfinite(custos[i, j])
+        ]
+
+    @staticmethod
+    def _solucao_inicial(custos, ofertas, demandas):
+        """solução básica inicial pelo método do menor custo (árvore com m + n - 1 células)."""
+        linhas, colunas = custos.shape
+        oferta_restante = list(ofertas)
+        demanda_restante = list(demandas)
+        linha_fechada = [False] * linhas
+        coluna_fechada = [False] * colunas
+        linhas_abertas, colunas_abertas = linhas, colunas
+        fluxo = {}
+        base_linhas = [set() for _ in range(linhas)]
+        base_colunas = [set() for _ in range(colunas)]
+        for celula in np.argsort(custos, axis=None, kind="stable"):
+            i, j = divmod(int(celula), colunas)
+            if linha_fechada[i] or coluna_fechada[j]:
+                continue
+            quantidade = min(oferta_restante[i], demanda_restante[j])
+            fluxo[(i, j)] = quantidade
+            base_linhas[i].add(j)
+            base_colunas[j].add(i)
+            oferta_restante[i] -= quantidade
+            demanda_restante[j] -= quantidade
+            # fecha exatamente uma linha ou coluna por célula; empates deixam
+            # a outra aberta com zero, gerando a célula básica degenerada
+            if oferta_restante[i] == 0 and linhas_abertas > 1:
+                linha_fechada[i] = True
+                linhas_abertas -= 1
+            else:
+                coluna_fechada[j] = True
+                colunas_abertas -= 1
+                if colunas_abertas == 0:
+                    break
+        return fluxo, base_linhas, base_colunas
+
+    @staticmethod
+    def _duais(custos, base_linhas, base_colunas):
+        u = np.zeros(len(base_linhas))
+        v = np.zeros(len(base_colunas))
+        visitada_linha = [False] * len(base_linhas)
+        visitada_coluna = [False] * len(base_colunas)
+        visitada_linha[0] = True
+        pilha = [(0, True)]
+        while pilha:
+            no, eh_linha = pilha.pop()
+            if eh_linha:
+                for j in base_linhas[no]:
+                    if not visitada_coluna[j]:
+                        visitada_coluna[j] = True
+                        v[j] = custos[no, j] - u[no]
+                        pilha.append((j, False))
+            else:
+                for i in base_colunas[no]:
+                    if not visitada_linha[i]:
+                        visitada_linha[i] = True
+                        u[i] = custos[i, no] - v[no]
+                        pilha.append((i, True))
+        return u, v
+
+    @staticmethod
+    def _pivotear(fluxo, base_linhas, base_colunas, linha, coluna):
+        # caminho na árvore da base da linha de entrada até a coluna de entrada
+        anterior = {(linha, True): None}
+        pilha = [(linha, True)]
+        while (coluna, False) not in anterior:
+            no, eh_linha = pilha.pop()
+            vizinhos = base_linhas[no] if eh_linha else base_colunas[no]
+            for vizinho in vizinhos:
+                chave = (vizinho, not eh_linha)
+                if chave not in anterior:
+                    anterior[chave] = (no, eh_linha)
+                    pilha.append(chave)
+
+        celulas = []
+        no = (coluna, False)
+        while anterior[no] is not None:
+            pai = anterior[no]
+            celulas.append((pai[0], no[0]) if pai[1] else (no[0], pai[0]))
+            no = pai
+        # a partir da coluna de entrada as células alternam -, +, -, ...
+        negativas = celulas[0::2]
+        positivas = celulas[1::2]
+        theta = min(fluxo[c] for c in negativas)
+        saida = next(c for c in negativas if fluxo[c] == theta)
+
+        for c in negativas:
+            fluxo[c] -= theta
+        for c in positivas:
+            fluxo[c] += theta
+        fluxo[(linha, coluna)] = theta
+        base_linhas[linha].add(coluna)
+        base_colunas[coluna].add(linha)
+        del fluxo[saida]
+        base_linhas[saida[0]].discard(saida[1])
+        base_colunas[saida[1]].discard(saida[0])
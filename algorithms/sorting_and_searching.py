@@ -1,69 +1,216 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+from itertools import islice
+
+
 class SortingAndSearching:
- 
+    """
+    ordenação e busca. A API pública é `ordenar` (introsort com key/reverse),
+    `limite_inferior`/`limite_superior` (no estilo do módulo bisect) e
+    `ordenar_externo`, para sequências que não cabem em memória.
+    """
+    LIMIAR_INSERCAO = 16  # faixas menores são ordenadas por inserção
+
+    def ordenar(self, arr, key=None, reverse=False):
+        """
+        ordena `arr` no lugar e o retorna. Introsort: quicksort com mediana de
+        três, que passa a heapsort quando a recursão fica profunda demais, e
+        inserção nas faixas pequenas; O(n log n) no pior caso. Com `key` ou
+        `reverse` a ordenação é estável, como `sorted`.
+        """
+        if key is None and not reverse:
+            self._introsort(arr, 0, len(arr))
+            return arr
+
+        chaves = [key(x) for x in arr] if key is not None else arr
+        # o índice desempata (estabilidade) e evita comparar os próprios itens;
+        # em ordem reversa ele entra negativo para manter os empates na ordem original
+        sinal = -1 if reverse else 1
+        decorados = [(chave, sinal * i) for i, chave in enumerate(chaves)]
+        self._introsort(decorados, 0, len(decorados))
+        if reverse:
+            decorados.reverse()
+        arr[:] = [arr[sinal * i] for _, i in decorados]
+        return arr
+
+    def _introsort(self, arr, inicio, fim):
+        limite_profundidade = 2 * max(fim - inicio, 1).bit_length()
+        pilha = [(inicio, fim, limite_profundidade)]
+        while pilha:
+            inicio, fim, profundidade = pilha.pop()
+            # laço na metade maior e pilha na menor: a pilha fica em O(log n)
+            while fim - inicio > self.LIMIAR_INSERCAO:
+                if profundidade == 0:
+                    self._heapsort(arr, inicio, fim)
+                    break
+                profundidade -= 1
+                corte = self._particionar(arr, inicio, fim)
+                if corte - inicio < fim - corte:
+                    pilha.append((inicio, corte, profundidade))
+                    inicio = corte
+                else:
+                    pilha.append((corte, fim, profundidade))
+                    fim = corte
+            else:
+                self._insercao(arr, inicio, fim)
+
+    @staticmethod
+    def _particionar(arr, inicio, fim):
+        # partição de Hoare com pivô pela mediana de três; retorna o corte c
+        # tal que arr[inicio:c] <= pivô <= arr[c:fim], com as duas partes não vazias
+        meio = (inicio + fim - 1) // 2
+        a, b, c = arr[inicio], arr[meio], arr[fim - 1]
+        if a < b:
+            pivo = b if b < c else (c if a < c else a)
+        else:
+            pivo = a if a < c else (c if b < c else b)
+
+        i, j = inicio - 1, fim
+        while True:
+            i += 1
+            while arr[i] < pivo:
+                i += 1
+            j -= 1
+            while pivo < arr[j]:
+                j -= 1
+            if i >= j:
+                return j + 1
+            arr[i], arr[j] = arr[j], arr[i]
+
+    @staticmethod
+    def _insercao(arr, inicio, fim):
+        for i in range(inicio + 1, fim):
+            item = arr[i]
+            j = i - 1
+            while j >= inicio and item < arr[j]:
+                arr[j + 1] = arr[j]
+                j -= 1
+            arr[j + 1] = item
+
+    @staticmethod
+    def _heapsort(arr, inicio, fim):
+        n = fim - inicio
+
+        def descer(raiz, tamanho):
+            while True:
+                filho = 2 * raiz + 1
+                if filho >= tamanho:
+                    return
+                if filho + 1 < tamanho and arr[inicio + filho] < arr[inicio + filho + 1]:
+                    filho += 1
+                if not arr[inicio + raiz] < arr[inicio + filho]:
+                    return
+                arr[inicio + raiz], arr[inicio + filho] = arr[inicio + filho], arr[inicio + raiz]
+                raiz = filho
+
+        for raiz in range(n // 2 - 1, -1, -1):
+            descer(raiz, n)
+        for ultimo in range(n - 1, 0, -1):
+            arr[inicio], arr[inicio + ultimo] = arr[inicio + ultimo], arr[inicio]
+            descer(0, ultimo)
+
     def _quick_sort(self, arr, low, high):
-        """implementação do Quick Sort"""
+        """implementação do Quick Sort (introsort sobre arr[low..high])"""
         if low < high:
-            pi = self._partition(arr, low, high)
-            self._quick_sort(arr, low, pi - 1)
-            self._quick_sort(arr, pi + 1, high)
-    
-    def _partition(self, arr, low, high):
-        """função de partição para Quick Sort"""
-        pivot = arr[high]
-        i = low - 1
-        
-        for j in range(low, high):
-            if arr[j] <= pivot:
-                i += 1
-                arr[i], arr[j] = arr[j], arr[i]
-        
-        arr[i + 1], arr[high] = arr[high], arr[i + 1]
-        return i + 1
-    
+            self._introsort(arr, low, high + 1)
+
     def _merge_sort(self, arr):
-        """implementação do Merge Sort"""
-        if len(arr) > 1:
-            mid = len(arr) // 2
-            left = arr[:mid]
-            right = arr[mid:]
-            
-            self._merge_sort(left)
-            self._merge_sort(right)
-            
-            i = j = k = 0
-            
-            while i < len(left) and j < len(right):
-                if left[i] < right[j]:
-                    arr[k] = left[i]
-                    i += 1
-                else:
-                    arr[k] = right[j]
-                    j += 1
-                k += 1
-            
-            while i < len(left):
-                arr[k] = left[i]
-                i += 1
-                k += 1
-            
-            while j < len(right):
-                arr[k] = right[j]
-                j += 1
-                k += 1
-    
+        """implementação do Merge Sort (bottom-up, com um único buffer auxiliar)"""
+        n = len(arr)
+        origem, destino = arr, [None] * n
+        largura = 1
+        while largura < n:
+            for inicio in range(0, n, 2 * largura):
+                meio = min(inicio + largura, n)
+                fim = min(inicio + 2 * largura, n)
+                i, j, k = inicio, meio, inicio
+                while i < meio and j < fim:
+                    if origem[j] < origem[i]:
+                        destino[k] = origem[j]
+                        j += 1
+                    else:
+                        destino[k] = origem[i]
+                        i += 1
+                    k += 1
+                destino[k:fim] = origem[i:meio] if i < meio else origem[j:fim]
+            origem, destino = destino, origem
+            largura *= 2
+        if origem is not arr:
+            arr[:] = origem
+
+    def limite_inferior(self, arr, x, key=None, lo=0, hi=None):
+        """primeiro índice i com arr[i] >= x (como bisect_left); `key` é aplicada aos itens."""
+        hi = len(arr) if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            valor = arr[mid] if key is None else key(arr[mid])
+            if valor < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def limite_superior(self, arr, x, key=None, lo=0, hi=None):
+        """primeiro índice i com arr[i] > x (como bisect_right); `key` é aplicada aos itens."""
+        hi = len(arr) if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            valor = arr[mid] if key is None else key(arr[mid])
+            if x < valor:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
     def _busca_binaria(self, arr, x):
         """implementação da Busca Binária"""
-        low = 0
-        high = len(arr) - 1
-        
-        while low <= high:
-            mid = (low + high) // 2
-            
-            if arr[mid] == x:
-                return mid
-            elif arr[mid] < x:
-                low = mid + 1
-            else:
-                high = mid - 1
-        
-        return -1 
\ No newline at end of file
+        indice = self.limite_inferior(arr, x)
+        if indice < len(arr) and arr[indice] == x:
+            return indice
+        return -1
+
+    def ordenar_externo(self, itens, key=None, reverse=False, tamanho_run=100_000, diretorio=None):
+        """
+        ordena um iterável maior que a memória: lê blocos de `tamanho_run` itens,
+        ordena cada um em memória e o grava (pickle) num arquivo temporário, e
+        gera os itens em ordem pela intercalação k-way das runs. Os arquivos
+        são removidos quando o gerador termina ou é fechado.
+        """
+        itens = iter(itens)
+        primeiro = list(islice(itens, tamanho_run))
+        bloco = list(islice(itens, tamanho_run))
+        if not bloco:
+            # cabe em um bloco: sem disco
+            yield from self.ordenar(primeiro, key=key, reverse=reverse)
+            return
+
+        pasta = tempfile.mkdtemp(prefix="ordenacao_", dir=diretorio)
+        arquivos = []
+        try:
+            while primeiro:
+                caminho = os.path.join(pasta, f"run_{len(arquivos)}.pkl")
+                with open(caminho, "wb") as arquivo:
+                    pickler = pickle.Pickler(arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+                    for item in self.ordenar(primeiro, key=key, reverse=reverse):
+                        pickler.dump(item)
+                        pickler.clear_memo()
+                arquivos.append(open(caminho, "rb"))
+                primeiro, bloco = bloco, list(islice(itens, tamanho_run))
+
+            yield from heapq.merge(*(self._ler_run(a) for a in arquivos), key=key, reverse=reverse)
+        finally:
+            for arquivo in arquivos:
+                arquivo.close()
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    @staticmethod
+    def _ler_run(arquivo):
+        unpickler = pickle.Unpickler(arquivo)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
@@ -0,0 +1,189 @@
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from business_logic.previsao import MotorPrevisao
+from data_layer.storage import _de_epoch_us, leitura_consistente
+
+COLUNAS = (("materiais", np.int32), ("quantidades", np.float64), ("timestamps", np.int64), ("contagens", np.int64))
+
+
+def _anexar(descritor):
+    """abre os blocos de memória compartilhada do descritor; retorna (blocos, colunas)."""
+    blocos, colunas = [], []
+    for (nome, dtype), (nome_bloco, tamanho) in zip(COLUNAS, descritor["blocos"]):
+        bloco = shared_memory.SharedMemory(name=nome_bloco)
+        blocos.append(bloco)
+        colunas.append(np.ndarray((tamanho,), dtype=dtype, buffer=bloco.buf))
+    return blocos, colunas
+
+
+def _executar_fatia(funcao, descritor, fatia, *args):
+    """ponto de entrada dos processos: aplica `funcao` às colunas compartilhadas da fatia de unidades."""
+    blocos, colunas = _anexar(descritor)
+    try:
+        return funcao(colunas, descritor["deslocamentos"], fatia, *args)
+    finally:
+        # as views precisam sair de escopo antes de fechar os blocos
+        del colunas
+        for bloco in blocos:
+            bloco.close()
+
+
+def _agregar_fatia(colunas, deslocamentos, fatia, num_materiais):
+    """totais, contagens e último timestamp por material nas unidades da fatia."""
+    materiais, quantidades, timestamps, eventos = colunas
+    inicio, fim = deslocamentos[fatia[0]], deslocamentos[fatia[1]]
+    mat = materiais[inicio:fim]
+    totais = np.bincount(mat, weights=quantidades[inicio:fim], minlength=num_materiais)
+    # linhas compactadas valem o número de eventos que agrupam
+    contagens = np.bincount(mat, weights=eventos[inicio:fim], minlength=num_materiais).astype(np.int64)
+    ultimos = np.full(num_materiais, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(ultimos, mat, timestamps[inicio:fim])
+    return totais, contagens, ultimos
+
+
+def _prever_fatia(colunas, deslocamentos, fatia, parametros, fim_us, num_materiais):
+    """séries diárias e métricas de previsão das unidades da fatia; chaves globais de série."""
+    materiais, quantidades, timestamps, _ = colunas
+    motor = MotorPrevisao(None, **parametros)
+    por_unidade = (
+        (u, materiais[deslocamentos[u]:deslocamentos[u + 1]],
+         quantidades[deslocamentos[u]:deslocamentos[u + 1]],
+         timestamps[deslocamentos[u]:deslocamentos[u + 1]])
+        for u in range(*fatia)
+    )
+    series, matriz = motor.agrupar_series(por_unidade, fim_us, num_materiais)
+    return (series, *motor.metricas(matriz))
+
+
+class AnaliseParalela:
+    """
+    análise de consumo e previsão em paralelo, particionando o histórico por
+    unidade. As colunas de todas as unidades são copiadas uma única vez para
+    blocos de memória compartilhada (sem pickle de listas de registros); cada
+    processo do pool recebe só o nome dos blocos e uma faixa contígua de
+    unidades, devolve agregados parciais ou métricas por série, e o processo
+    principal intercala os resultados na ordem do caminho serial. As colunas
+    vêm de um instantâneo do data store, então a ingestão pode continuar.
+    Com uma única fatia o cálculo roda no próprio processo, sem pool.
+    """
+    MIN_REGISTROS_POR_PROCESSO = 50_000  # abaixo disso o custo do pool não compensa
+
+    def __init__(self, data_store, motor_previsao=None, processos=None):
+        self.data_store = data_store
+        self.motor_previsao = motor_previsao or MotorPrevisao(data_store)
+        self.processos = processos or os.cpu_count() or 1
+        self._executor = None
+
+    def fechar(self):
+        """encerra o pool de processos, se criado."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    @staticmethod
+    def _colunas_por_unidade(fonte):
+        unidades = list(fonte.unidades_com_historico())
+        return unidades, [
+            (*fonte.get_colunas_consumo(unidade), fonte.get_contagens_consumo(unidade)) for unidade in unidades
+        ]
+
+    def _fatias(self, deslocamentos):
+        """faixas contíguas [inicio, fim) de unidades com número de registros equilibrado."""
+        num_unidades, total = len(deslocamentos) - 1, int(deslocamentos[-1])
+        quantidade = max(1, min(self.processos, num_unidades, total // self.MIN_REGISTROS_POR_PROCESSO))
+        if quantidade == 1:
+            return [(0, num_unidades)]
+        cortes = np.searchsorted(deslocamentos, np.linspace(0, total, quantidade + 1)[1:-1], side="left")
+        limites = [0, *sorted(set(int(c) for c in cortes) - {0, num_unidades}), num_unidades]
+        return list(zip(limites[:-1], limites[1:]))
+
+    def _mapear(self, funcao, por_unidade, *args):
+        """executa `funcao` sobre cada fatia de unidades e retorna a lista de resultados parciais."""
+        tamanhos = [len(colunas[0]) for colunas in por_unidade]
+        deslocamentos = np.zeros(len(tamanhos) + 1, dtype=np.int64)
+        np.cumsum(tamanhos, out=deslocamentos[1:])
+        fatias = self._fatias(deslocamentos)
+        if len(fatias) == 1:
+            colunas = [
+                np.concatenate([c[k] for c in por_unidade]) if por_unidade else np.empty(0, dtype=dtype)
+                for k, (_, dtype) in enumerate(COLUNAS)
+            ]
+            return [funcao(colunas, deslocamentos, fatias[0], *args)]
+
+        blocos = []
+        try:
+            for k, (_, dtype) in enumerate(COLUNAS):
+                total = int(deslocamentos[-1])
+                bloco = shared_memory.SharedMemory(create=True, size=max(1, total * np.dtype(dtype).itemsize))
+                blocos.append(bloco)
+                destino = np.ndarray((total,), dtype=dtype, buffer=bloco.buf)
+                np.concatenate([c[k] for c in por_unidade], out=destino)
+                del destino
+            descritor = {
+                "blocos": [(bloco.name, int(deslocamentos[-1])) for bloco in blocos],
+                "deslocamentos": deslocamentos
+            }
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.processos)
+            futuros = [self._executor.submit(_executar_fatia, funcao, descritor, fatia, *args) for fatia in fatias]
+            return [futuro.result() for futuro in futuros]
+        finally:
+            for bloco in blocos:
+                bloco.close()
+                bloco.unlink()
+
+    def padroes_consumo(self):
+        """
+        `agregar_consumo_por_material()` calculado por fatias de unidades.
+        Contagens e último consumo são iguais aos do caminho serial; o
+        `total_consumido` soma os mesmos valores em outra ordem (por fatia, e
+        não na ordem de chegada dos agregados incrementais), então pode diferir
+        nos últimos dígitos: erro relativo de até n·2⁻⁵³ para n registros.
+        """
+        fonte = leitura_consistente(self.data_store)
+        _, por_unidade = self._colunas_por_unidade(fonte)
+        num_materiais = fonte.num_materiais
+        parciais = self._mapear(_agregar_fatia, por_unidade, num_materiais)
+        totais = np.sum([p[0] for p in parciais], axis=0)
+        contagens = np.sum([p[1] for p in parciais], axis=0)
+        ultimos = np.max([p[2] for p in parciais], axis=0)
+        return {
+            fonte.nome_material(material_id): {
+                "total_consumido": float(totais[material_id]),
+                "num_consumos": int(contagens[material_id]),
+                "ultimo_consumo": _de_epoch_us(ultimos[material_id])
+            }
+            for material_id in np.flatnonzero(contagens)
+        }
+
+    def prever(self, referencia=None):
+        """mesmo resultado de `MotorPrevisao.prever`, com as séries calculadas por fatias de unidades."""
+        motor = self.motor_previsao
+        referencia = referencia or datetime.datetime.now()
+        fim_us = round(referencia.timestamp() * 1_000_000)
+        fonte = leitura_consistente(self.data_store)
+        nomes_unidades, por_unidade = self._colunas_por_unidade(fonte)
+        num_materiais = fonte.num_materiais
+        parametros = {"dias_historico": motor.dias_historico, "janela_media": motor.janela_media, "alfa": motor.alfa}
+        parciais = self._mapear(_prever_fatia, por_unidade, parametros, fim_us, num_materiais)
+
+        # fatias contíguas e em ordem: concatenar preserva a ordem global das chaves
+        series, media_movel, demanda_diaria, desvio = (np.concatenate(partes) for partes in zip(*parciais))
+        unidades = [nomes_unidades[i] for i in series // num_materiais]
+        materiais = [fonte.nome_material(m) for m in series % num_materiais]
+        return motor.montar_resultado(unidades, materiais, media_movel, demanda_diaria, desvio)
+
+    def prever_por_material(self, referencia=None):
+        """soma a previsão do horizonte de todas as unidades, por material."""
+        return MotorPrevisao.somar_por_material(self.prever(referencia))
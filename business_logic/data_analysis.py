@@ -1,131 +1,209 @@
 from business_logic.stock_management import SistemaGestaoEstoque
-import random
+from business_logic.previsao import MotorPrevisao
+from business_logic.analise_paralela import AnaliseParalela
+from business_logic.pedidos import OtimizadorPedidos
+from algorithms.otimizacao import INFINITO, ProblemaTransporte
+from data_layer.storage import leitura_consistente
+import numpy as np
 
 class AnalisadorDados:
     """
     realiza análises preditivas, identifica padrões de consumo e otimiza
-    a distribuição de materiais entre as unidades.
+    a distribuição de materiais entre as unidades. Os resultados são emitidos
+    para o sink do sistema de gestão (ou para `sink`, se informado). `rede`
+    é o Grafo de distâncias entre unidades usado para custear transferências.
+    Com `paralelo=True`, padrões e previsões são calculados por `AnaliseParalela`
+    em até `processos` processos. As previsões são as mesmas do caminho
+    serial; nos padrões, o `total_consumido` pode diferir nos últimos dígitos
+    (ver `AnaliseParalela.padroes_consumo`).
     """
-    def __init__(self, sistema_gestao_estoque: SistemaGestaoEstoque):
+    TOLERANCIA = 0.1  # margem sobre a reserva da unidade de origem
+
+    def __init__(self, sistema_gestao_estoque: SistemaGestaoEstoque, sink=None, rede=None, processos=None):
         self.sistema = sistema_gestao_estoque
+        self._sink = sink
+        self.rede = rede
+        self.motor_previsao = MotorPrevisao(sistema_gestao_estoque.data_store)
+        self.otimizador_pedidos = OtimizadorPedidos(self.motor_previsao)
+        self.processos = processos
+        self._analise_paralela = None
+
+    @property
+    def analise_paralela(self):
+        if self._analise_paralela is None:
+            self._analise_paralela = AnaliseParalela(self.sistema.data_store, self.motor_previsao, self.processos)
+        return self._analise_paralela
+
+    def fechar(self):
+        """encerra o pool de processos da análise paralela, se criado."""
+        if self._analise_paralela is not None:
+            self._analise_paralela.fechar()
+
+    def __enter__(self):
+        return self
 
-    def analisar_padroes_consumo(self):
+    def __exit__(self, *exc):
+        self.fechar()
+
+    @property
+    def sink(self):
+        return self._sink if self._sink is not None else self.sistema.sink
+
+    def analisar_padroes_consumo(self, paralelo=False):
         """analisa o histórico de consumo para identificar padrões."""
-        print("\nAnálise de Padrões de Consumo:")
-        padroes = {}
-        for unidade, historico in self.sistema.historico_consumo.items():
-            for registro in historico:
-                material = registro["material"]
-                quantidade = registro["quantidade"]
-                
-                if material not in padroes:
-                    padroes[material] = {"total_consumido": 0, "num_consumos": 0}
-                
-                padroes[material]["total_consumido"] += quantidade
-                padroes[material]["num_consumos"] += 1
-        
-        if not padroes:
-            print("  Não há dados de consumo para analisar.")
-            return {}
-
-        for material, dados in padroes.items():
-            avg_consumo = dados["total_consumido"] / dados["num_consumos"]
-            print(f"  - Material: {material} | Consumo Médio: {avg_consumo:.2f} unidades/registro")
-        
+        if paralelo:
+            padroes = self.analise_paralela.padroes_consumo()
+        else:
+            padroes = leitura_consistente(self.sistema.data_store).agregar_consumo_por_material()
+        self.sink.emitir("padroes_consumo", padroes=padroes)
         return padroes
 
-    def prever_necessidades_futuras(self):
-        """prevê necessidades futuras com base em padrões de consumo."""
-        print("\nPrevisão de Necessidades Futuras:")
+    def prever_necessidades_futuras(self, paralelo=False):
+        """
+        prevê a demanda de cada material no próximo período (somando as unidades)
+        a partir das séries diárias de consumo, via `MotorPrevisao`.
+        """
+        motor = self.analise_paralela if paralelo else self.motor_previsao
+        previsoes = motor.prever_por_material()
+        self.sink.emitir("previsoes", previsoes=previsoes)
+        return previsoes
+
+    def prever_por_unidade(self, paralelo=False):
+        """previsão detalhada por (unidade, material): média móvel, demanda diária e demanda no lead time."""
+        resultado = (self.analise_paralela if paralelo else self.motor_previsao).prever()
         previsoes = {}
-        padroes = self.analisar_padroes_consumo() 
-        if not padroes:
-            print("  não é possível prever necessidades sem dados de consumo.")
-            return {}
-        
-        
-        for material, dados in padroes.items():
-            avg_consumo = dados["total_consumido"] / dados["num_consumos"]
-            previsao_proximo_mes = avg_consumo * 1.2 
-            previsoes[material] = previsao_proximo_mes
-            print(f"  - Material: {material} | Previsão Próximo Período: {previsao_proximo_mes:.2f} unidades")
-            
+        for i, (unidade, material) in enumerate(zip(resultado["unidades"], resultado["materiais"])):
+            previsoes.setdefault(unidade, {})[material] = {
+                "media_movel": float(resultado["media_movel"][i]),
+                "demanda_diaria": float(resultado["demanda_diaria"][i]),
+                "previsao_horizonte": float(resultado["previsao_horizonte"][i]),
+                "demanda_lead_time": float(resultado["demanda_lead_time"][i]),
+                "estoque_seguranca": float(resultado["estoque_seguranca"][i])
+            }
         return previsoes
 
-    def otimizar_distribuicao_entre_unidades(self):
-        """melhora a distribuição de materiais entre unidades (simulação simples)."""
-        print("\nOtimização de Distribuição entre Unidades:")
-        transferencias_sugeridas = []
-        
-        
-        estoque_total_por_material = {}
-        estoque_por_unidade_material = {}
-
-        for unidade, materiais in self.sistema.estoque.items():
-            estoque_por_unidade_material[unidade] = {} 
-            for material, qtd in materiais.items():
-                estoque_total_por_material[material] = estoque_total_por_material.get(material, 0) + qtd
-                estoque_por_unidade_material[unidade][material] = qtd
-        
-        if not estoque_total_por_material:
-            print("  sem materiais em estoque para otimizar.")
+    def planejar_pedidos(self, paralelo=False):
+        """
+        quantidade de pedido de custo mínimo e ponto de reposição por (unidade, material),
+        para os materiais com preço definido em `otimizador_pedidos`.
+        """
+        previsao = (self.analise_paralela if paralelo else self.motor_previsao).prever()
+        resultado = self.otimizador_pedidos.planejar(previsao)
+        pedidos = {}
+        for i, (unidade, material) in enumerate(zip(resultado["unidades"], resultado["materiais"])):
+            pedidos.setdefault(unidade, {})[material] = {
+                "quantidade_pedido": int(resultado["quantidade_pedido"][i]),
+                "preco_unitario": float(resultado["preco_unitario"][i]),
+                "custo_diario": float(resultado["custo_diario"][i]),
+                "ponto_reposicao": float(resultado["ponto_reposicao"][i])
+            }
+        self.sink.emitir("pedidos_planejados", pedidos=pedidos)
+        return pedidos
+
+    def otimizar_distribuicao_entre_unidades(self, rede=None):
+        """
+        planeja transferências por material como um problema de transporte de
+        custo mínimo: unidades abaixo do limite mínimo configurado recebem das
+        unidades com excedente, com custo igual à distância mínima na rede (um
+        Dijkstra por unidade de origem, até alcançar os destinos; sem rede, custo
+        unitário). Cada unidade cede só o que passa da sua reserva, de
+        modo que o plano nunca transfere mais do que o excedente real.
+        """
+        rede = rede if rede is not None else self.rede
+        # instantâneo: a matriz congelada é lida sem cópia enquanto as escritas continuam
+        matriz = leitura_consistente(self.sistema.data_store).matriz_estoque()
+        estoque, com_estoque = matriz.valores("estoque")
+        limites, com_limite = matriz.valores("limite")
+        ativas = np.flatnonzero(matriz.unidades_ativas())
+        materiais = np.flatnonzero((com_estoque | com_limite)[ativas].any(axis=0))
+        if len(materiais) == 0:
+            self.sink.emitir("distribuicao_otimizada", transferencias=[],
+                             motivo="sem materiais em estoque para otimizar.")
             return []
 
+        # toda a rede de uma vez: linhas = unidades ativas, colunas = materiais
+        unidades = [matriz.nomes_unidades[u] for u in ativas.tolist()]
+        estoque = estoque[np.ix_(ativas, materiais)]
+        limites = limites[np.ix_(ativas, materiais)]
+        com_limite = com_limite[np.ix_(ativas, materiais)]
+        media = estoque.sum(axis=0) / len(unidades)
+        abaixo = com_limite & (estoque < limites)
+        demandas = np.ceil(limites - estoque).astype(np.int64)
+        # a unidade cede apenas o que passa da sua reserva: o maior entre
+        # o próprio limite e a média da rede, com margem de tolerância
+        reservas = np.maximum(limites, media) * (1 + self.TOLERANCIA)
+        excessos = np.floor(estoque - reservas).astype(np.int64)
+        cedentes = ~abaixo & (excessos > 0)
+        # só os materiais desequilibrados (com quem ceda e quem precise) viram problemas de transporte
+        desequilibrados = np.flatnonzero(cedentes.any(axis=0) & abaixo.any(axis=0))
 
-        num_unidades = len(self.sistema.estoque)
-        if num_unidades == 0:
-            print("  sem unidades para otimizar a distribuição.")
-            return []
+        transferencias_sugeridas = []
+        cache_distancias = {}  # origem -> {destino: distância}, entre materiais
+        for coluna in desequilibrados.tolist():
+            material = matriz.nomes_materiais[materiais[coluna]]
+            linhas_origem = np.flatnonzero(cedentes[:, coluna]).tolist()
+            linhas_destino = np.flatnonzero(abaixo[:, coluna]).tolist()
+            origens = [unidades[i] for i in linhas_origem]
+            destinos = [unidades[i] for i in linhas_destino]
+            ofertas = excessos[linhas_origem, coluna].tolist()
+            demandas_material = demandas[linhas_destino, coluna].tolist()
 
-        for material, total_qtd in estoque_total_por_material.items():
-            ideal_por_unidade = total_qtd / num_unidades
-            
-            unidades_com_excesso = []
-            unidades_com_falta = []
-
-            for unidade in estoque_por_unidade_material.keys(): 
-                qtd_na_unidade = estoque_por_unidade_material.get(unidade, {}).get(material, 0)
-                if qtd_na_unidade > ideal_por_unidade * 1.1: 
-                    excesso = qtd_na_unidade - ideal_por_unidade
-                    unidades_com_excesso.append((unidade, excesso))
-                elif qtd_na_unidade < ideal_por_unidade * 0.9:  
-                    falta = ideal_por_unidade - qtd_na_unidade
-                    unidades_com_falta.append((unidade, falta))
-            
-            for origem, exc_qtd in unidades_com_excesso:
-                for destino, fal_qtd in unidades_com_falta:
-                    qtd_transferir = min(exc_qtd, fal_qtd)
-                    if qtd_transferir > 0:
-                        transferencias_sugeridas.append({
-                            "origem": origem,
-                            "destino": destino,
-                            "material": material,
-                            "quantidade": round(qtd_transferir)
-                        })
-                        print(f"  →  transferência de {round(qtd_transferir)} de {material} de {origem} para {destino}")
-                        exc_qtd -= qtd_transferir
-                        fal_qtd -= qtd_transferir
-                        
-        if not transferencias_sugeridas:
-            print("  nenhuma otimização de distribuição sugerida no momento.")
+            custos = [self._custos(rede, origem, destinos, cache_distancias) for origem in origens]
+            for i, j, quantidade in ProblemaTransporte(ofertas, demandas_material, custos).resolver():
+                transferencia = {
+                    "origem": origens[i],
+                    "destino": destinos[j],
+                    "material": material,
+                    "quantidade": quantidade
+                }
+                if rede is not None:
+                    transferencia["distancia"] = custos[i][j]
+                transferencias_sugeridas.append(transferencia)
 
+        self.sink.emitir("distribuicao_otimizada", transferencias=transferencias_sugeridas)
         return transferencias_sugeridas
 
+    @staticmethod
+    def _custos(rede, origem, destinos, cache_distancias):
+        """custo da origem a cada destino: distância mínima na rede; sem rede, todas as rotas custam 1."""
+        if rede is None:
+            return [1] * len(destinos)
+        distancias = cache_distancias.get(origem)
+        faltantes = [d for d in destinos if distancias is None or d not in distancias]
+        if faltantes:
+            # um Dijkstra por origem; os inalcançáveis ficam registrados como INFINITO
+            novas = rede.distancias_de(origem, faltantes)
+            distancias = cache_distancias.setdefault(origem, {})
+            distancias.update((d, novas.get(d, INFINITO)) for d in faltantes)
+        return [distancias[d] for d in destinos]
+
     def transferir_entre_unidades(self, origem, destino, material, quantidade):
-        """testa a transferência de material entre unidades."""
+        """transfere material entre unidades (atômico: ver `SistemaGestaoEstoque.transferir`)."""
         if quantidade <= 0:
-            print("Erro:  quantidade a transferir deve ser positiva.")
-            return
-
-        estoque_origem = self.sistema.consultar_estoque(origem, material)
-        if estoque_origem is None or estoque_origem < quantidade:
-            print(f"Erro: estoque insuficiente de {material} em {origem} para transferir {quantidade} unidades.")
-            return
-        
-        self.sistema.data_store.update_estoque(origem, material, estoque_origem - quantidade)
-        current_stock_destino = self.sistema.data_store.get_estoque(destino, material) or 0
-        self.sistema.data_store.update_estoque(destino, material, current_stock_destino + quantidade)
-        
-        print(f"transferência de {quantidade} de {material} de {origem} para {destino} realizada com sucesso.")
-        self.sistema._verificar_alerta_minimo(origem, material) 
-        self.sistema._verificar_alerta_minimo(destino, material) 
\ No newline at end of file
+            self.sink.emitir("erro_transferencia", mensagem="quantidade a transferir deve ser positiva.")
+            return None
+
+        resultado = self.sistema.transferir(origem, destino, material, quantidade)
+        if resultado is None:
+            self.sink.emitir("erro_transferencia",
+                             mensagem=f"estoque insuficiente de {material} em {origem} para transferir {quantidade} unidades.")
+            return None
+        estoque_origem, estoque_destino = resultado
+
+        self.sink.emitir("transferencia_realizada", origem=origem, destino=destino,
+                         material=material, quantidade=quantidade)
+        return {
+            "origem": origem,
+            "destino": destino,
+            "material": material,
+            "quantidade": quantidade,
+            "estoque_origem": estoque_origem,
+            "estoque_destino": estoque_destino,
+            "alertas": [
+                alerta for alerta in (
+                    self.sistema._verificar_alerta_minimo(origem, material),
+                    self.sistema._verificar_alerta_minimo(destino, material)
+                ) if alerta
+            ]
+        }
+ 
\ No newline at end of file
@@ -0,0 +1,46 @@
+import logging
+from collections import deque
+
+
+class SinkSilencioso:
+    """descarta todos os eventos; padrão quando o sistema é usado como serviço."""
+    def emitir(self, tipo, **dados):
+        pass
+
+
+class SinkBuffer:
+    """guarda os últimos `capacidade` eventos em memória como tuplas (tipo, dados)."""
+    def __init__(self, capacidade=10000):
+        self.eventos = deque(maxlen=capacidade)
+
+    def emitir(self, tipo, **dados):
+        self.eventos.append((tipo, dados))
+
+    def drenar(self):
+        """retorna e remove os eventos acumulados."""
+        eventos = list(self.eventos)
+        self.eventos.clear()
+        return eventos
+
+
+class SinkLogging:
+    """
+    encaminha os eventos para o módulo `logging`. A formatação é adiada:
+    só acontece se algum handler aceitar o registro, e os dados estruturados
+    seguem em `record.evento` / `record.dados`.
+    """
+    NIVEIS = {
+        "erro": logging.WARNING,
+        "consumo_excede_estoque": logging.WARNING,
+        "alerta_minimo": logging.WARNING,
+        "erro_transferencia": logging.WARNING,
+    }
+
+    def __init__(self, logger=None, nivel_padrao=logging.INFO):
+        self.logger = logger or logging.getLogger("gestao_estoque")
+        self.nivel_padrao = nivel_padrao
+
+    def emitir(self, tipo, **dados):
+        nivel = self.NIVEIS.get(tipo, self.nivel_padrao)
+        if self.logger.isEnabledFor(nivel):
+            self.logger.log(nivel, "%s %s", tipo, dados, extra={"evento": tipo, "dados": dados})
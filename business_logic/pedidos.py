@@ -0,0 +1,187 @@
+from collections import OrderedDict
+
+import numpy as np
+
+CUSTO_PEDIDO_PADRAO = 50.0
+
+
+class OtimizadorPedidos:
+    """
+    quantidade de pedido de custo mínimo e ponto de reposição de todas as
+    séries (unidade, material) de uma vez. Cada material tem preço unitário,
+    faixas de desconto por volume (all-units: a partir de `quantidade_minima`
+    o desconto vale para o pedido inteiro), custo fixo por pedido e custo de
+    armazenagem por unidade por dia; a demanda diária, a demanda no lead time
+    e o estoque de segurança vêm do `MotorPrevisao`.
+    Para cada faixa, o lote econômico sqrt(2·D·S/H) é limitado ao intervalo
+    da faixa e a faixa de menor custo diário (compra + pedidos + armazenagem)
+    vence, com todas as séries e faixas numa matriz. Os resultados de cada
+    material ficam num cache LRU chaveado pelos seus parâmetros de preço e
+    pela sua demanda: replanejar depois de mudar o preço de um material só
+    recalcula esse material.
+    """
+    def __init__(self, motor_previsao, tamanho_cache=4096):
+        self.motor_previsao = motor_previsao
+        self.tamanho_cache = tamanho_cache
+        self._parametros = {}  # material -> (preco, faixas, custo_pedido, custo_armazenagem)
+        self._lead_times = {}  # material -> dias, quando diferente do lead time do motor
+        self._cache = OrderedDict()
+        self._acertos = 0
+        self._falhas = 0
+
+    def definir_parametros(self, material, preco_unitario, custo_armazenagem, faixas=(),
+                           custo_pedido=CUSTO_PEDIDO_PADRAO, lead_time_dias=None):
+        """
+        define os parâmetros de preço de um material. `faixas` é uma sequência
+        de (quantidade_minima, desconto), com desconto em fração do preço;
+        `custo_armazenagem` é por unidade por dia. `lead_time_dias` substitui
+        o lead time do motor de previsão no ponto de reposição do material.
+        """
+        if preco_unitario < 0 or custo_armazenagem <= 0 or custo_pedido < 0:
+            raise ValueError("preço e custo de pedido não negativos e custo de armazenagem positivo")
+        faixas = tuple(sorted((float(minimo), float(desconto)) for minimo, desconto in faixas))
+        if any(minimo <= 0 or not 0 <= desconto < 1 for minimo, desconto in faixas):
+            raise ValueError("faixas precisam de quantidade mínima positiva e desconto em [0, 1)")
+        self._parametros[material] = (float(preco_unitario), faixas, float(custo_pedido), float(custo_armazenagem))
+        if lead_time_dias is None:
+            self._lead_times.pop(material, None)
+        else:
+            self._lead_times[material] = float(lead_time_dias)
+
+    def parametros(self, material):
+        return self._parametros.get(material)
+
+    def info_cache(self):
+        return {"acertos": self._acertos, "falhas": self._falhas,
+                "tamanho": len(self._cache), "capacidade": self.tamanho_cache}
+
+    def planejar(self, previsao=None, referencia=None):
+        """
+        retorna um dict com as listas `unidades` e `materiais` (só materiais com
+        parâmetros definidos) e arrays alinhados: quantidade_pedido,
+        preco_unitario (com o desconto da faixa escolhida), custo_diario,
+        ponto_reposicao e demanda_diaria. `previsao` é um resultado de
+        `MotorPrevisao.prever` (calculado agora, por padrão).
+        """
+        previsao = previsao if previsao is not None else self.motor_previsao.prever(referencia)
+        nomes, grupos = np.unique(np.asarray(previsao["materiais"], dtype=object), return_inverse=True)
+        com_parametros = np.array([nome in self._parametros for nome in nomes], dtype=bool)
+        linhas = np.flatnonzero(com_parametros[grupos]) if len(grupos) else np.empty(0, dtype=np.int64)
+        # séries agrupadas por material, na ordem original dentro de cada material
+        linhas = linhas[np.argsort(grupos[linhas], kind="stable")]
+        grupos = grupos[linhas]
+        demanda = np.asarray(previsao["demanda_diaria"], dtype=np.float64)[linhas]
+        inicios = np.flatnonzero(np.r_[True, grupos[1:] != grupos[:-1]]) if len(grupos) else np.empty(0, dtype=np.int64)
+        fins = np.r_[inicios[1:], len(grupos)].astype(np.int64)
+
+        quantidades = np.empty(len(linhas))
+        precos = np.empty(len(linhas))
+        custos = np.empty(len(linhas))
+        pendentes = []
+        for inicio, fim in zip(inicios.tolist(), fins.tolist()):
+            chave = (self._parametros[nomes[grupos[inicio]]], demanda[inicio:fim].tobytes())
+            resultado = self._cache.get(chave)
+            if resultado is None:
+                self._falhas += 1
+                pendentes.append((chave, inicio, fim))
+                continue
+            self._acertos += 1
+            self._cache.move_to_end(chave)
+            quantidades[inicio:fim], precos[inicio:fim], custos[inicio:fim] = resultado
+
+        if pendentes:
+            # todas as séries dos materiais fora do cache numa única passada vetorial
+            posicoes = np.concatenate([np.arange(inicio, fim) for _, inicio, fim in pendentes])
+            calculado = self._otimizar(
+                demanda[posicoes], [chave[0] for chave, _, _ in pendentes], [fim - inicio for _, inicio, fim in pendentes]
+            )
+            for coluna, destino in zip(calculado, (quantidades, precos, custos)):
+                destino[posicoes] = coluna
+            for chave, inicio, fim in pendentes:
+                self._guardar(chave, (quantidades[inicio:fim].copy(), precos[inicio:fim].copy(),
+                                      custos[inicio:fim].copy()))
+
+        materiais = [previsao["materiais"][i] for i in linhas.tolist()]
+        return {
+            "unidades": [previsao["unidades"][i] for i in linhas.tolist()],
+            "materiais": materiais,
+            "quantidade_pedido": quantidades,
+            "preco_unitario": precos,
+            "custo_diario": custos,
+            "ponto_reposicao": self._pontos_reposicao(previsao, linhas, materiais, demanda),
+            "demanda_diaria": demanda
+        }
+
+    def _pontos_reposicao(self, previsao, linhas, materiais, demanda):
+        # demanda no lead time + estoque de segurança; com lead time próprio do material,
+        # a segurança (fator·desvio·sqrt(lead time)) é reescalada por sqrt(novo/antigo)
+        lead_times = np.asarray(previsao["lead_time_dias"], dtype=np.float64)[linhas]
+        demanda_lead_time = np.asarray(previsao["demanda_lead_time"], dtype=np.float64)[linhas]
+        seguranca = np.asarray(previsao["estoque_seguranca"], dtype=np.float64)[linhas]
+        if self._lead_times:
+            proprios = np.array([self._lead_times.get(m, np.nan) for m in materiais], dtype=np.float64)
+            definidos = ~np.isnan(proprios)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                escala = np.where(lead_times > 0, np.sqrt(proprios / lead_times), 0.0)
+            demanda_lead_time = np.where(definidos, demanda * proprios, demanda_lead_time)
+            seguranca = np.where(definidos, seguranca * escala, seguranca)
+        return demanda_lead_time + seguranca
+
+    def _guardar(self, chave, resultado):
+        self._cache[chave] = resultado
+        while len(self._cache) > self.tamanho_cache:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _tabela_faixas(parametros):
+        # uma linha por material: limites [minimo, proximo minimo) e preço de cada faixa;
+        # faixas inexistentes (materiais com menos faixas) ficam com limite infinito
+        num_faixas = 1 + max((len(p[1]) for p in parametros), default=0)
+        minimos = np.full((len(parametros), num_faixas + 1), np.inf)
+        precos = np.full((len(parametros), num_faixas), np.inf)
+        minimos[:, 0] = 0.0
+        precos[:, 0] = [p[0] for p in parametros]
+        for i, (preco, faixas, _, _) in enumerate(parametros):
+            for k, (minimo, desconto) in enumerate(faixas, start=1):
+                minimos[i, k] = minimo
+                precos[i, k] = preco * (1 - desconto)
+        return minimos, precos
+
+    @classmethod
+    def _otimizar(cls, demanda, parametros, series_por_material):
+        """
+        (quantidade, preço unitário, custo diário) de menor custo para cada série;
+        as séries vêm agrupadas por material, `series_por_material[i]` delas com `parametros[i]`.
+        """
+        minimos, precos = cls._tabela_faixas(parametros)
+        custo_pedido = np.array([p[2] for p in parametros])
+        armazenagem = np.array([p[3] for p in parametros])
+        # tabela por material expandida para uma linha por série
+        expandir = np.repeat(np.arange(len(parametros)), series_por_material)
+        minimos, precos = minimos[expandir], precos[expandir]
+        custo_pedido, armazenagem = custo_pedido[expandir, None], armazenagem[expandir, None]
+        d = np.maximum(demanda, 0.0)[:, None]
+
+        lote_economico = np.sqrt(2 * d * custo_pedido / armazenagem)
+        validas = np.isfinite(minimos[:, :-1])
+        inferior = np.where(validas, minimos[:, :-1], 0.0)
+        superior = np.where(validas, minimos[:, 1:], 0.0)
+        # pedidos em unidades inteiras: o custo é convexo dentro da faixa, então o
+        # ótimo inteiro é o piso ou o teto do lote econômico limitado à faixa
+        menor_pedido = np.maximum(np.ceil(inferior), 1.0)
+        continuo = np.clip(lote_economico, menor_pedido, np.maximum(superior, menor_pedido))
+        candidatos = np.concatenate([np.maximum(np.floor(continuo), menor_pedido), np.ceil(continuo)], axis=1)
+        precos = np.concatenate([precos, precos], axis=1)
+        with np.errstate(invalid="ignore"):
+            custo = d * precos + custo_pedido * d / candidatos + armazenagem * candidatos / 2
+        custo = np.where(np.concatenate([validas, validas], axis=1), custo, np.inf)
+
+        melhor = custo.argmin(axis=1)
+        linhas = np.arange(len(demanda))
+        quantidade = candidatos[linhas, melhor]
+        sem_demanda = d[:, 0] == 0  # nada a pedir: custo zero
+        return (
+            np.where(sem_demanda, 0.0, quantidade),
+            precos[linhas, melhor],
+            np.where(sem_demanda, 0.0, custo[linhas, melhor])
+        )
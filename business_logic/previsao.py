@@ -0,0 +1,131 @@
+import datetime
+
+import numpy as np
+
+from data_layer.storage import leitura_consistente
+
+DIA_US = 86_400 * 1_000_000
+
+
+class MotorPrevisao:
+    """
+    previsão de demanda vetorizada sobre todas as séries (unidade, material).
+    O histórico é agrupado em séries diárias (janelas de 24h terminando na
+    data de referência) e, para todas as séries de uma vez, calcula média
+    móvel, suavização exponencial simples, previsão para o horizonte e
+    demanda durante o lead time com estoque de segurança.
+    As séries são lidas de um instantâneo do data store (`leitura_consistente`).
+    """
+    def __init__(self, data_store, dias_historico=90, janela_media=7, alfa=0.3,
+                 horizonte_dias=30, lead_time_dias=7, fator_seguranca=1.65):
+        self.data_store = data_store
+        self.dias_historico = dias_historico
+        self.janela_media = janela_media
+        self.alfa = alfa
+        self.horizonte_dias = horizonte_dias
+        self.lead_time_dias = lead_time_dias  # número ou {material: dias}; o README cita 3-7 dias
+        self.fator_seguranca = fator_seguranca
+
+    def series_diarias(self, referencia=None):
+        """
+        retorna (unidades, materiais, matriz) em que a linha i da matriz é o
+        consumo diário da série (unidades[i], materiais[i]) nos últimos
+        `dias_historico` dias; a última coluna é o dia que termina em `referencia`.
+        """
+        referencia = referencia or datetime.datetime.now()
+        fim_us = round(referencia.timestamp() * 1_000_000)
+
+        fonte = leitura_consistente(self.data_store)
+        nomes_unidades = list(fonte.unidades_com_historico())
+        num_materiais = fonte.num_materiais
+        colunas = (
+            (indice_unidade, *fonte.get_colunas_consumo(unidade))
+            for indice_unidade, unidade in enumerate(nomes_unidades)
+        )
+        series, matriz = self.agrupar_series(colunas, fim_us, num_materiais)
+        unidades = [nomes_unidades[i] for i in series // num_materiais]
+        materiais = [fonte.nome_material(m) for m in series % num_materiais]
+        return unidades, materiais, matriz
+
+    def agrupar_series(self, colunas, fim_us, num_materiais):
+        """
+        agrupa colunas (indice_unidade, materiais, quantidades, timestamps) em
+        séries diárias. Retorna (series, matriz): `series` é a chave ordenada
+        indice_unidade * num_materiais + material_id de cada linha da matriz.
+        """
+        inicio_us = fim_us - self.dias_historico * DIA_US
+        chaves, dias, quantidades = [], [], []
+        for indice_unidade, mat, qtd, ts in colunas:
+            # colunas em ordem de tempo: a janela é obtida por busca binária
+            i, j = np.searchsorted(ts, [inicio_us, fim_us], side="left")
+            if i == j:
+                continue
+            chaves.append(indice_unidade * num_materiais + mat[i:j].astype(np.int64))
+            dias.append((ts[i:j] - inicio_us) // DIA_US)
+            quantidades.append(qtd[i:j])
+
+        if not chaves:
+            return np.empty(0, dtype=np.int64), np.zeros((0, self.dias_historico))
+
+        chaves = np.concatenate(chaves)
+        series, inversa = np.unique(chaves, return_inverse=True)
+        celulas = inversa * self.dias_historico + np.concatenate(dias)
+        matriz = np.bincount(
+            celulas, weights=np.concatenate(quantidades), minlength=len(series) * self.dias_historico
+        ).reshape(len(series), self.dias_historico)
+        return series, matriz
+
+    def _suavizacao_exponencial(self, matriz):
+        # nível final da SES em forma fechada: uma soma ponderada por linha
+        # l_T = sum_t alfa(1-alfa)^(T-1-t) x_t, com l_0 = x_0. A redução por linha
+        # (em vez de matriz @ pesos, cujo blocking no BLAS depende do número de
+        # linhas) dá o mesmo valor para a série qualquer que seja a partição
+        dias = matriz.shape[1]
+        pesos = self.alfa * (1 - self.alfa) ** np.arange(dias - 1, -1, -1, dtype=np.float64)
+        pesos[0] = (1 - self.alfa) ** (dias - 1)
+        return (matriz * pesos).sum(axis=1)
+
+    def _lead_times(self, materiais):
+        if isinstance(self.lead_time_dias, dict):
+            padrao = max(self.lead_time_dias.values(), default=7)
+            return np.array([self.lead_time_dias.get(m, padrao) for m in materiais], dtype=np.float64)
+        return np.full(len(materiais), float(self.lead_time_dias))
+
+    def prever(self, referencia=None):
+        """
+        retorna um dict com as listas `unidades` e `materiais` e arrays alinhados:
+        media_movel e demanda_diaria (por dia), previsao_horizonte,
+        demanda_lead_time, estoque_seguranca e lead_time_dias.
+        """
+        unidades, materiais, matriz = self.series_diarias(referencia)
+        return self.montar_resultado(unidades, materiais, *self.metricas(matriz))
+
+    def metricas(self, matriz):
+        """estatísticas por linha da matriz de séries: (media_movel, demanda_diaria, desvio)."""
+        janela = matriz[:, -self.janela_media:]
+        return janela.mean(axis=1), self._suavizacao_exponencial(matriz), matriz.std(axis=1)
+
+    def montar_resultado(self, unidades, materiais, media_movel, demanda_diaria, desvio):
+        """monta o dict de `prever` a partir das métricas por série."""
+        lead_times = self._lead_times(materiais)
+        return {
+            "unidades": unidades,
+            "materiais": materiais,
+            "media_movel": media_movel,
+            "demanda_diaria": demanda_diaria,
+            "previsao_horizonte": demanda_diaria * self.horizonte_dias,
+            "lead_time_dias": lead_times,
+            "demanda_lead_time": demanda_diaria * lead_times,
+            "estoque_seguranca": self.fator_seguranca * desvio * np.sqrt(lead_times)
+        }
+
+    def prever_por_material(self, referencia=None):
+        """soma a previsão do horizonte de todas as unidades, por material."""
+        return self.somar_por_material(self.prever(referencia))
+
+    @staticmethod
+    def somar_por_material(resultado):
+        previsoes = {}
+        for material, valor in zip(resultado["materiais"], resultado["previsao_horizonte"]):
+            previsoes[material] = previsoes.get(material, 0.0) + float(valor)
+        return previsoes
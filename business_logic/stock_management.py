@@ -1,102 +1,382 @@
 from data_layer.storage import StockData
+from business_logic.eventos import SinkSilencioso
+from contextlib import ExitStack, contextmanager
 import datetime
+import threading
 
 class SistemaGestaoEstoque:
     """
     gerencia as operações de estoque, como registro de consumo, reabastecimento,
-    consultas e alertas de nível mínimo.
+    consultas e alertas de nível mínimo. As mensagens de cada operação são
+    emitidas como eventos para o `sink` configurado (silencioso por padrão);
+    a renderização fica a cargo da camada de interface.
+
+    As operações podem ser chamadas de várias threads: cada leitura-alteração-
+    escrita de estoque acontece sob a trava da unidade, e operações sobre mais
+    de uma unidade (lotes, transferências) adquirem as travas em ordem fixa.
     """
-    def __init__(self):
-        self.data_store = StockData()
-        self.estoque = self.data_store.estoque  # Referência direta para simplificar a demonstração
-        self.historico_consumo = self.data_store.historico_consumo
-        self.alertas = self.data_store.alertas
+    def __init__(self, data_store=None, sink=None):
+        self.data_store = data_store if data_store is not None else StockData()
+        self.sink = sink if sink is not None else SinkSilencioso()
+        self._travas = {}  # unidade -> RLock
+        self._trava_registro = threading.Lock()
+
+    def _trava(self, unidade):
+        trava = self._travas.get(unidade)
+        if trava is None:
+            with self._trava_registro:
+                trava = self._travas.setdefault(unidade, threading.RLock())
+        return trava
+
+    @contextmanager
+    def travar_unidades(self, *unidades):
+        """
+        adquire as travas das unidades em ordem canônica (evita deadlock entre
+        operações que travam as mesmas unidades em ordens diferentes).
+        """
+        with ExitStack() as pilha:
+            for unidade in sorted(set(unidades), key=lambda u: (type(u).__name__, str(u))):
+                pilha.enter_context(self._trava(unidade))
+            yield
+
+    # Referências diretas para simplificar a demonstração; delegam ao backend
+    # para funcionar tanto com o StockData em memória quanto com o SQLite.
+    @property
+    def estoque(self):
+        return self.data_store.estoque
+
+    @property
+    def historico_consumo(self):
+        return self.data_store.historico_consumo
+
+    @property
+    def alertas(self):
+        return self.data_store.alertas
 
     def registrar_consumo(self, unidade, material, quantidade):
         """registra o consumo de um material em uma unidade."""
         if quantidade <= 0:
-            print("Erro: A quantidade de consumo deve ser positiva.")
-            return
+            self.sink.emitir("erro", mensagem="A quantidade de consumo deve ser positiva.")
+            return None
         
-        current_stock = self.data_store.get_estoque(unidade, material) or 0
-        new_stock = current_stock - quantidade
-        
-        if new_stock < 0:
-            print(f"Alerta: Consumo de {quantidade} unidades de {material} na {unidade} excede o estoque disponível ({current_stock}).")
-            # return
+        with self._trava(unidade):
+            current_stock = self.data_store.get_estoque(unidade, material) or 0
+            new_stock = current_stock - quantidade
             
-        self.data_store.update_estoque(unidade, material, max(0, new_stock))
-        self.data_store.add_historico_consumo(unidade, material, quantidade, datetime.datetime.now())
-        self._verificar_alerta_minimo(unidade, material)
-        print(f"Consumo registrado: {quantidade} unidades de {material} na {unidade}. Estoque atual: {max(0, new_stock)}.")
+            if new_stock < 0:
+                self.sink.emitir("consumo_excede_estoque", unidade=unidade, material=material,
+                                 quantidade=quantidade, estoque_disponivel=current_stock)
+                # return
+                
+            self.data_store.update_estoque(unidade, material, max(0, new_stock))
+            self.data_store.add_historico_consumo(unidade, material, quantidade, datetime.datetime.now())
+            alerta = self._verificar_alerta_minimo(unidade, material)
+        self.sink.emitir("consumo_registrado", unidade=unidade, material=material,
+                         quantidade=quantidade, estoque_atual=max(0, new_stock))
+        return {
+            "unidade": unidade,
+            "material": material,
+            "quantidade": quantidade,
+            "estoque_atual": max(0, new_stock),
+            "excedeu_estoque": new_stock < 0,
+            "alerta": alerta
+        }
 
     def reabastecer(self, unidade, material, quantidade):
         """registra o reabastecimento de um material em uma unidade."""
         if quantidade <= 0:
-            print("Erro: A quantidade de reabastecimento deve ser positiva.")
-            return
+            self.sink.emitir("erro", mensagem="A quantidade de reabastecimento deve ser positiva.")
+            return None
         
-        current_stock = self.data_store.get_estoque(unidade, material) or 0
-        new_stock = current_stock + quantidade
-        self.data_store.update_estoque(unidade, material, new_stock)
-        print(f"reabastecimento registrado: {quantidade} unidades de {material} na {unidade}. Estoque atual: {new_stock}.")
+        with self._trava(unidade):
+            current_stock = self.data_store.get_estoque(unidade, material) or 0
+            new_stock = current_stock + quantidade
+            self.data_store.update_estoque(unidade, material, new_stock)
+        self.sink.emitir("reabastecimento_registrado", unidade=unidade, material=material,
+                         quantidade=quantidade, estoque_atual=new_stock)
+        return {
+            "unidade": unidade,
+            "material": material,
+            "quantidade": quantidade,
+            "estoque_atual": new_stock
+        }
+
+    def registrar_consumo_lote(self, eventos):
+        """
+        registra vários consumos em uma única passada. Cada evento é uma tupla
+        (unidade, material, quantidade[, timestamp]) ou um dict com essas chaves.
+        Os alertas são avaliados uma vez por (unidade, material) ao final.
+        """
+        return self._aplicar_lote(eventos, consumo=True)
+
+    def reabastecer_lote(self, eventos):
+        """registra vários reabastecimentos (unidade, material, quantidade) em uma única passada."""
+        return self._aplicar_lote(eventos, consumo=False)
+
+    def aplicar_movimentos_lote(self, movimentos):
+        """
+        aplica consumos e reabastecimentos misturados, na ordem dada, em uma única
+        passada. Cada movimento é (operacao, unidade, material, quantidade[, timestamp])
+        ou um dict com a chave "op", com operacao "consumo" ou "reabastecimento".
+        """
+        return self._aplicar_lote(movimentos, consumo=None)
+
+    def _aplicar_lote(self, eventos, consumo):
+        # consumo=None: a operação vem em cada evento (ver aplicar_movimentos_lote)
+        agora = datetime.datetime.now()
+        estoques = {}  # (unidade, material) -> estoque corrente dentro do lote
+        historico = []
+        rejeitados = []
+        excedentes = []
+        aplicados = 0
+
+        validos = []
+        for indice, evento in enumerate(eventos):
+            try:
+                if consumo is None:
+                    eh_consumo, evento_normalizado = self._normalizar_movimento(evento)
+                else:
+                    eh_consumo, evento_normalizado = consumo, evento
+                unidade, material, quantidade, timestamp = self._normalizar_evento(evento_normalizado)
+                positiva = quantidade > 0
+            except (TypeError, ValueError, KeyError) as erro:
+                rejeitados.append({"indice": indice, "evento": evento, "motivo": f"evento inválido: {erro}"})
+                continue
+            if not positiva:
+                rejeitados.append({"indice": indice, "evento": evento, "motivo": "quantidade deve ser positiva"})
+                continue
+            validos.append((indice, eh_consumo, unidade, material, quantidade, timestamp))
+
+        # o lote inteiro é aplicado sob as travas das unidades que ele toca
+        with self.travar_unidades(*{evento[2] for evento in validos}):
+            for indice, eh_consumo, unidade, material, quantidade, timestamp in validos:
+                chave = (unidade, material)
+                current_stock = estoques.get(chave)
+                if current_stock is None:
+                    current_stock = self.data_store.get_estoque(unidade, material) or 0
+
+                if eh_consumo:
+                    new_stock = current_stock - quantidade
+                    if new_stock < 0:
+                        excedentes.append({
+                            "indice": indice,
+                            "unidade": unidade,
+                            "material": material,
+                            "quantidade": quantidade,
+                            "estoque_disponivel": current_stock
+                        })
+                    estoques[chave] = max(0, new_stock)
+                    historico.append((unidade, material, quantidade, timestamp or agora))
+                else:
+                    estoques[chave] = current_stock + quantidade
+                aplicados += 1
+
+            self.data_store.update_estoque_lote(
+                (unidade, material, qtd) for (unidade, material), qtd in estoques.items()
+            )
+            if historico:
+                self.data_store.add_historico_consumo_lote(historico)
+
+        alertas = []
+        for unidade, material in estoques:
+            alerta = self._verificar_alerta_minimo(unidade, material)
+            if alerta:
+                alertas.append(alerta)
+
+        operacao = "movimentos" if consumo is None else ("consumo" if consumo else "reabastecimento")
+        self.sink.emitir("lote_aplicado", operacao=operacao,
+                         aplicados=aplicados, rejeitados=len(rejeitados), itens_atualizados=len(estoques))
+        return {
+            "aplicados": aplicados,
+            "rejeitados": rejeitados,
+            "excedentes": excedentes,
+            "estoque_atualizado": [
+                {"unidade": unidade, "material": material, "estoque_atual": qtd}
+                for (unidade, material), qtd in estoques.items()
+            ],
+            "alertas": alertas
+        }
+
+    @staticmethod
+    def _normalizar_movimento(movimento):
+        """separa a operação do movimento; retorna (é consumo, evento sem a operação)."""
+        if isinstance(movimento, dict):
+            operacao = movimento["op"]
+        else:
+            operacao, movimento = movimento[0], movimento[1:]
+        if operacao not in ("consumo", "reabastecimento"):
+            raise ValueError(f"operação desconhecida: {operacao}")
+        return operacao == "consumo", movimento
+
+    @staticmethod
+    def _normalizar_evento(evento):
+        """aceita (unidade, material, quantidade[, timestamp]) ou dict equivalente."""
+        if isinstance(evento, dict):
+            return evento["unidade"], evento["material"], evento["quantidade"], evento.get("timestamp")
+        if len(evento) == 3:
+            unidade, material, quantidade = evento
+            return unidade, material, quantidade, None
+        unidade, material, quantidade, timestamp = evento
+        return unidade, material, quantidade, timestamp
+
+    def ajustar_estoque(self, unidade, material, delta, minimo=0):
+        """
+        soma `delta` ao estoque de forma atômica se o resultado não ficar abaixo
+        de `minimo`; retorna o novo estoque, ou None se o ajuste foi recusado.
+        Não registra histórico nem emite eventos.
+        """
+        with self._trava(unidade):
+            novo = (self.data_store.get_estoque(unidade, material) or 0) + delta
+            if novo < minimo:
+                return None
+            self.data_store.update_estoque(unidade, material, novo)
+            return novo
+
+    def comparar_e_atualizar(self, unidade, material, esperado, novo):
+        """grava `novo` somente se o estoque atual for `esperado` (compare-and-set); retorna se gravou."""
+        with self._trava(unidade):
+            if self.data_store.get_estoque(unidade, material) != esperado:
+                return False
+            self.data_store.update_estoque(unidade, material, novo)
+            return True
+
+    def transferir(self, origem, destino, material, quantidade):
+        """
+        debita a origem e credita o destino atomicamente, com as duas unidades
+        travadas. Retorna (estoque_origem, estoque_destino) ou None se a origem
+        não tiver estoque suficiente.
+        """
+        with self.travar_unidades(origem, destino):
+            estoque_origem = self.data_store.get_estoque(origem, material)
+            if estoque_origem is None or estoque_origem < quantidade:
+                return None
+            estoque_destino = self.data_store.get_estoque(destino, material) or 0
+            if origem == destino:
+                return estoque_origem, estoque_origem
+            self.data_store.update_estoque_lote([
+                (origem, material, estoque_origem - quantidade),
+                (destino, material, estoque_destino + quantidade)
+            ])
+            return estoque_origem - quantidade, estoque_destino + quantidade
 
     def consultar_estoque(self, unidade, material=None):
         """consultaa o estoque de um material específico ou de toda a unidade."""
         if material:
             quantidade = self.data_store.get_estoque(unidade, material)
-            if quantidade is not None:
-                print(f"estoque de {material} na {unidade}: {quantidade} unidades.")
-                return quantidade
-            else:
-                print(f"Material '{material}' não encontrado na unidade '{unidade}'.")
-                return None
+            self.sink.emitir("estoque_consultado", unidade=unidade, material=material, quantidade=quantidade)
+            return quantidade
         else:
             estoque_unidade = self.data_store.get_estoque(unidade)
-            if estoque_unidade:
-                print(f"Estoque da unidade {unidade}:")
-                for mat, qtd in estoque_unidade.items():
-                    print(f"  - {mat}: {qtd} unidades")
-                return estoque_unidade
-            else:
-                print(f"Unidade '{unidade}' sem materiais registrados ou não encontrada.")
-                return {}
+            self.sink.emitir("estoque_unidade_consultado", unidade=unidade, estoque=estoque_unidade)
+            return estoque_unidade if estoque_unidade else {}
 
     def definir_limite_minimo(self, unidade, material, limite):
         """define um limite mínimo de estoque para um material."""
         if limite < 0:
-            print("Erro: O limite mínimo não pode ser negativo.")
-            return
+            self.sink.emitir("erro", mensagem="O limite mínimo não pode ser negativo.")
+            return None
         self.data_store.set_limite_minimo(unidade, material, limite)
-        print(f"Limite mínimo de {limite} para {material} na {unidade} definido.")
-        self._verificar_alerta_minimo(unidade, material)
+        self.sink.emitir("limite_definido", unidade=unidade, material=material, limite=limite)
+        return {
+            "unidade": unidade,
+            "material": material,
+            "limite_minimo": limite,
+            "alerta": self._verificar_alerta_minimo(unidade, material)
+        }
 
     def verificar_alertas(self):
-        """verifica e retorna os materiais abaixo do limite mínimo."""
-        alertas_atuais = []
-        for unidade, materiais_alertas in self.data_store.alertas.items():
-            for material, limite in materiais_alertas.items():
-                current_stock = self.data_store.get_estoque(unidade, material) or 0
-                if current_stock < limite:
-                    alertas_atuais.append({
-                        "unidade": unidade,
-                        "material": material,
-                        "estoque_atual": current_stock,
-                        "limite_minimo": limite
-                    })
-        if alertas_atuais:
-            print("\nALERTA: Materiais abaixo do limite mínimo!")
-            for alerta in alertas_atuais:
-                print(f"""  - Unidade: {alerta['unidade']}, Material: {alerta['material']},
-                   Estoque: {alerta['estoque_atual']}, Limite: {alerta['limite_minimo']}""")
-        else:
-            print("\nSem alertas de estoque no momento.")
+        """retorna os materiais abaixo do limite mínimo (O(alertas ativos), via índice do data store)."""
+        alertas_atuais = self.data_store.indice_alertas.ativos()
+        self.sink.emitir("alertas_verificados", alertas=alertas_atuais)
         return alertas_atuais
 
+    def inscrever_alertas(self, callback):
+        """
+        registra `callback(evento, alerta)`, chamado quando um material cruza o
+        limite mínimo para baixo ("abaixo_do_limite") ou volta acima dele ("normalizado").
+        """
+        return self.data_store.indice_alertas.inscrever(callback)
+
+    def prioridades_reposicao(self, k=10):
+        """
+        os k pares (unidade, material) abaixo do limite com menor fração do
+        limite em estoque (`criticidade`), lidos da fila indexada do data store.
+        """
+        return self.data_store.indice_alertas.mais_criticos(k)
+
+    def _avaliar_alerta(self, unidade, material):
+        """retorna o alerta do material se ele estiver abaixo do limite mínimo, senão None."""
+        return self.data_store.indice_alertas.alerta(unidade, material)
+
     def _verificar_alerta_minimo(self, unidade, material):
-        """verifica se um material está abaixo do limite mínimo e exibe um alerta."""
-        limite = self.data_store.get_limite_minimo(unidade, material)
-        if limite is not None:
-            current_stock = self.data_store.get_estoque(unidade, material) or 0
-            if current_stock < limite:
-                print(f"*** ALERTA: {material} na {unidade} está abaixo do limite mínimo ({current_stock}/{limite}) ***") 
\ No newline at end of file
+        """verifica se um material está abaixo do limite mínimo, emite e retorna o alerta."""
+        alerta = self._avaliar_alerta(unidade, material)
+        if alerta:
+            self.sink.emitir("alerta_minimo", **alerta)
+        return alerta
+ 
+
+def _aplicar_lote_no(data_store, eventos, consumo):
+    """executado dentro de um nó de StockDataParticionado: aplica a parte do lote que cabe ao nó."""
+    return SistemaGestaoEstoque(data_store)._aplicar_lote(eventos, consumo)
+
+
+class SistemaGestaoParticionado(SistemaGestaoEstoque):
+    """
+    SistemaGestaoEstoque sobre um StockDataParticionado. Os lotes são divididos
+    por nó e aplicados dentro dos próprios nós, em paralelo (uma ida e volta por
+    nó por lote, em vez de uma por leitura ou escrita); as demais operações usam
+    a interface de StockData do coordenador, e as que tocam mais de uma partição
+    (transferências) são confirmadas em duas fases pelo data store.
+    """
+    def _aplicar_lote(self, eventos, consumo):
+        eventos = eventos if isinstance(eventos, list) else list(eventos)
+        posicao_unidade = 0 if consumo is not None else 1
+        rejeitados = []
+        por_unidade = {}  # unidade -> índices no lote; o nó é resolvido uma vez por unidade
+        for indice, evento in enumerate(eventos):
+            try:
+                unidade = evento["unidade"] if isinstance(evento, dict) else evento[posicao_unidade]
+                indices = por_unidade.get(unidade)
+            except (TypeError, KeyError, IndexError) as erro:
+                rejeitados.append({"indice": indice, "evento": evento, "motivo": f"evento inválido: {erro}"})
+                continue
+            if indices is None:
+                indices = por_unidade[unidade] = []
+            indices.append(indice)
+
+        por_no = {}  # nó -> índices no lote original (a ordem de cada unidade é preservada)
+        for unidade, indices in por_unidade.items():
+            por_no.setdefault(self.data_store.no_da_unidade(unidade), []).extend(indices)
+        por_no = {no: (indices, [eventos[i] for i in indices]) for no, indices in por_no.items()}
+
+        with self.travar_unidades(*por_unidade):
+            parciais = self.data_store.executar_por_no({
+                no: (_aplicar_lote_no, (parte, consumo)) for no, (_, parte) in por_no.items()
+            })
+
+        aplicados = 0
+        excedentes, estoque_atualizado, alertas = [], [], []
+        for no, (indices, _) in por_no.items():
+            parcial = parciais[no]
+            aplicados += parcial["aplicados"]
+            # os índices de cada nó se referem à sua parte do lote
+            rejeitados.extend({**r, "indice": indices[r["indice"]]} for r in parcial["rejeitados"])
+            excedentes.extend({**e, "indice": indices[e["indice"]]} for e in parcial["excedentes"])
+            estoque_atualizado.extend(parcial["estoque_atualizado"])
+            alertas.extend(parcial["alertas"])
+        rejeitados.sort(key=lambda r: r["indice"])
+        excedentes.sort(key=lambda e: e["indice"])
+
+        for alerta in alertas:
+            self.sink.emitir("alerta_minimo", **alerta)
+        operacao = "movimentos" if consumo is None else ("consumo" if consumo else "reabastecimento")
+        self.sink.emitir("lote_aplicado", operacao=operacao,
+                         aplicados=aplicados, rejeitados=len(rejeitados), itens_atualizados=len(estoque_atualizado))
+        return {
+            "aplicados": aplicados,
+            "rejeitados": rejeitados,
+            "excedentes": excedentes,
+            "estoque_atualizado": estoque_atualizado,
+            "alertas": alertas
+        }
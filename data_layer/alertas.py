@@ -0,0 +1,125 @@
+import threading
+
+from algorithms.data_structures import FilaPrioridadeIndexada
+
+ABAIXO_DO_LIMITE = "abaixo_do_limite"
+NORMALIZADO = "normalizado"
+
+
+class IndiceAlertas:
+    """
+    índice dos pares (unidade, material) abaixo do limite mínimo, atualizado a
+    cada alteração de estoque ou de limite. A consulta dos alertas ativos custa
+    O(alertas ativos) e os inscritos são notificados quando um par cruza o
+    limite para baixo (ABAIXO_DO_LIMITE) ou volta para cima dele (NORMALIZADO).
+    Os alertas ativos também ficam numa fila de reposição ordenada pela
+    criticidade (estoque / limite), atualizada no lugar a cada alteração.
+    É seguro entre threads; os inscritos são notificados fora da trava.
+    """
+    def __init__(self):
+        self._trava = threading.RLock()
+        self._limites = {}  # (unidade, material) -> limite
+        self._ativos = {}  # (unidade, material) -> alerta
+        self._inscritos = []
+        self.fila_reposicao = FilaPrioridadeIndexada()
+
+    def inscrever(self, callback):
+        """registra `callback(evento, alerta)` para as mudanças de estado dos alertas."""
+        self._inscritos.append(callback)
+        return callback
+
+    def cancelar_inscricao(self, callback):
+        self._inscritos.remove(callback)
+
+    def definir_limite(self, unidade, material, limite, estoque):
+        with self._trava:
+            self._limites[(unidade, material)] = limite
+            notificacao = self._avaliar((unidade, material), estoque or 0, limite)
+        self._notificar(notificacao)
+
+    def atualizar_estoque(self, unidade, material, estoque):
+        chave = (unidade, material)
+        with self._trava:
+            limite = self._limites.get(chave)
+            if limite is None:
+                return
+            notificacao = self._avaliar(chave, estoque or 0, limite)
+        self._notificar(notificacao)
+
+    def _avaliar(self, chave, estoque, limite):
+        # retorna (evento, alerta) quando o par cruza o limite, senão None
+        if estoque < limite:
+            alerta = {
+                "unidade": chave[0],
+                "material": chave[1],
+                "estoque_atual": estoque,
+                "limite_minimo": limite
+            }
+            novo = chave not in self._ativos
+            self._ativos[chave] = alerta
+            self.fila_reposicao.atualizar(chave, self._criticidade(estoque, limite))
+            if novo:
+                return ABAIXO_DO_LIMITE, dict(alerta)
+        else:
+            alerta = self._ativos.pop(chave, None)
+            if alerta is not None:
+                self.fila_reposicao.remover(chave)
+                return NORMALIZADO, {**alerta, "estoque_atual": estoque}
+        return None
+
+    @staticmethod
+    def _criticidade(estoque, limite):
+        # fração do limite ainda em estoque: 0 é o mais crítico
+        return estoque / limite if limite > 0 else 0.0
+
+    def _notificar(self, notificacao):
+        if notificacao is None:
+            return
+        for callback in list(self._inscritos):
+            callback(*notificacao)
+
+    def ativos(self):
+        """retorna a lista dos alertas ativos."""
+        with self._trava:
+            return [dict(alerta) for alerta in self._ativos.values()]
+
+    def alerta(self, unidade, material):
+        """retorna o alerta ativo do par, ou None."""
+        with self._trava:
+            alerta = self._ativos.get((unidade, material))
+            return dict(alerta) if alerta else None
+
+    def mais_criticos(self, k):
+        """os k alertas ativos mais críticos, com a chave extra `criticidade`."""
+        with self._trava:
+            return [
+                {**self._ativos[chave], "criticidade": criticidade}
+                for criticidade, chave in self.fila_reposicao.menores(k)
+            ]
+
+    def reconstruir(self, estoque, limites):
+        """recalcula o índice inteiro a partir de {unidade: {material: ...}} (sem notificar)."""
+        self.reconstruir_pares(
+            (unidade, material, estoque.get(unidade, {}).get(material), limite)
+            for unidade, materiais in limites.items()
+            for material, limite in materiais.items()
+        )
+
+    def reconstruir_pares(self, pares):
+        """recalcula o índice a partir de (unidade, material, estoque, limite) de cada par com limite."""
+        with self._trava:
+            self._limites = {}
+            self._ativos = {}
+            self.fila_reposicao = FilaPrioridadeIndexada()
+            for unidade, material, atual, limite in pares:
+                chave = (unidade, material)
+                self._limites[chave] = limite
+                atual = atual or 0
+                if atual < limite:
+                    self._ativos[chave] = {
+                        "unidade": unidade,
+                        "material": material,
+                        "estoque_atual": atual,
+                        "limite_minimo": limite
+                    }
+                    self.fila_reposicao.atualizar(chave, self._criticidade(atual, limite))
@@ -0,0 +1,282 @@
+import copy
+from collections.abc import Mapping
+
+import numpy as np
+
+CAMPOS = ("estoque", "limite")
+_BITS_BLOCO = 6  # blocos de 64 linhas: bloco e linha saem de deslocamento e máscara
+_MASCARA_LINHA = (1 << _BITS_BLOCO) - 1
+
+
+def _numero(valor):
+    # como no backend SQLite: valores inteiros voltam como int
+    return int(valor) if valor.is_integer() else valor
+
+
+class MatrizEstoque:
+    """
+    estoque e limites mínimos em matrizes densas unidade × material (float64),
+    indexadas por ids inteiros: as unidades são internadas aqui e os materiais
+    usam os ids do data store (`nomes_materiais`/`ids_materiais`, compartilhados
+    com o histórico). Células não definidas valem NaN. Varreduras da rede
+    inteira (alertas, totais, desequilíbrios) são operações vetoriais sobre
+    `valores(campo)`; `visao(campo)` é a fachada somente leitura
+    {unidade: {material: valor}}.
+    As linhas ficam em blocos de `LINHAS_POR_BLOCO` unidades: `congelar()`
+    entrega um instantâneo que compartilha os blocos, e a escrita seguinte
+    em um bloco compartilhado copia só aquele bloco (copy-on-write).
+    """
+    CAPACIDADE_INICIAL = 16
+    LINHAS_POR_BLOCO = 1 << _BITS_BLOCO
+
+    def __init__(self, nomes_materiais=None, ids_materiais=None, id_material=None):
+        self.nomes_materiais = nomes_materiais if nomes_materiais is not None else []
+        self.ids_materiais = ids_materiais if ids_materiais is not None else {}
+        self._id_material = id_material or self._registrar_material
+        self.nomes_unidades = []
+        self.ids_unidades = {}
+        self._colunas = 0  # capacidade de materiais de cada bloco
+        self._blocos = {campo: [] for campo in CAMPOS}
+        self._geracoes = {campo: [] for campo in CAMPOS}  # geração em que cada bloco passou a ser exclusivo
+        self.geracao = 0
+        self._forma_congelada = None  # (unidades, materiais) de um instantâneo
+
+    @classmethod
+    def de_dicionarios(cls, estoque, limites):
+        """constrói uma matriz independente a partir de {unidade: {material: valor}} (backends sem matriz)."""
+        matriz = cls()
+        for campo, dados in (("estoque", estoque), ("limite", limites)):
+            for unidade, materiais in dados.items():
+                for material, valor in materiais.items():
+                    matriz.definir(campo, unidade, material, valor)
+        return matriz
+
+    def _registrar_material(self, material):
+        material_id = self.ids_materiais.get(material)
+        if material_id is None:
+            material_id = self.ids_materiais[material] = len(self.nomes_materiais)
+            self.nomes_materiais.append(material)
+        return material_id
+
+    def id_unidade(self, unidade):
+        unidade_id = self.ids_unidades.get(unidade)
+        if unidade_id is None:
+            unidade_id = self.ids_unidades[unidade] = len(self.nomes_unidades)
+            self.nomes_unidades.append(unidade)
+        return unidade_id
+
+    def _garantir(self, linhas, colunas):
+        # colunas: crescimento amortizado (dobra), realocando os blocos; linhas: blocos novos
+        if colunas > self._colunas:
+            self._colunas = max(2 * self._colunas, colunas, self.CAPACIDADE_INICIAL)
+            for campo in CAMPOS:
+                novos = []
+                for antigo in self._blocos[campo]:
+                    novo = np.full((self.LINHAS_POR_BLOCO, self._colunas), np.nan)
+                    novo[:, :antigo.shape[1]] = antigo
+                    novos.append(novo)
+                self._blocos[campo] = novos
+                self._geracoes[campo] = [self.geracao] * len(novos)
+        while len(self._blocos["estoque"]) * self.LINHAS_POR_BLOCO < linhas:
+            for campo in CAMPOS:
+                self._blocos[campo].append(np.full((self.LINHAS_POR_BLOCO, self._colunas), np.nan))
+                self._geracoes[campo].append(self.geracao)
+
+    def _bloco_exclusivo(self, campo, b):
+        # copy-on-write: um bloco ainda visto por um instantâneo é copiado antes da escrita
+        if self._geracoes[campo][b] != self.geracao:
+            self._blocos[campo][b] = self._blocos[campo][b].copy()
+            self._geracoes[campo][b] = self.geracao
+        return self._blocos[campo][b]
+
+    def _verificar_escrita(self):
+        if self._forma_congelada is not None:
+            raise TypeError("instantâneo da matriz é somente leitura")
+
+    @property
+    def forma(self):
+        """(unidades internadas, materiais internados)."""
+        if self._forma_congelada is not None:
+            return self._forma_congelada
+        return len(self.nomes_unidades), len(self.nomes_materiais)
+
+    def congelar(self):
+        """
+        instantâneo somente leitura em O(blocos): compartilha nomes e blocos
+        com esta matriz, cujas próximas escritas copiam o bloco antes de alterá-lo.
+        """
+        congelada = copy.copy(self)
+        congelada._blocos = {campo: list(blocos) for campo, blocos in self._blocos.items()}
+        congelada._geracoes = None
+        congelada._forma_congelada = self.forma
+        self.geracao += 1
+        return congelada
+
+    # --- acesso por célula ---
+
+    def definir(self, campo, unidade, material, valor):
+        self._verificar_escrita()
+        u = self.id_unidade(unidade)
+        m = self._id_material(material)
+        b, linha = u >> _BITS_BLOCO, u & _MASCARA_LINHA
+        if b >= len(self._blocos[campo]) or m >= self._colunas:
+            self._garantir(u + 1, m + 1)
+        self._bloco_exclusivo(campo, b)[linha, m] = valor
+
+    def obter(self, campo, unidade, material):
+        """valor da célula, ou None se não definida."""
+        u = self.ids_unidades.get(unidade)
+        m = self.ids_materiais.get(material)
+        if u is None or m is None:
+            return None
+        try:
+            valor = self._blocos[campo][u >> _BITS_BLOCO].item(u & _MASCARA_LINHA, m)
+        except IndexError:
+            return None
+        return None if valor != valor else _numero(valor)
+
+    def _linha_bruta(self, campo, unidade):
+        u = self.ids_unidades.get(unidade)
+        if u is None or u >= self.forma[0]:
+            return None
+        b, linha = u >> _BITS_BLOCO, u & _MASCARA_LINHA
+        blocos = self._blocos[campo]
+        return blocos[b][linha] if b < len(blocos) else None
+
+    def linha(self, campo, unidade):
+        """{material: valor} das células definidas da unidade (dict novo)."""
+        linha = self._linha_bruta(campo, unidade)
+        if linha is None:
+            return {}
+        colunas = np.flatnonzero(~np.isnan(linha))
+        nomes = self.nomes_materiais
+        return {nomes[m]: _numero(v) for m, v in zip(colunas.tolist(), linha[colunas].tolist())}
+
+    def remover_unidade(self, unidade):
+        """apaga as células da unidade (o id continua internado)."""
+        self._verificar_escrita()
+        u = self.ids_unidades.get(unidade)
+        if u is None:
+            return
+        b, linha = u >> _BITS_BLOCO, u & _MASCARA_LINHA
+        for campo in CAMPOS:
+            if b < len(self._blocos[campo]):
+                self._bloco_exclusivo(campo, b)[linha] = np.nan
+
+    def limpar(self):
+        # estruturas novas em vez de esvaziar: instantâneos podem compartilhar as antigas
+        self._verificar_escrita()
+        self.nomes_unidades = []
+        self.ids_unidades = {}
+        self._colunas = 0
+        self._blocos = {campo: [] for campo in CAMPOS}
+        self._geracoes = {campo: [] for campo in CAMPOS}
+
+    def copia(self):
+        """cópia independente (mesmos nomes, arrays copiados), para análises fora da trava do data store."""
+        linhas, colunas = self.forma
+        nova = MatrizEstoque(list(self.nomes_materiais[:colunas]), {})
+        nova.ids_materiais.update((nome, m) for m, nome in enumerate(nova.nomes_materiais))
+        nova.nomes_unidades = list(self.nomes_unidades[:linhas])
+        nova.ids_unidades = {nome: u for u, nome in enumerate(nova.nomes_unidades)}
+        nova._garantir(linhas, colunas)
+        for campo in CAMPOS:
+            bruto = self._bruto(campo)
+            for b, bloco in enumerate(nova._blocos[campo]):
+                parte = bruto[b * self.LINHAS_POR_BLOCO:(b + 1) * self.LINHAS_POR_BLOCO]
+                bloco[:len(parte), :colunas] = parte
+        return nova
+
+    # --- operações vetoriais ---
+
+    def _bruto(self, campo):
+        # blocos empilhados e recortados à forma, com NaN nas células ausentes
+        linhas, colunas = self.forma
+        blocos = self._blocos[campo]
+        bruto = (np.concatenate(blocos) if len(blocos) > 1 else blocos[0]) if blocos else np.empty((0, 0))
+        bruto = bruto[:linhas, :colunas]
+        if bruto.shape != (linhas, colunas):
+            # materiais registrados depois do último crescimento da matriz
+            completo = np.full((linhas, colunas), np.nan)
+            completo[:bruto.shape[0], :bruto.shape[1]] = bruto
+            bruto = completo
+        return bruto
+
+    def valores(self, campo):
+        """(valores, definidos): matriz unidades × materiais com 0 nas células ausentes e a máscara das definidas."""
+        bruto = self._bruto(campo)
+        definidos = ~np.isnan(bruto)
+        return np.where(definidos, bruto, 0.0), definidos
+
+    def unidades_ativas(self):
+        """máscara das unidades com alguma célula de estoque ou limite definida."""
+        _, com_estoque = self.valores("estoque")
+        _, com_limite = self.valores("limite")
+        return com_estoque.any(axis=1) | com_limite.any(axis=1)
+
+    def totais_por_material(self):
+        """{material: estoque total na rede} para os materiais com estoque definido."""
+        estoque, definidos = self.valores("estoque")
+        totais = estoque.sum(axis=0)
+        return {self.nomes_materiais[m]: float(totais[m]) for m in np.flatnonzero(definidos.any(axis=0))}
+
+    def abaixo_do_limite(self):
+        """alertas de toda a rede em uma varredura: estoque (0 se ausente) < limite definido."""
+        estoque, _ = self.valores("estoque")
+        limites, com_limite = self.valores("limite")
+        linhas, colunas = np.nonzero(com_limite & (estoque < limites))
+        return [self._alerta(u, m) for u, m in zip(linhas.tolist(), colunas.tolist())]
+
+    def pares_com_limite(self):
+        """(unidade, material, estoque, limite) de todas as células com limite definido."""
+        _, com_limite = self.valores("limite")
+        linhas, colunas = np.nonzero(com_limite)
+        for u, m in zip(linhas.tolist(), colunas.tolist()):
+            unidade, material = self.nomes_unidades[u], self.nomes_materiais[m]
+            yield unidade, material, self.obter("estoque", unidade, material), self.obter("limite", unidade, material)
+
+    def _alerta(self, u, m):
+        unidade, material = self.nomes_unidades[u], self.nomes_materiais[m]
+        return {
+            "unidade": unidade,
+            "material": material,
+            "estoque_atual": self.obter("estoque", unidade, material) or 0,
+            "limite_minimo": self.obter("limite", unidade, material)
+        }
+
+    def unidades_definidas(self, campo):
+        """unidades com alguma célula definida no campo, em ordem de id."""
+        bruto = self._bruto(campo)
+        return [self.nomes_unidades[u] for u in np.flatnonzero((~np.isnan(bruto)).any(axis=1)).tolist()]
+
+    def tem_unidade(self, campo, unidade):
+        linha = self._linha_bruta(campo, unidade)
+        return linha is not None and not np.isnan(linha).all()
+
+    def visao(self, campo):
+        return VisaoMatriz(self, campo)
+
+
+class VisaoMatriz(Mapping):
+    """fachada somente leitura {unidade: {material: valor}} sobre um campo da MatrizEstoque."""
+    def __init__(self, matriz, campo):
+        self._matriz = matriz
+        self._campo = campo
+
+    def __getitem__(self, unidade):
+        linha = self._matriz.linha(self._campo, unidade)
+        if not linha:
+            raise KeyError(unidade)
+        return linha
+
+    def __contains__(self, unidade):
+        return self._matriz.tem_unidade(self._campo, unidade)
+
+    def __iter__(self):
+        return iter(self._matriz.unidades_definidas(self._campo))
+
+    def __len__(self):
+        return len(self._matriz.unidades_definidas(self._campo))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
@@ -0,0 +1,517 @@
+import datetime
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+from algorithms.data_structures import AnelHashConsistente
+from data_layer.matriz_estoque import MatrizEstoque
+from data_layer.storage import StockData, _validar_quantidade
+
+
+def _servir_no(conexao, diretorio, retencao=None):
+    """
+    laço do processo de um nó: mantém um StockData local e atende comandos
+    (comando, *args) pela conexão. Cada resposta é (ok, resultado, notificacoes),
+    em que `notificacoes` são as mudanças de alerta ocorridas durante o comando.
+    """
+    store = StockData(diretorio, retencao=retencao)
+    notificacoes = []
+    store.indice_alertas.inscrever(lambda evento, alerta: notificacoes.append((evento, alerta)))
+    preparadas = {}  # id da transação -> itens (unidade, material, quantidade)
+    while True:
+        comando, *args = conexao.recv()
+        try:
+            if comando == "chamar":
+                metodo, argumentos = args
+                resultado = getattr(store, metodo)(*argumentos)
+            elif comando == "executar":
+                funcao, argumentos = args
+                resultado = funcao(store, *argumentos)
+            elif comando == "preparar":
+                # fase 1: valida e guarda os itens e devolve os valores atuais, que o
+                # coordenador usa para desfazer a transação se a confirmação falhar em
+                # algum nó. O coordenador serializa as transações, então a checagem de
+                # reserva é só defensiva (ex.: um "abortar" que não chegou)
+                transacao, itens = args
+                itens = [(u, m, _validar_quantidade(q)) for u, m, q in itens]
+                reservados = {(u, m) for pendentes in preparadas.values() for u, m, _ in pendentes}
+                conflitos = [(u, m) for u, m, _ in itens if (u, m) in reservados]
+                if conflitos:
+                    raise RuntimeError(f"itens reservados por outra transação: {conflitos}")
+                preparadas[transacao] = itens
+                resultado = [(u, m, store.get_estoque(u, m)) for u, m, _ in itens]
+            elif comando == "confirmar":
+                store.update_estoque_lote(preparadas.pop(args[0]))
+                resultado = True
+            elif comando == "abortar":
+                resultado = preparadas.pop(args[0], None) is not None
+            elif comando == "encerrar":
+                store.fechar()
+                conexao.send((True, None, []))
+                return
+            else:
+                raise ValueError(f"comando desconhecido: {comando}")
+            resposta = (True, resultado, notificacoes[:])
+        except Exception as erro:
+            resposta = (False, erro, notificacoes[:])
+        notificacoes.clear()
+        conexao.send(resposta)
+
+
+# funções executadas dentro dos nós (precisam ser importáveis pelo processo filho)
+
+def _colunas_com_nomes(store, unidade):
+    return (list(store._materiais), *store.get_colunas_consumo(unidade))
+
+
+def _nomes_materiais(store):
+    return list(store._materiais)
+
+
+def _estado(store, atributo):
+    return {unidade: dict(materiais) for unidade, materiais in getattr(store, atributo).items()}
+
+
+def _historicos(store):
+    return {unidade: list(historico) for unidade, historico in store.historico_consumo.items()}
+
+
+def _alerta(store, unidade, material):
+    return store.indice_alertas.alerta(unidade, material)
+
+
+def _alertas(store, k=None):
+    indice = store.indice_alertas
+    return indice.ativos() if k is None else indice.mais_criticos(k)
+
+
+class IndiceAlertasParticionado:
+    """visão do índice de alertas de todas as partições, com a interface de IndiceAlertas."""
+    def __init__(self, store):
+        self._store = store
+        self._inscritos = []
+
+    def inscrever(self, callback):
+        """registra `callback(evento, alerta)`; as notificações dos nós são repassadas com cada resposta."""
+        self._inscritos.append(callback)
+        return callback
+
+    def cancelar_inscricao(self, callback):
+        self._inscritos.remove(callback)
+
+    def _notificar(self, notificacoes):
+        for notificacao in notificacoes:
+            for callback in list(self._inscritos):
+                callback(*notificacao)
+
+    def ativos(self):
+        return [alerta for parcial in self._store.executar_em_todos(_alertas).values() for alerta in parcial]
+
+    def alerta(self, unidade, material):
+        return self._store.executar(unidade, _alerta, unidade, material)
+
+    def mais_criticos(self, k):
+        """os k mais críticos entre os k mais críticos de cada partição."""
+        parciais = self._store.executar_em_todos(_alertas, k)
+        return heapq.nsmallest(k, itertools.chain(*parciais.values()), key=lambda alerta: alerta["criticidade"])
+
+
+class StockDataParticionado:
+    """
+    StockData particionado por unidade: estoque, limites e histórico de cada
+    unidade ficam em um único nó, escolhido por hash consistente, e cada nó é
+    um processo com seu próprio StockData (e, com `diretorio`, seu próprio
+    write-ahead log em `diretorio/<nó>`). Este objeto é o coordenador e expõe
+    a interface de StockData: operações de uma unidade vão ao nó dono, consultas
+    globais são enviadas a todos os nós de uma vez e combinadas.
+
+    Escritas que tocam mais de um nó (`update_estoque_lote`, usado pelas
+    transferências) são um lote serializado pelo coordenador, em duas fases:
+    cada nó confere o tipo das quantidades e as reservas e guarda os itens e,
+    só se todos aceitarem, todos aplicam; senão, todos descartam. Um lote de
+    um só nó é validado inteiro pelo StockData do nó antes de ser aplicado. Toda escrita passa pela trava do
+    coordenador, mantida da preparação à confirmação, então não há transações
+    concorrentes; se a confirmação falhar em algum nó depois de outros já
+    terem aplicado, os valores anteriores são restaurados em todos os nós.
+    `adicionar_no` rebalanceia, movendo para o novo nó apenas as unidades que
+    o anel passou a atribuir a ele; o novo anel só é gravado depois que o nó
+    recebeu as unidades. Com `diretorio`, a lista de nós fica em
+    `diretorio/nos.json` e o anel é refeito a partir dela ao reabrir: um
+    `num_nos` maior acrescenta nós (rebalanceando), um menor é ignorado, já
+    que os nós gravados guardam dados.
+    """
+    ARQUIVO_NOS = "nos.json"
+
+    def __init__(self, num_nos=2, diretorio=None, replicas=64, contexto="spawn", retencao=None):
+        self._trava = threading.RLock()
+        self._contexto = multiprocessing.get_context(contexto)
+        self.diretorio = diretorio
+        self.retencao = retencao  # cada nó compacta o próprio histórico
+        self.anel = AnelHashConsistente(replicas=replicas)
+        self._nos = {}  # nome -> (conexão, processo)
+        self._donos = {}  # cache unidade -> nó
+        self._materiais = []
+        self._ids_materiais = {}
+        self._transacoes = itertools.count(1)
+        self.indice_alertas = IndiceAlertasParticionado(self)
+        gravados = self._nos_gravados()
+        for nome in gravados or [f"no{i}" for i in range(num_nos)]:
+            self.anel.adicionar(self._iniciar_no(nome))
+        self._gravar_nos()
+        while len(self._nos) < num_nos:
+            self.adicionar_no()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    # --- nós e roteamento ---
+
+    def _nos_gravados(self):
+        # nós de uma execução anterior; sem nos.json, os subdiretórios no<i> existentes
+        if self.diretorio is None:
+            return []
+        caminho = os.path.join(self.diretorio, self.ARQUIVO_NOS)
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+        if not os.path.isdir(self.diretorio):
+            return []
+        nomes = [nome for nome in os.listdir(self.diretorio) if re.fullmatch(r"no\d+", nome)]
+        return sorted(nomes, key=lambda nome: int(nome[2:]))
+
+    def _gravar_nos(self):
+        if self.diretorio is None:
+            return
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = os.path.join(self.diretorio, self.ARQUIVO_NOS)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as arquivo:
+            json.dump(list(self._nos), arquivo)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(caminho + ".tmp", caminho)
+
+    def _iniciar_no(self, nome=None):
+        nome = nome or f"no{len(self._nos)}"
+        diretorio = None if self.diretorio is None else os.path.join(self.diretorio, nome)
+        conexao, filho = self._contexto.Pipe()
+        processo = self._contexto.Process(
+            target=_servir_no, args=(filho, diretorio, self.retencao), name=f"particao-{nome}", daemon=True
+        )
+        processo.start()
+        filho.close()
+        self._nos[nome] = (conexao, processo)
+        return nome
+
+    @property
+    def nos(self):
+        return self.anel.nos
+
+    def no_da_unidade(self, unidade):
+        """nó dono da unidade (consulta ao anel em cache)."""
+        nome = self._donos.get(unidade)
+        if nome is None:
+            nome = self._donos[unidade] = self.anel.no(unidade)
+        return nome
+
+    def particionar(self, itens, unidade=lambda item: item[0]):
+        """agrupa os itens pelo nó dono de `unidade(item)`; retorna {nó: [itens]}."""
+        por_no = {}
+        for item in itens:
+            por_no.setdefault(self.no_da_unidade(unidade(item)), []).append(item)
+        return por_no
+
+    def _difundir(self, mensagens, notificar=True):
+        """
+        envia {nó: mensagem} e só então aguarda as respostas, de modo que os nós
+        trabalham em paralelo. Se algum nó falhar, as demais respostas ainda são
+        lidas (mantendo as conexões em ordem) e o primeiro erro é relançado.
+        """
+        with self._trava:
+            for nome, mensagem in mensagens.items():
+                self._nos[nome][0].send(mensagem)
+            resultados, notificacoes, erro = {}, [], None
+            for nome in mensagens:
+                ok, resultado, recebidas = self._nos[nome][0].recv()
+                notificacoes.extend(recebidas)
+                if ok:
+                    resultados[nome] = resultado
+                elif erro is None:
+                    erro = resultado
+        if notificar:
+            self.indice_alertas._notificar(notificacoes)
+        if erro is not None:
+            raise erro
+        return resultados
+
+    def _chamar(self, unidade, metodo, *args):
+        nome = self.no_da_unidade(unidade)
+        return self._difundir({nome: ("chamar", metodo, args)})[nome]
+
+    def _chamar_todos(self, metodo, *args):
+        return self._difundir({nome: ("chamar", metodo, args) for nome in self._nos})
+
+    def executar(self, unidade, funcao, *args):
+        """executa `funcao(store_local, *args)` no nó dono da unidade."""
+        nome = self.no_da_unidade(unidade)
+        return self._difundir({nome: ("executar", funcao, args)})[nome]
+
+    def executar_em_todos(self, funcao, *args):
+        """executa `funcao(store_local, *args)` em todos os nós, em paralelo; retorna {nó: resultado}."""
+        return self._difundir({nome: ("executar", funcao, args) for nome in self._nos})
+
+    def executar_por_no(self, chamadas):
+        """executa {nó: (funcao, args)} em paralelo; retorna {nó: resultado}."""
+        return self._difundir({nome: ("executar", funcao, args) for nome, (funcao, args) in chamadas.items()})
+
+    # --- estoque e limites ---
+
+    def get_estoque(self, unidade, material=None):
+        """retorna o estoque de um material específico ou de toda a unidade."""
+        return self._chamar(unidade, "get_estoque", unidade, material)
+
+    def update_estoque(self, unidade, material, quantidade):
+        """atualiza a quantidade de um material no estoque."""
+        self._chamar(unidade, "update_estoque", unidade, material, quantidade)
+
+    def update_estoque_lote(self, itens):
+        """atualiza várias quantidades (unidade, material, quantidade); entre nós, em duas fases."""
+        por_no = self.particionar(itens)
+        if len(por_no) == 1:
+            (nome, itens_no), = por_no.items()
+            self._difundir({nome: ("chamar", "update_estoque_lote", (itens_no,))})
+        elif por_no:
+            self._confirmar_em_duas_fases(por_no)
+
+    def _confirmar_em_duas_fases(self, por_no):
+        with self._trava:
+            transacao = next(self._transacoes)
+            try:
+                anteriores = self._difundir({nome: ("preparar", transacao, itens) for nome, itens in por_no.items()})
+            except Exception:
+                self._difundir({nome: ("abortar", transacao) for nome in por_no})
+                raise
+            try:
+                self._difundir({nome: ("confirmar", transacao) for nome in por_no})
+            except Exception:
+                # falha parcial: nenhuma outra escrita passou pela trava desde a
+                # preparação, então restaurar os valores lidos nela desfaz o lote
+                # inteiro (NaN apaga a célula que não existia)
+                self._difundir({
+                    nome: ("chamar", "update_estoque_lote",
+                           ([(u, m, float("nan") if valor is None else valor) for u, m, valor in valores],))
+                    for nome, valores in anteriores.items()
+                })
+                raise
+
+    def set_limite_minimo(self, unidade, material, limite):
+        """define o limite mínimo para um material em uma unidade."""
+        self._chamar(unidade, "set_limite_minimo", unidade, material, limite)
+
+    def get_limite_minimo(self, unidade, material):
+        """retorna o limite mínimo de um material."""
+        return self._chamar(unidade, "get_limite_minimo", unidade, material)
+
+    def _combinar_estado(self, atributo):
+        combinado = {}
+        for parcial in self.executar_em_todos(_estado, atributo).values():
+            combinado.update(parcial)
+        return combinado
+
+    @property
+    def estoque(self):
+        """visão {unidade: {material: quantidade}} de todos os nós (cópia)."""
+        return self._combinar_estado("estoque")
+
+    @property
+    def alertas(self):
+        """visão {unidade: {material: limite}} de todos os nós (cópia)."""
+        return self._combinar_estado("alertas")
+
+    def matriz_estoque(self):
+        """MatrizEstoque com o estoque e os limites de todos os nós."""
+        return MatrizEstoque.de_dicionarios(self.estoque, self.alertas)
+
+    # --- materiais ---
+
+    def id_material(self, material):
+        """id do material no coordenador (os nós têm numeração própria)."""
+        with self._trava:
+            material_id = self._ids_materiais.get(material)
+            if material_id is None:
+                material_id = len(self._materiais)
+                self._materiais.append(material)
+                self._ids_materiais[material] = material_id
+            return material_id
+
+    def nome_material(self, material_id):
+        return self._materiais[material_id]
+
+    @property
+    def num_materiais(self):
+        # registra os materiais conhecidos pelos nós, para que os ids de
+        # get_colunas_consumo fiquem abaixo deste valor
+        for nomes in self.executar_em_todos(_nomes_materiais).values():
+            for nome in nomes:
+                self.id_material(nome)
+        return len(self._materiais)
+
+    # --- histórico ---
+
+    def add_historico_consumo(self, unidade, material, quantidade, timestamp):
+        """adiciona um registro ao histórico de consumo."""
+        self._chamar(unidade, "add_historico_consumo", unidade, material, quantidade, timestamp)
+
+    def add_historico_consumo_lote(self, registros):
+        """adiciona vários registros (unidade, material, quantidade, timestamp), um lote por nó."""
+        self._difundir({
+            nome: ("chamar", "add_historico_consumo_lote", (parte,))
+            for nome, parte in self.particionar(registros).items()
+        })
+
+    def get_historico_consumo(self, unidade, material=None, inicio=None, fim=None):
+        """retorna o histórico de uma unidade como lista de dicts, em ordem de tempo."""
+        return self._chamar(unidade, "get_historico_consumo", unidade, material, inicio, fim)
+
+    @property
+    def historico_consumo(self):
+        """visão {unidade: [registros]} materializada a partir dos nós (somente leitura, custo O(histórico))."""
+        combinado = {}
+        for parcial in self.executar_em_todos(_historicos).values():
+            combinado.update(parcial)
+        return combinado
+
+    def unidades_com_historico(self):
+        """retorna as unidades que possuem histórico de consumo."""
+        return [u for parcial in self._chamar_todos("unidades_com_historico").values() for u in parcial]
+
+    def get_colunas_consumo(self, unidade):
+        """colunas (materiais, quantidades, timestamps) da unidade, com ids de material do coordenador."""
+        nomes, materiais, quantidades, timestamps = self.executar(unidade, _colunas_com_nomes, unidade)
+        if len(materiais):
+            mapa = np.array([self.id_material(nome) for nome in nomes], dtype=np.int32)
+            materiais = mapa[materiais]
+        return materiais, quantidades, timestamps
+
+    def get_contagens_consumo(self, unidade):
+        """número de eventos de cada linha de `get_colunas_consumo` (maior que 1 nos baldes compactados)."""
+        return self._chamar(unidade, "get_contagens_consumo", unidade)
+
+    def compactar_historico(self, politica=None, referencia=None):
+        """aplica a política de retenção em todos os nós, com os mesmos cortes; retorna as linhas eliminadas."""
+        referencia = referencia or datetime.datetime.now()
+        return sum(self._chamar_todos("compactar_historico", politica, referencia).values())
+
+    def agregar_janela(self, dias, unidade=None, material=None, referencia=None):
+        """soma, contagem e máximo do consumo nos últimos `dias` dias até `referencia` (agora, por padrão)."""
+        referencia = referencia or datetime.datetime.now()  # a mesma janela em todos os nós
+        if unidade is not None:
+            return self._chamar(unidade, "agregar_janela", dias, unidade, material, referencia)
+        soma, contagem, maximo = 0.0, 0, None
+        for parcial in self._chamar_todos("agregar_janela", dias, None, material, referencia).values():
+            soma += parcial["soma"]
+            contagem += parcial["contagem"]
+            if parcial["maximo"] is not None and (maximo is None or parcial["maximo"] > maximo):
+                maximo = parcial["maximo"]
+        return {"soma": soma, "contagem": contagem, "maximo": maximo}
+
+    def agregar_consumo_por_material(self, unidade=None, inicio=None, fim=None):
+        """retorna {material: {"total_consumido", "num_consumos", ...}} combinando os nós."""
+        if unidade is not None:
+            return self._chamar(unidade, "agregar_consumo_por_material", unidade, inicio, fim)
+        combinado = {}
+        for parcial in self._chamar_todos("agregar_consumo_por_material", None, inicio, fim).values():
+            for material, dados in parcial.items():
+                atual = combinado.get(material)
+                if atual is None:
+                    combinado[material] = dict(dados)
+                    continue
+                atual["total_consumido"] += dados["total_consumido"]
+                atual["num_consumos"] += dados["num_consumos"]
+                if "ultimo_consumo" in dados:
+                    atual["ultimo_consumo"] = max(atual["ultimo_consumo"], dados["ultimo_consumo"])
+        return dict(sorted(combinado.items(), key=lambda item: self.id_material(item[0])))
+
+    # --- rebalanceamento e ciclo de vida ---
+
+    def adicionar_no(self):
+        """
+        inicia um novo nó, insere-o no anel e move para ele as unidades que o
+        anel passou a lhe atribuir: exporta dos nós antigos, importa no novo,
+        grava a nova lista de nós e só então remove dos antigos. Se a cópia
+        falhar, o novo nó é descartado e o anel volta ao que era. Retorna
+        {"no", "unidades_movidas"}.
+        """
+        with self._trava:
+            antigos = list(self.anel.nos)
+            novo = f"no{len(self._nos)}"
+            if self.diretorio is not None:
+                # sobra de um rebalanceamento interrompido antes de gravar nos.json
+                shutil.rmtree(os.path.join(self.diretorio, novo), ignore_errors=True)
+            self._iniciar_no(novo)
+            self.anel.adicionar(novo)
+            self._donos.clear()
+            try:
+                unidades = self._difundir({nome: ("chamar", "unidades", ()) for nome in antigos})
+                mover = {
+                    nome: [u for u in lista if self.anel.no(u) == novo]
+                    for nome, lista in unidades.items()
+                }
+                mover = {nome: lista for nome, lista in mover.items() if lista}
+                exportados = self._difundir({
+                    nome: ("chamar", "exportar_unidades", (lista,)) for nome, lista in mover.items()
+                })
+                # a cópia não gera notificações: os alertas das unidades movidas já estavam ativos
+                for estado in exportados.values():
+                    self._difundir({novo: ("chamar", "importar_unidades", (estado,))}, notificar=False)
+                self._gravar_nos()
+            except Exception:
+                self._descartar_no(novo)
+                raise
+            self._difundir({nome: ("chamar", "remover_unidades", (lista,)) for nome, lista in mover.items()})
+            return {"no": novo, "unidades_movidas": sum(len(lista) for lista in mover.values())}
+
+    def _descartar_no(self, nome):
+        # desfaz um adicionar_no que não chegou a gravar nos.json
+        self.anel.remover(nome)
+        self._donos.clear()
+        conexao, processo = self._nos.pop(nome)
+        if processo.is_alive():
+            conexao.send(("encerrar",))
+            conexao.recv()
+        processo.join()
+        conexao.close()
+        if self.diretorio is not None:
+            shutil.rmtree(os.path.join(self.diretorio, nome), ignore_errors=True)
+
+    def unidades(self):
+        """todas as unidades de todos os nós."""
+        return [u for parcial in self._chamar_todos("unidades").values() for u in parcial]
+
+    def gravar_snapshot(self):
+        """força um snapshot em cada nó."""
+        self._chamar_todos("gravar_snapshot")
+
+    def sincronizar(self):
+        """aguarda até que todos os nós tenham gravado suas alterações em disco."""
+        self._chamar_todos("sincronizar")
+
+    def fechar(self):
+        """encerra os nós (cada um grava as alterações pendentes antes de sair)."""
+        with self._trava:
+            if not self._nos:
+                return
+            self._difundir({nome: ("encerrar",) for nome in self._nos})
+            for conexao, processo in self._nos.values():
+                processo.join()
+                conexao.close()
+            self._nos.clear()
@@ -0,0 +1,318 @@
+import atexit
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+
+def _triplas(dados):
+    # {unidade: {material: valor}} -> [[unidade, material, valor], ...]: chaves de
+    # objeto JSON viram string, e uma unidade int voltaria como outra unidade
+    return [[unidade, material, valor] for unidade, materiais in dados.items() for material, valor in materiais.items()]
+
+
+def _de_triplas(triplas):
+    if isinstance(triplas, dict):  # snapshots gravados no formato antigo
+        return triplas
+    dados = {}
+    for unidade, material, valor in triplas:
+        dados.setdefault(unidade, {})[material] = valor
+    return dados
+
+
+class LogEscritaAntecipada:
+    """
+    write-ahead log append-only em JSON Lines com group commit: os registros
+    são acumulados em memória e uma thread de fundo grava o lote inteiro com
+    um único fsync. `registrar` devolve o número de sequência do registro e
+    `aguardar(seq)` bloqueia até que ele esteja em disco: com alguém
+    esperando o commit sai na hora, e os registros que chegam durante um
+    fsync formam o lote seguinte. Sem ninguém esperando, o lote é gravado a
+    cada `intervalo_commit` segundos (ou antes, se atingir `max_pendentes`).
+    """
+    def __init__(self, caminho, intervalo_commit=0.05, max_pendentes=4096):
+        self.caminho = caminho
+        self.intervalo_commit = intervalo_commit
+        self.max_pendentes = max_pendentes
+        self.ultimo_seq = 0
+        self.seq_duravel = 0
+        self.num_fsyncs = 0
+        self._pendentes = []
+        self._arquivo = open(caminho, "a", encoding="utf-8")
+        self._cond = threading.Condition()
+        self._ativo = True
+        self._aguardando = 0  # threads em aguardar()
+        self._gravando = False  # lote sendo escrito fora da condição
+        self._erro = None
+        self._thread = threading.Thread(target=self._laco_commit, name="wal-group-commit", daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    @staticmethod
+    def ler(caminho):
+        """gera os registros gravados no log; uma última linha truncada (crash no meio da escrita) é ignorada."""
+        if not os.path.exists(caminho):
+            return
+        with open(caminho, encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                try:
+                    yield json.loads(linha)
+                except json.JSONDecodeError:
+                    return
+
+    def registrar(self, *registro):
+        """acrescenta um registro ao lote pendente e retorna o seu número de sequência."""
+        with self._cond:
+            self.ultimo_seq += 1
+            self._pendentes.append(json.dumps([self.ultimo_seq, *registro], ensure_ascii=False))
+            if len(self._pendentes) >= self.max_pendentes:
+                self._cond.notify_all()
+            return self.ultimo_seq
+
+    def aguardar(self, seq):
+        """bloqueia até que o registro `seq` (e todos os anteriores) esteja em disco."""
+        with self._cond:
+            self._aguardar(seq)
+
+    def _aguardar(self, seq):
+        # chamado com self._cond adquirido
+        self._aguardando += 1
+        try:
+            while self.seq_duravel < seq:
+                if self._erro is not None:
+                    raise OSError(f"falha ao gravar o log {self.caminho}") from self._erro
+                self._cond.notify_all()
+                self._cond.wait()
+        finally:
+            self._aguardando -= 1
+
+    def sincronizar(self):
+        """bloqueia até que todos os registros já aceitos estejam em disco."""
+        with self._cond:
+            self._aguardar(self.ultimo_seq)
+
+    def rotacionar(self, caminho_anterior):
+        """
+        grava o lote pendente, passa o conteúdo do log para `caminho_anterior`
+        e continua num arquivo vazio; retorna o último número de sequência do
+        conteúdo passado. Se `caminho_anterior` ainda existir (o snapshot que
+        o descartaria não terminou), o log é acrescentado a ele.
+        """
+        with self._cond:
+            self._aguardar(self.ultimo_seq)
+            self._arquivo.close()
+            if os.path.exists(caminho_anterior):
+                with open(caminho_anterior, "a", encoding="utf-8") as destino, \
+                        open(self.caminho, encoding="utf-8") as origem:
+                    shutil.copyfileobj(origem, destino)
+                    destino.flush()
+                    os.fsync(destino.fileno())
+                self._arquivo = open(self.caminho, "w", encoding="utf-8")
+            else:
+                os.replace(self.caminho, caminho_anterior)
+                self._arquivo = open(self.caminho, "a", encoding="utf-8")
+            return self.ultimo_seq
+
+    def _gravar_lote(self):
+        # chamado com self._cond adquirido; a escrita e o fsync rodam fora da
+        # condição, para que os registros que chegam nesse meio-tempo formem o lote seguinte
+        lote, seq = self._pendentes, self.ultimo_seq
+        self._pendentes = []
+        self._gravando = True
+        self._cond.release()
+        try:
+            self._arquivo.write("\n".join(lote) + "\n")
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+        finally:
+            self._cond.acquire()
+            self._gravando = False
+        self.num_fsyncs += 1
+        self.seq_duravel = seq
+        self._cond.notify_all()
+
+    def _laco_commit(self):
+        with self._cond:
+            while True:
+                if not self._pendentes:
+                    if not self._ativo:
+                        return
+                    self._cond.wait(self.intervalo_commit)
+                    continue
+                if self._ativo and not self._aguardando and len(self._pendentes) < self.max_pendentes:
+                    # ninguém esperando: junta registros por até um intervalo
+                    self._cond.wait(self.intervalo_commit)
+                try:
+                    self._gravar_lote()
+                except OSError as erro:
+                    self._erro = erro
+                    self._cond.notify_all()
+                    return
+
+    def fechar(self):
+        """grava o lote pendente e encerra a thread de commit."""
+        with self._cond:
+            if not self._ativo:
+                return
+            self._ativo = False
+            self._cond.notify_all()
+        self._thread.join()
+        self._arquivo.close()
+        atexit.unregister(self.fechar)
+
+
+class PersistenciaEstoque:
+    """
+    persistência durável de um StockData em um diretório: snapshot periódico
+    (snapshot.npz) mais o write-ahead log das operações posteriores (wal.jsonl).
+    A cada `intervalo_snapshot` registros o data store pede um snapshot: o log
+    é rotacionado para wal.anterior.jsonl sob as travas do data store, o
+    estado congelado naquele ponto é gravado fora delas e o log anterior é
+    descartado quando o snapshot está em disco. A recuperação nunca
+    reprocessa muito mais do que `intervalo_snapshot` operações.
+    """
+    ARQUIVO_LOG = "wal.jsonl"
+    ARQUIVO_LOG_ANTERIOR = "wal.anterior.jsonl"
+    ARQUIVO_SNAPSHOT = "snapshot.npz"
+
+    def __init__(self, diretorio, intervalo_commit=0.05, intervalo_snapshot=10000):
+        os.makedirs(diretorio, exist_ok=True)
+        self.diretorio = diretorio
+        self.intervalo_snapshot = intervalo_snapshot
+        self.caminho_log = os.path.join(diretorio, self.ARQUIVO_LOG)
+        self.caminho_log_anterior = os.path.join(diretorio, self.ARQUIVO_LOG_ANTERIOR)
+        self.caminho_snapshot = os.path.join(diretorio, self.ARQUIVO_SNAPSHOT)
+        self.intervalo_commit = intervalo_commit
+        self.log = None
+        self._seq_snapshot = 0  # último registro coberto pelo snapshot mais recente (gravado ou em curso)
+
+    def recuperar(self, data_store):
+        """carrega o último snapshot e reaplica o log; deve ser chamado antes de qualquer registro."""
+        seq_snapshot = 0
+        if os.path.exists(self.caminho_snapshot):
+            seq_snapshot = self._ler_snapshot(data_store)
+
+        seq = seq_snapshot
+        # o log anterior sobra quando o processo caiu antes do snapshot que o cobriria
+        for caminho in (self.caminho_log_anterior, self.caminho_log):
+            for registro in LogEscritaAntecipada.ler(caminho):
+                if registro[0] <= seq:
+                    continue
+                seq = registro[0]
+                self._aplicar(data_store, registro[1:])
+
+        self.log = LogEscritaAntecipada(self.caminho_log, self.intervalo_commit)
+        self.log.ultimo_seq = self.log.seq_duravel = seq
+        self._seq_snapshot = seq_snapshot
+
+    def _aplicar(self, data_store, registro):
+        operacao, *args = registro
+        if operacao == "estoque":
+            data_store.update_estoque(*args)
+        elif operacao == "consumo":
+            data_store.add_historico_consumo(*args)
+        elif operacao == "consumo_lote":
+            unidade, materiais, quantidades, timestamps = args
+            data_store.add_historico_consumo_lote(
+                (unidade, material, quantidade, timestamp)
+                for material, quantidade, timestamp in zip(materiais, quantidades, timestamps)
+            )
+        elif operacao == "limite":
+            data_store.set_limite_minimo(*args)
+        else:
+            raise ValueError(f"operação desconhecida no log: {operacao}")
+
+    def registrar(self, *registro):
+        """
+        grava uma operação no log; retorna (número de sequência, se o log já
+        passou de `intervalo_snapshot` registros e o data store deve gravar um snapshot).
+        """
+        seq = self.log.registrar(*registro)
+        return seq, seq - self._seq_snapshot >= self.intervalo_snapshot
+
+    def aguardar(self, seq):
+        """bloqueia até que o registro `seq` esteja em disco."""
+        self.log.aguardar(seq)
+
+    def rotacionar_log(self):
+        """
+        início de um snapshot, chamado com o data store travado: o log até aqui
+        passa para o arquivo anterior e o número de sequência que o snapshot
+        vai cobrir é retornado.
+        """
+        seq = self.log.rotacionar(self.caminho_log_anterior)
+        self._sincronizar_diretorio()
+        self._seq_snapshot = seq
+        return seq
+
+    def gravar_snapshot(self, estado, seq):
+        """
+        grava de forma atômica `estado` (no formato de `exportar_estado`, coberto
+        pelo log até `seq`; ver `rotacionar_log`) e descarta o log anterior.
+        Não precisa das travas do data store.
+        """
+        meta = {
+            "seq": seq,
+            "estoque": _triplas(estado["estoque"]),
+            "alertas": _triplas(estado["alertas"]),
+            "materiais": estado["materiais"],
+            "unidades_historico": list(estado["historico"])
+        }
+        colunas = {"meta": np.array(json.dumps(meta, ensure_ascii=False))}
+        resumo = estado.get("resumo", {})
+        for i, (unidade, (materiais, quantidades, timestamps)) in enumerate(estado["historico"].items()):
+            colunas[f"h{i}_materiais"] = materiais
+            colunas[f"h{i}_quantidades"] = quantidades
+            colunas[f"h{i}_timestamps"] = timestamps
+            if unidade in resumo:
+                # histórico compactado: eventos e máximo de cada balde
+                colunas[f"h{i}_contagens"], colunas[f"h{i}_maximos"] = resumo[unidade]
+
+        temporario = self.caminho_snapshot + ".tmp"
+        with open(temporario, "wb") as arquivo:
+            np.savez(arquivo, **colunas)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, self.caminho_snapshot)
+        if os.path.exists(self.caminho_log_anterior):
+            os.remove(self.caminho_log_anterior)
+        self._sincronizar_diretorio()
+
+    def _ler_snapshot(self, data_store):
+        with np.load(self.caminho_snapshot) as dados:
+            meta = json.loads(str(dados["meta"]))
+            historico = {}
+            resumo = {}
+            for i, unidade in enumerate(meta["unidades_historico"]):
+                historico[unidade] = (
+                    dados[f"h{i}_materiais"],
+                    dados[f"h{i}_quantidades"],
+                    dados[f"h{i}_timestamps"]
+                )
+                if f"h{i}_contagens" in dados:
+                    resumo[unidade] = (dados[f"h{i}_contagens"], dados[f"h{i}_maximos"])
+        data_store.carregar_estado({
+            "estoque": _de_triplas(meta["estoque"]),
+            "alertas": _de_triplas(meta["alertas"]),
+            "materiais": meta["materiais"],
+            "historico": historico,
+            "resumo": resumo
+        })
+        return meta["seq"]
+
+    def _sincronizar_diretorio(self):
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.diretorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def sincronizar(self):
+        self.log.sincronizar()
+
+    def fechar(self):
+        self.log.fechar()
@@ -0,0 +1,61 @@
+import threading
+
+DIA_US = 86_400 * 1_000_000
+SEMANA_US = 7 * DIA_US
+_SEGUNDA_US = 4 * DIA_US  # 1970-01-05, primeira segunda-feira do epoch
+
+
+def inicio_dia_us(timestamp_us):
+    """início (00:00 UTC) do dia de cada timestamp em µs; aceita arrays."""
+    return timestamp_us // DIA_US * DIA_US
+
+
+def inicio_semana_us(timestamp_us):
+    """início (segunda-feira, 00:00 UTC) da semana de cada timestamp em µs; aceita arrays."""
+    return (timestamp_us - _SEGUNDA_US) // SEMANA_US * SEMANA_US + _SEGUNDA_US
+
+
+class PoliticaRetencao:
+    """
+    retenção em camadas do histórico de consumo: eventos com mais de
+    `dias_brutos` dias viram baldes diários por (unidade, material) e,
+    com mais de `dias_diarios` dias, baldes semanais. `intervalo` é o
+    período (segundos) do compactador em segundo plano.
+    """
+    def __init__(self, dias_brutos=30, dias_diarios=180, intervalo=60.0):
+        if not 0 < dias_brutos <= dias_diarios:
+            raise ValueError("é preciso 0 < dias_brutos <= dias_diarios")
+        self.dias_brutos = dias_brutos
+        self.dias_diarios = dias_diarios
+        self.intervalo = intervalo
+
+    def cortes(self, referencia_us):
+        """(corte diário, corte semanal) em µs, alinhados ao início do dia e da semana."""
+        corte_diario = inicio_dia_us(referencia_us - round(self.dias_brutos * DIA_US))
+        corte_semanal = inicio_semana_us(referencia_us - round(self.dias_diarios * DIA_US))
+        return corte_diario, min(corte_semanal, corte_diario)
+
+
+class CompactadorHistorico:
+    """
+    thread em segundo plano que aplica a política de retenção do data store
+    a cada `politica.intervalo` segundos (`compactar_historico`, uma unidade
+    por vez, de modo que as escritas não esperam a passada inteira).
+    """
+    def __init__(self, data_store, politica):
+        self.data_store = data_store
+        self.politica = politica
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="compactador-historico", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def _executar(self):
+        while not self._parar.wait(self.politica.intervalo):
+            self.data_store.compactar_historico(self.politica)
+
+    def parar(self):
+        self._parar.set()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,404 @@
+import datetime
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from data_layer.alertas import IndiceAlertas
+from data_layer.matriz_estoque import MatrizEstoque
+from data_layer.storage import _de_epoch_us, _para_epoch_us
+
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS materiais (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS estoque (
+    unidade TEXT NOT NULL,
+    material TEXT NOT NULL,
+    quantidade REAL NOT NULL,
+    PRIMARY KEY (unidade, material)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS limites (
+    unidade TEXT NOT NULL,
+    material TEXT NOT NULL,
+    limite REAL NOT NULL,
+    PRIMARY KEY (unidade, material)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS consumo (
+    unidade TEXT NOT NULL,
+    material_id INTEGER NOT NULL REFERENCES materiais(id),
+    quantidade REAL NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_consumo_unidade_material_ts ON consumo (unidade, material_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_consumo_unidade_ts ON consumo (unidade, timestamp);
+CREATE TABLE IF NOT EXISTS consumo_agregado (
+    unidade TEXT NOT NULL,
+    material_id INTEGER NOT NULL,
+    total REAL NOT NULL,
+    contagem INTEGER NOT NULL,
+    ultimo INTEGER NOT NULL,
+    PRIMARY KEY (unidade, material_id)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS trg_consumo_agregado AFTER INSERT ON consumo
+BEGIN
+    INSERT INTO consumo_agregado (unidade, material_id, total, contagem, ultimo)
+    VALUES (NEW.unidade, NEW.material_id, NEW.quantidade, 1, NEW.timestamp)
+    ON CONFLICT (unidade, material_id) DO UPDATE SET
+        total = total + excluded.total,
+        contagem = contagem + 1,
+        ultimo = MAX(ultimo, excluded.ultimo);
+END;
+"""
+
+
+def _numero(valor):
+    # o SQLite devolve REAL para tudo que foi gravado nas colunas numéricas
+    return int(valor) if isinstance(valor, float) and valor.is_integer() else valor
+
+
+class SQLiteStockData:
+    """
+    implementação do StockData sobre um banco SQLite local. Todas as threads
+    usam uma única conexão, serializada por `_trava`: as escritas são agrupadas
+    em uma transação confirmada a cada `tamanho_lote` operações (ou em
+    commit()/transacao()), e as leituras de qualquer thread já veem as escritas
+    pendentes, sem disputar o lock de escrita do SQLite entre conexões.
+    Consultas por intervalo e agregados por material rodam em SQL.
+    """
+    def __init__(self, caminho="estoque.db", tamanho_lote=500):
+        self.caminho = caminho
+        self.tamanho_lote = tamanho_lote
+        self._trava = threading.RLock()
+        self._conexao_aberta = None
+        self._pendentes = 0
+        self._em_transacao = False
+        self._lock_materiais = threading.Lock()
+        self._ids_materiais = {}
+        self._materiais = []
+        conexao = self._conexao()
+        conexao.executescript(_ESQUEMA)
+        if conexao.execute(
+            "SELECT EXISTS (SELECT 1 FROM consumo) AND NOT EXISTS (SELECT 1 FROM consumo_agregado)"
+        ).fetchone()[0]:
+            # banco criado antes da tabela de agregados: reconstrói a partir do histórico
+            conexao.execute(
+                "INSERT INTO consumo_agregado (unidade, material_id, total, contagem, ultimo) "
+                "SELECT unidade, material_id, SUM(quantidade), COUNT(*), MAX(timestamp) "
+                "FROM consumo GROUP BY unidade, material_id"
+            )
+            conexao.commit()
+        for material_id, nome in conexao.execute("SELECT id, nome FROM materiais ORDER BY id"):
+            self._registrar_material_local(material_id, nome)
+        self.indice_alertas = IndiceAlertas()
+        self.indice_alertas.reconstruir(self.estoque, self.alertas)
+
+    def _conexao(self):
+        """retorna a conexão compartilhada, abrindo-a na primeira chamada."""
+        with self._trava:
+            if self._conexao_aberta is None:
+                conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+                conexao.execute("PRAGMA journal_mode=WAL")
+                conexao.execute("PRAGMA synchronous=NORMAL")
+                self._conexao_aberta = conexao
+            return self._conexao_aberta
+
+    def _ler(self, sql, parametros=()):
+        # consulta inteira sob a trava: não intercala com a transação de outra thread
+        with self._trava:
+            return self._conexao().execute(sql, parametros).fetchall()
+
+    def _escrever(self, sql, parametros):
+        with self._trava:
+            self._conexao().execute(sql, parametros)
+            self._pendentes += 1
+            if not self._em_transacao and self._pendentes >= self.tamanho_lote:
+                self.commit()
+
+    def _escrever_lote(self, sql, linhas):
+        with self._trava:
+            self._conexao().executemany(sql, linhas)
+            self._pendentes += len(linhas)
+            if not self._em_transacao and self._pendentes >= self.tamanho_lote:
+                self.commit()
+
+    def commit(self):
+        """confirma o lote de escritas pendente."""
+        with self._trava:
+            self._conexao().commit()
+            self._pendentes = 0
+
+    @contextmanager
+    def transacao(self):
+        """
+        agrupa as escritas do bloco em uma única transação atômica; as outras
+        threads esperam o fim do bloco para ler ou escrever. Se o bloco falhar,
+        o cache de materiais e o índice de alertas voltam junto com o banco
+        (os inscritos do índice já podem ter sido notificados de cruzamentos do bloco).
+        """
+        with self._trava:
+            conexao = self._conexao()
+            aninhada = self._em_transacao
+            if not aninhada:
+                self.commit()  # o rollback do bloco não pode levar o lote pendente junto
+                self._em_transacao = True
+                num_materiais = len(self._materiais)
+            try:
+                yield self
+            except BaseException:
+                if not aninhada:
+                    conexao.rollback()
+                    self._pendentes = 0
+                    self._desfazer_caches(num_materiais)
+                raise
+            else:
+                if not aninhada:
+                    self.commit()
+            finally:
+                if not aninhada:
+                    self._em_transacao = False
+
+    def _desfazer_caches(self, num_materiais):
+        # os ids de material criados no bloco voltam a ficar livres no banco
+        with self._lock_materiais:
+            for nome in self._materiais[num_materiais:]:
+                self._ids_materiais.pop(nome, None)
+            del self._materiais[num_materiais:]
+        self.indice_alertas.reconstruir(self.estoque, self.alertas)
+
+    def fechar(self):
+        """confirma e fecha a conexão."""
+        with self._trava:
+            if self._conexao_aberta is not None:
+                self._conexao_aberta.commit()
+                self._conexao_aberta.close()
+                self._conexao_aberta = None
+            self._pendentes = 0
+
+    def sincronizar(self):
+        self.commit()
+
+    # --- estoque ---
+
+    def get_estoque(self, unidade, material=None):
+        """retorna o estoque de um material específico ou de toda a unidade."""
+        if material:
+            linhas = self._ler("SELECT quantidade FROM estoque WHERE unidade = ? AND material = ?", (unidade, material))
+            return _numero(linhas[0][0]) if linhas else None
+        return {
+            mat: _numero(qtd) for mat, qtd in self._ler(
+                "SELECT material, quantidade FROM estoque WHERE unidade = ?", (unidade,)
+            )
+        }
+
+    def update_estoque(self, unidade, material, quantidade):
+        """atualiza a quantidade de um material no estoque."""
+        # índice atualizado sob a mesma trava da escrita: fica na ordem da tabela
+        with self._trava:
+            self._escrever(
+                "INSERT INTO estoque (unidade, material, quantidade) VALUES (?, ?, ?) "
+                "ON CONFLICT (unidade, material) DO UPDATE SET quantidade = excluded.quantidade",
+                (unidade, material, quantidade)
+            )
+            self.indice_alertas.atualizar_estoque(unidade, material, quantidade)
+
+    def update_estoque_lote(self, itens):
+        """atualiza várias quantidades (unidade, material, quantidade) com um único executemany."""
+        itens = list(itens)
+        with self._trava:
+            self._escrever_lote(
+                "INSERT INTO estoque (unidade, material, quantidade) VALUES (?, ?, ?) "
+                "ON CONFLICT (unidade, material) DO UPDATE SET quantidade = excluded.quantidade",
+                itens
+            )
+            for unidade, material, quantidade in itens:
+                self.indice_alertas.atualizar_estoque(unidade, material, quantidade)
+
+    @property
+    def estoque(self):
+        """visão {unidade: {material: quantidade}} materializada a partir do banco (somente leitura)."""
+        resultado = {}
+        for unidade, material, qtd in self._ler("SELECT unidade, material, quantidade FROM estoque"):
+            resultado.setdefault(unidade, {})[material] = _numero(qtd)
+        return resultado
+
+    def matriz_estoque(self):
+        """MatrizEstoque (unidade × material) construída a partir das tabelas de estoque e limites."""
+        return MatrizEstoque.de_dicionarios(self.estoque, self.alertas)
+
+    # --- limites mínimos ---
+
+    def set_limite_minimo(self, unidade, material, limite):
+        """define o limite mínimo para um material em uma unidade."""
+        with self._trava:
+            self._escrever(
+                "INSERT INTO limites (unidade, material, limite) VALUES (?, ?, ?) "
+                "ON CONFLICT (unidade, material) DO UPDATE SET limite = excluded.limite",
+                (unidade, material, limite)
+            )
+            self.indice_alertas.definir_limite(unidade, material, limite, self.get_estoque(unidade, material))
+
+    def get_limite_minimo(self, unidade, material):
+        """retorna o limite minimo de um material."""
+        linhas = self._ler("SELECT limite FROM limites WHERE unidade = ? AND material = ?", (unidade, material))
+        return _numero(linhas[0][0]) if linhas else None
+
+    @property
+    def alertas(self):
+        """visão {unidade: {material: limite}} materializada a partir do banco (somente leitura)."""
+        resultado = {}
+        for unidade, material, limite in self._ler("SELECT unidade, material, limite FROM limites"):
+            resultado.setdefault(unidade, {})[material] = _numero(limite)
+        return resultado
+
+    # --- histórico de consumo ---
+
+    def _registrar_material_local(self, material_id, nome):
+        with self._lock_materiais:
+            while len(self._materiais) <= material_id:
+                self._materiais.append(None)
+            self._materiais[material_id] = nome
+            self._ids_materiais[nome] = material_id
+
+    def id_material(self, material):
+        """
+        retorna o id inteiro do material, registrando-o se ainda não existir.
+        Sob a trava: um id criado numa transação aberta por outra thread só é
+        visto depois do commit (um rollback o devolve ao banco).
+        """
+        with self._trava:
+            material_id = self._ids_materiais.get(material)
+            if material_id is None:
+                conexao = self._conexao()
+                conexao.execute("INSERT OR IGNORE INTO materiais (nome) VALUES (?)", (material,))
+                material_id = conexao.execute("SELECT id FROM materiais WHERE nome = ?", (material,)).fetchone()[0]
+                self._registrar_material_local(material_id, material)
+            return material_id
+
+    def nome_material(self, material_id):
+        """retorna o nome do material a partir do seu id."""
+        return self._materiais[material_id]
+
+    @property
+    def num_materiais(self):
+        return len(self._materiais)
+
+    def add_historico_consumo(self, unidade, material, quantidade, timestamp):
+        """adiciona um registro ao histórico de consumo."""
+        timestamp_us = _para_epoch_us(timestamp)
+        with self._trava:
+            self._escrever(
+                "INSERT INTO consumo (unidade, material_id, quantidade, timestamp) VALUES (?, ?, ?, ?)",
+                (unidade, self.id_material(material), quantidade, timestamp_us)
+            )
+
+    def add_historico_consumo_lote(self, registros):
+        """adiciona vários registros (unidade, material, quantidade, timestamp) com um único executemany."""
+        with self._trava:
+            linhas = [
+                (unidade, self.id_material(material), quantidade, _para_epoch_us(timestamp))
+                for unidade, material, quantidade, timestamp in registros
+            ]
+            self._escrever_lote(
+                "INSERT INTO consumo (unidade, material_id, quantidade, timestamp) VALUES (?, ?, ?, ?)", linhas
+            )
+
+    def _filtro_consumo(self, unidade=None, material=None, inicio=None, fim=None):
+        condicoes, parametros = [], []
+        if unidade is not None:
+            condicoes.append("unidade = ?")
+            parametros.append(unidade)
+        if material is not None:
+            material_id = self._ids_materiais.get(material)
+            condicoes.append("material_id = ?")
+            parametros.append(-1 if material_id is None else material_id)
+        if inicio is not None:
+            condicoes.append("timestamp >= ?")
+            parametros.append(_para_epoch_us(inicio))
+        if fim is not None:
+            condicoes.append("timestamp < ?")
+            parametros.append(_para_epoch_us(fim))
+        where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        return where, parametros
+
+    def get_historico_consumo(self, unidade, material=None, inicio=None, fim=None):
+        """retorna o histórico da unidade, opcionalmente filtrado por material e intervalo [inicio, fim)."""
+        where, parametros = self._filtro_consumo(unidade, material, inicio, fim)
+        linhas = self._ler(
+            f"SELECT material_id, quantidade, timestamp FROM consumo{where} ORDER BY timestamp, rowid", parametros
+        )
+        return [
+            {"material": self._materiais[material_id], "quantidade": quantidade, "timestamp": _de_epoch_us(ts)}
+            for material_id, quantidade, ts in linhas
+        ]
+
+    def unidades_com_historico(self):
+        """retorna as unidades que possuem histórico de consumo."""
+        return [linha[0] for linha in self._ler("SELECT DISTINCT unidade FROM consumo_agregado")]
+
+    def get_colunas_consumo(self, unidade):
+        """retorna as colunas (materiais, quantidades, timestamps) do histórico da unidade, em ordem de tempo."""
+        linhas = self._ler(
+            "SELECT material_id, quantidade, timestamp FROM consumo WHERE unidade = ? ORDER BY timestamp, rowid",
+            (unidade,)
+        )
+        n = len(linhas)
+        return (
+            np.fromiter((linha[0] for linha in linhas), dtype=np.int32, count=n),
+            np.fromiter((linha[1] for linha in linhas), dtype=np.float64, count=n),
+            np.fromiter((linha[2] for linha in linhas), dtype=np.int64, count=n)
+        )
+
+    def get_contagens_consumo(self, unidade):
+        """número de eventos de cada linha de `get_colunas_consumo` (sempre 1: este backend não compacta)."""
+        n = self._ler("SELECT COUNT(*) FROM consumo WHERE unidade = ?", (unidade,))[0][0]
+        return np.ones(n, dtype=np.int64)
+
+    def agregar_janela(self, dias, unidade=None, material=None, referencia=None):
+        """soma, contagem e máximo do consumo nos últimos `dias` dias até `referencia` (agora, por padrão)."""
+        fim_us = _para_epoch_us(referencia or datetime.datetime.now())
+        inicio_us = fim_us - round(dias * 86_400 * 1_000_000)
+        where, parametros = self._filtro_consumo(unidade, material, inicio_us, fim_us)
+        soma, contagem, maximo = self._ler(
+            f"SELECT COALESCE(SUM(quantidade), 0), COUNT(*), MAX(quantidade) FROM consumo{where}", parametros
+        )[0]
+        return {"soma": soma, "contagem": contagem, "maximo": maximo}
+
+    @property
+    def historico_consumo(self):
+        """visão {unidade: [registros]} materializada a partir do banco (somente leitura, custo O(histórico))."""
+        return {unidade: self.get_historico_consumo(unidade) for unidade in self.unidades_com_historico()}
+
+    def agregar_consumo_por_material(self, unidade=None, inicio=None, fim=None):
+        """
+        retorna {material: {"total_consumido", "num_consumos", ...}}. Sem intervalo de
+        tempo lê a tabela consumo_agregado, mantida por trigger a cada inserção;
+        com intervalo, agrega o histórico com GROUP BY.
+        """
+        if inicio is None and fim is None:
+            where, parametros = ("", []) if unidade is None else (" WHERE unidade = ?", [unidade])
+            linhas = self._ler(
+                "SELECT material_id, SUM(total), SUM(contagem), MAX(ultimo) FROM consumo_agregado"
+                f"{where} GROUP BY material_id ORDER BY material_id", parametros
+            )
+            return {
+                self._materiais[material_id]: {
+                    "total_consumido": total,
+                    "num_consumos": contagem,
+                    "ultimo_consumo": _de_epoch_us(ultimo)
+                }
+                for material_id, total, contagem, ultimo in linhas
+            }
+
+        where, parametros = self._filtro_consumo(unidade, None, inicio, fim)
+        linhas = self._ler(
+            f"SELECT material_id, SUM(quantidade), COUNT(*) FROM consumo{where} GROUP BY material_id ORDER BY material_id",
+            parametros
+        )
+        return {
+            self._materiais[material_id]: {"total_consumido": total, "num_consumos": contagem}
+            for material_id, total, contagem in linhas
+        }
@@ -1,46 +1,1068 @@
-class StockData:
+import copy
+import datetime
+import numbers
+import threading
+from contextlib import ExitStack, contextmanager
+
+import numpy as np
+
+from data_layer.alertas import IndiceAlertas
+from data_layer.matriz_estoque import MatrizEstoque
+from data_layer.persistence import PersistenciaEstoque
+from data_layer.retencao import CompactadorHistorico, inicio_dia_us, inicio_semana_us
+
+
+def _para_epoch_us(timestamp):
+    """converte um datetime (ou epoch em microssegundos) para int64 em microssegundos."""
+    if isinstance(timestamp, datetime.datetime):
+        return round(timestamp.timestamp() * 1_000_000)
+    return int(timestamp)
+
+
+def _validar_quantidade(quantidade):
     """
-    gerencia o armazenamento de dados de estoque e histórico de consumo.
+    quantidade de estoque aceita pelos data stores: número real, não bool (NaN
+    apaga a célula). Escalares NumPy viram int/float, que o log grava em JSON.
+    """
+    if isinstance(quantidade, bool) or not isinstance(quantidade, numbers.Real):
+        raise TypeError(f"quantidade inválida: {quantidade!r}")
+    if isinstance(quantidade, (int, float)):
+        return quantidade
+    return int(quantidade) if isinstance(quantidade, numbers.Integral) else float(quantidade)
+
+
+def _de_epoch_us(timestamp_us):
+    """converte epoch em microssegundos de volta para datetime (hora local)."""
+    segundos, micro = divmod(int(timestamp_us), 1_000_000)
+    return datetime.datetime.fromtimestamp(segundos).replace(microsecond=micro)
+
+
+class _ColunaCrescente:
+    """array NumPy com crescimento amortizado, usado pelos índices derivados do histórico."""
+    def __init__(self, dtype, inicial=()):
+        self._dados = np.array(inicial, dtype=dtype)
+        self._tamanho = len(self._dados)
+
+    def estender(self, valores):
+        k = len(valores)
+        if self._tamanho + k > len(self._dados):
+            novo = np.empty(max(2 * len(self._dados), self._tamanho + k, 16), dtype=self._dados.dtype)
+            novo[:self._tamanho] = self._dados[:self._tamanho]
+            self._dados = novo
+        self._dados[self._tamanho:self._tamanho + k] = valores
+        self._tamanho += k
+
+    def view(self):
+        return self._dados[:self._tamanho]
+
+
+class _IndicesHistorico:
+    """
+    índices derivados de um HistoricoColunar (somas de prefixo e posições por
+    material), estendidos sob `trava`: leitores concorrentes (inclusive de
+    instantâneos, que compartilham o histórico) não estendem a mesma faixa duas vezes.
     """
     def __init__(self):
-        self.estoque = {}  
-        self.historico_consumo = {}  
-        self.alertas = {}  
+        self.trava = threading.Lock()
+        self.prefixo = _ColunaCrescente(np.float64, [0.0])  # soma acumulada das quantidades
+        self.prefixo_contagem = _ColunaCrescente(np.int64, [0])  # soma acumulada do número de eventos
+        self.por_material = {}  # material_id -> (posições, timestamps, prefixo, prefixo de contagem)
+        self.cobertura = 0  # registros já incorporados aos índices
+
+
+class HistoricoColunar:
+    """
+    histórico de consumo de uma unidade armazenado em colunas tipadas:
+    id do material (int32), quantidade (float64) e timestamp epoch em µs (int64).
+    As colunas ficam ordenadas por timestamp, o que permite consultas por
+    intervalo com busca binária. Os índices por material e as somas de
+    prefixo são estendidos incrementalmente na consulta seguinte a novos registros.
+    Depois de `compactar`, as linhas antigas são baldes (material, dia ou
+    semana) com a soma das quantidades, e duas colunas a mais guardam o
+    número de eventos e a maior quantidade de cada linha (1 e a própria
+    quantidade nos eventos brutos); antes disso elas não são alocadas.
+    """
+    CAPACIDADE_INICIAL = 64
+    COLUNAS = ("_materiais", "_quantidades", "_timestamps", "_contagens", "_maximos")
+
+    def __init__(self, nomes_materiais):
+        self._nomes_materiais = nomes_materiais
+        self._materiais = np.empty(self.CAPACIDADE_INICIAL, dtype=np.int32)
+        self._quantidades = np.empty(self.CAPACIDADE_INICIAL, dtype=np.float64)
+        self._timestamps = np.empty(self.CAPACIDADE_INICIAL, dtype=np.int64)
+        self._contagens = None  # int64; None enquanto só houver eventos brutos
+        self._maximos = None  # float64
+        self._tamanho = 0
+        self._linhas_compactadas = 0  # baldes no início das colunas após a última compactação
+        self._corte_semanal = None
+        self.geracao = 0  # geração do data store em que passou a ser exclusivo do estado vivo
+        self._invalidar_indices()
+
+    def __len__(self):
+        return self._tamanho
+
+    @property
+    def compactado(self):
+        return self._contagens is not None
+
+    def derivar(self):
+        """
+        novo histórico que compartilha as colunas com este (copy-on-write dos
+        instantâneos): o novo só escreve além do tamanho atual ou em colunas
+        realocadas, então este continua intacto. Os índices do novo são
+        refeitos na primeira consulta.
+        """
+        novo = copy.copy(self)
+        novo._invalidar_indices()
+        return novo
+
+    def _colunas_alocadas(self):
+        return [nome for nome in self.COLUNAS if getattr(self, nome) is not None]
+
+    def adicionar(self, material_id, quantidade, timestamp_us):
+        """acrescenta um registro, mantendo a ordem por timestamp."""
+        i = self._tamanho
+        if i and timestamp_us < self._timestamps[i - 1]:
+            self._intercalar(
+                np.array([material_id], dtype=np.int32),
+                np.array([quantidade], dtype=np.float64),
+                np.array([timestamp_us], dtype=np.int64)
+            )
+            return
+        if i == len(self._materiais):
+            self._crescer()
+        self._materiais[i] = material_id
+        self._quantidades[i] = quantidade
+        self._timestamps[i] = timestamp_us
+        if self._contagens is not None:
+            self._contagens[i] = 1
+            self._maximos[i] = quantidade
+        self._tamanho = i + 1
+
+    def estender(self, materiais, quantidades, timestamps):
+        """acrescenta vários registros de uma vez (colunas de mesmo tamanho), mantendo a ordem por timestamp."""
+        materiais = np.asarray(materiais, dtype=np.int32)
+        quantidades = np.asarray(quantidades, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        k = len(materiais)
+        if k == 0:
+            return
+        if k > 1 and (np.diff(timestamps) < 0).any():
+            ordem = np.argsort(timestamps, kind="stable")
+            materiais, quantidades, timestamps = materiais[ordem], quantidades[ordem], timestamps[ordem]
+        if self._tamanho and timestamps[0] < self._timestamps[self._tamanho - 1]:
+            self._intercalar(materiais, quantidades, timestamps)
+            return
+        if self._tamanho + k > len(self._materiais):
+            self._crescer(self._tamanho + k)
+        i = self._tamanho
+        self._materiais[i:i + k] = materiais
+        self._quantidades[i:i + k] = quantidades
+        self._timestamps[i:i + k] = timestamps
+        if self._contagens is not None:
+            self._contagens[i:i + k] = 1
+            self._maximos[i:i + k] = quantidades
+        self._tamanho = i + k
+
+    def _intercalar(self, materiais, quantidades, timestamps):
+        # registros fora de ordem: intercala em colunas novas (O(n + k)); as
+        # views antigas continuam válidas e os índices derivados são refeitos
+        n = self._tamanho
+        posicoes = np.searchsorted(self._timestamps[:n], timestamps, side="right")
+        novas = {"_materiais": materiais, "_quantidades": quantidades, "_timestamps": timestamps,
+                 "_contagens": np.ones(len(materiais), dtype=np.int64), "_maximos": quantidades}
+        self._substituir_colunas(*(
+            np.insert(getattr(self, nome)[:n], posicoes, novas[nome]) for nome in self._colunas_alocadas()
+        ))
+
+    def _substituir_colunas(self, materiais, quantidades, timestamps, contagens=None, maximos=None):
+        n = len(materiais)
+        capacidade = max(self.CAPACIDADE_INICIAL, 2 * n)
+        colunas = (materiais, quantidades, timestamps, contagens, maximos)
+        for nome, coluna, dtype in zip(self.COLUNAS, colunas, (np.int32, np.float64, np.int64, np.int64, np.float64)):
+            destino = None
+            if coluna is not None:
+                destino = np.empty(capacidade, dtype=dtype)
+                destino[:n] = coluna
+            setattr(self, nome, destino)
+        self._tamanho = n
+        self._invalidar_indices()
+
+    def _crescer(self, minimo=0):
+        # realoca em vez de redimensionar no lugar: views já entregues por
+        # colunas() continuam apontando para o buffer antigo, que é imutável
+        capacidade = max(len(self._materiais) * 2, minimo)
+        n = self._tamanho
+        for nome in self._colunas_alocadas():
+            antiga = getattr(self, nome)
+            nova = np.empty(capacidade, dtype=antiga.dtype)
+            nova[:n] = antiga[:n]
+            setattr(self, nome, nova)
+
+    def colunas(self):
+        """retorna views somente-leitura (sem cópia) de (materiais, quantidades, timestamps)."""
+        n = self._tamanho
+        views = (self._materiais[:n], self._quantidades[:n], self._timestamps[:n])
+        for view in views:
+            view.flags.writeable = False
+        return views
+
+    def contagens(self):
+        """número de eventos de cada linha (1 nos eventos brutos)."""
+        if self._contagens is None:
+            return np.ones(self._tamanho, dtype=np.int64)
+        return self._contagens[:self._tamanho]
 
+    def maximos(self):
+        """maior quantidade de um evento em cada linha (a própria quantidade nos eventos brutos)."""
+        colunas = self._quantidades if self._maximos is None else self._maximos
+        return colunas[:self._tamanho]
+
+    # --- retenção ---
+
+    def precisa_compactar(self, corte_diario_us, corte_semanal_us):
+        """falso se nada envelheceu (nem chegou atrasado) desde a última compactação com estes cortes."""
+        k = int(np.searchsorted(self._timestamps[:self._tamanho], corte_diario_us, side="left"))
+        return k != self._linhas_compactadas or (k > 0 and corte_semanal_us != self._corte_semanal)
+
+    def compactar(self, corte_diario_us, corte_semanal_us):
+        """
+        agrupa as linhas com timestamp < `corte_diario_us` em baldes por
+        (material, dia), e as anteriores a `corte_semanal_us` em baldes por
+        (material, semana iniciada na segunda-feira). Os cortes devem estar
+        alinhados a dia e semana (ver `PoliticaRetencao`). Cada balde guarda
+        a soma, o número de eventos, a maior quantidade e o timestamp do
+        último evento, o que mantém as colunas ordenadas. Baldes já
+        existentes são reagrupados junto (ex.: dias que passam a semana).
+        Retorna o número de linhas eliminadas.
+        """
+        if not self.precisa_compactar(corte_diario_us, corte_semanal_us):
+            return 0
+        n = self._tamanho
+        k = int(np.searchsorted(self._timestamps[:n], corte_diario_us, side="left"))
+        materiais, quantidades, timestamps = self._materiais[:k], self._quantidades[:k], self._timestamps[:k]
+        baldes = np.where(timestamps < corte_semanal_us, inicio_semana_us(timestamps), inicio_dia_us(timestamps))
+        ordem = np.lexsort((materiais, baldes))
+        baldes, materiais = baldes[ordem], materiais[ordem]
+        inicio_grupo = np.ones(k, dtype=bool)
+        inicio_grupo[1:] = (baldes[1:] != baldes[:-1]) | (materiais[1:] != materiais[:-1])
+        cortes = np.flatnonzero(inicio_grupo)
+        if k:
+            agrupado = (
+                materiais[cortes],
+                np.add.reduceat(quantidades[ordem], cortes),
+                np.maximum.reduceat(timestamps[ordem], cortes),
+                np.add.reduceat(self.contagens()[:k][ordem], cortes),
+                np.maximum.reduceat(self.maximos()[:k][ordem], cortes)
+            )
+            por_tempo = np.argsort(agrupado[2], kind="stable")
+            agrupado = [coluna[por_tempo] for coluna in agrupado]
+        else:
+            agrupado = [np.empty(0, dtype=dtype) for dtype in (np.int32, np.float64, np.int64, np.int64, np.float64)]
+        restantes = (
+            self._materiais[k:n], self._quantidades[k:n], self._timestamps[k:n], self.contagens()[k:], self.maximos()[k:]
+        )
+        self._substituir_colunas(*(np.concatenate(par) for par in zip(agrupado, restantes)))
+        self._linhas_compactadas = len(cortes)
+        self._corte_semanal = corte_semanal_us
+        return k - len(cortes)
+
+    # --- índices de tempo ---
+
+    def _invalidar_indices(self):
+        # troca o objeto inteiro: leitores em andamento terminam sobre os índices antigos
+        self._indices = _IndicesHistorico()
+
+    def _atualizar_indices(self, indices):
+        # chamado sob indices.trava; a cobertura só avança depois de todas as colunas estendidas
+        n = self._tamanho
+        inicio = indices.cobertura
+        if inicio >= n:
+            return
+        quantidades = self._quantidades[inicio:n]
+        contagens = self.contagens()[inicio:n]
+        indices.prefixo.estender(indices.prefixo.view()[-1] + np.cumsum(quantidades))
+        indices.prefixo_contagem.estender(indices.prefixo_contagem.view()[-1] + np.cumsum(contagens))
+
+        materiais = self._materiais[inicio:n]
+        ordem = np.argsort(materiais, kind="stable")
+        ids, cortes = np.unique(materiais[ordem], return_index=True)
+        for material_id, grupo in zip(ids, np.split(ordem, cortes[1:])):
+            indice = indices.por_material.get(material_id)
+            if indice is None:
+                indice = indices.por_material[int(material_id)] = (
+                    _ColunaCrescente(np.int64), _ColunaCrescente(np.int64),
+                    _ColunaCrescente(np.float64, [0.0]), _ColunaCrescente(np.int64, [0])
+                )
+            posicoes, timestamps, prefixo, prefixo_contagem = indice
+            posicoes.estender(grupo + inicio)
+            timestamps.estender(self._timestamps[grupo + inicio])
+            prefixo.estender(prefixo.view()[-1] + np.cumsum(quantidades[grupo]))
+            prefixo_contagem.estender(prefixo_contagem.view()[-1] + np.cumsum(contagens[grupo]))
+        indices.cobertura = n
+
+    def _consultar_indices(self, material_id=None):
+        """
+        (posições, timestamps, prefixo, prefixo de contagem) atualizados, como views
+        de tamanho fixo tiradas sob a trava dos índices; posições é None para o
+        histórico inteiro, e a tupla inteira é None para material sem registros.
+        """
+        indices = self._indices
+        with indices.trava:
+            self._atualizar_indices(indices)
+            if material_id is None:
+                n = indices.cobertura
+                return None, self._timestamps[:n], indices.prefixo.view(), indices.prefixo_contagem.view()
+            indice = indices.por_material.get(material_id)
+            if indice is None:
+                return None
+            return tuple(coluna.view() for coluna in indice)
+
+    def _faixa(self, timestamps, inicio_us, fim_us):
+        i = 0 if inicio_us is None else int(np.searchsorted(timestamps, inicio_us, side="left"))
+        j = len(timestamps) if fim_us is None else int(np.searchsorted(timestamps, fim_us, side="left"))
+        return i, max(i, j)
+
+    def intervalo(self, inicio_us=None, fim_us=None):
+        """retorna (i, j) tal que as posições i..j-1 têm timestamp em [inicio, fim)."""
+        return self._faixa(self._timestamps[:self._tamanho], inicio_us, fim_us)
+
+    def posicoes(self, material_id=None, inicio_us=None, fim_us=None):
+        """
+        retorna as posições (em ordem de tempo) dos registros em [inicio, fim),
+        opcionalmente de um único material: O(log n + tamanho da saída).
+        """
+        if material_id is None:
+            i, j = self._faixa(self._timestamps[:self._tamanho], inicio_us, fim_us)
+            return np.arange(i, j)
+        indice = self._consultar_indices(material_id)
+        if indice is None:
+            return np.empty(0, dtype=np.int64)
+        i, j = self._faixa(indice[1], inicio_us, fim_us)
+        return indice[0][i:j]
+
+    def agregar(self, material_id=None, inicio_us=None, fim_us=None):
+        """
+        retorna (soma, contagem de eventos, máximo) das quantidades em [inicio, fim);
+        soma e contagem em O(log n). Linhas compactadas entram com seus totais.
+        """
+        indice = self._consultar_indices(material_id)
+        if indice is None:
+            return 0.0, 0, None
+        posicoes, timestamps, prefixo, prefixo_contagem = indice
+        maximos = self.maximos()
+        i, j = self._faixa(timestamps, inicio_us, fim_us)
+        if posicoes is None:
+            maximo = maximos[i:j].max() if j > i else None
+        else:
+            maximo = maximos[posicoes[i:j]].max() if j > i else None
+        return (
+            float(prefixo[j] - prefixo[i]), int(prefixo_contagem[j] - prefixo_contagem[i]),
+            None if maximo is None else float(maximo)
+        )
+
+    def registro(self, indice):
+        """monta o registro no formato dict legado; linhas compactadas trazem também a `contagem` de eventos."""
+        registro = {
+            "material": self._nomes_materiais[self._materiais[indice]],
+            "quantidade": float(self._quantidades[indice]),
+            "timestamp": _de_epoch_us(self._timestamps[indice])
+        }
+        if self._contagens is not None and self._contagens[indice] != 1:
+            registro["contagem"] = int(self._contagens[indice])
+        return registro
+
+    def __getitem__(self, indice):
+        if indice < 0:
+            indice += self._tamanho
+        if not 0 <= indice < self._tamanho:
+            raise IndexError("índice fora do histórico")
+        return self.registro(indice)
+
+    def __iter__(self):
+        for i in range(self._tamanho):
+            yield self.registro(i)
+
+    @classmethod
+    def de_colunas(cls, nomes_materiais, materiais, quantidades, timestamps, contagens=None, maximos=None):
+        """reconstrói um histórico a partir de colunas já existentes (ex.: snapshot), compactadas ou não."""
+        historico = cls(nomes_materiais)
+        if contagens is None:
+            historico.estender(materiais, quantidades, timestamps)
+        else:
+            historico._substituir_colunas(materiais, quantidades, timestamps, contagens, maximos)
+        return historico
+
+
+class AgregadosConsumo:
+    """
+    total consumido, número de registros e último timestamp por id de material,
+    atualizados a cada registro para que as análises custem O(materiais).
+    """
+    def __init__(self):
+        self.totais = []
+        self.contagens = []
+        self.ultimos = []
+        self.geracao = 0
+
+    def copia(self):
+        nova = AgregadosConsumo()
+        nova.totais, nova.contagens, nova.ultimos = list(self.totais), list(self.contagens), list(self.ultimos)
+        return nova
+
+    def _garantir(self, material_id):
+        faltam = material_id + 1 - len(self.totais)
+        if faltam > 0:
+            self.totais.extend([0.0] * faltam)
+            self.contagens.extend([0] * faltam)
+            self.ultimos.extend([None] * faltam)
+
+    def registrar(self, material_id, quantidade, timestamp_us):
+        if material_id >= len(self.totais):
+            self._garantir(material_id)
+        self.totais[material_id] += quantidade
+        self.contagens[material_id] += 1
+        ultimo = self.ultimos[material_id]
+        if ultimo is None or timestamp_us > ultimo:
+            self.ultimos[material_id] = timestamp_us
+
+    def registrar_colunas(self, materiais, quantidades, timestamps, contagens=None):
+        """incorpora colunas inteiras de uma vez (recuperação de snapshot, lotes); `contagens`: eventos por linha."""
+        materiais = np.asarray(materiais, dtype=np.int64)
+        if len(materiais) == 0:
+            return
+        n = int(materiais.max()) + 1
+        self._garantir(n - 1)
+        totais = np.bincount(materiais, weights=np.asarray(quantidades, dtype=np.float64), minlength=n)
+        if contagens is None:
+            contagens = np.bincount(materiais, minlength=n)
+        else:
+            contagens = np.bincount(materiais, weights=contagens, minlength=n).astype(np.int64)
+        ultimos = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(ultimos, materiais, np.asarray(timestamps, dtype=np.int64))
+        for material_id in np.flatnonzero(contagens):
+            self.totais[material_id] += float(totais[material_id])
+            self.contagens[material_id] += int(contagens[material_id])
+            ultimo = self.ultimos[material_id]
+            if ultimo is None or ultimos[material_id] > ultimo:
+                self.ultimos[material_id] = int(ultimos[material_id])
+
+    def combinar(self, outro):
+        """soma a estes os agregados de `outro`."""
+        if not outro.totais:
+            return
+        self._garantir(len(outro.totais) - 1)
+        for material_id, contagem in enumerate(outro.contagens):
+            if not contagem:
+                continue
+            self.totais[material_id] += outro.totais[material_id]
+            self.contagens[material_id] += contagem
+            ultimo = self.ultimos[material_id]
+            if ultimo is None or outro.ultimos[material_id] > ultimo:
+                self.ultimos[material_id] = outro.ultimos[material_id]
+
+    def por_material(self, nomes_materiais):
+        """retorna {material: {"total_consumido", "num_consumos", "ultimo_consumo"}}."""
+        return {
+            nomes_materiais[material_id]: {
+                "total_consumido": self.totais[material_id],
+                "num_consumos": contagem,
+                "ultimo_consumo": _de_epoch_us(self.ultimos[material_id])
+            }
+            for material_id, contagem in enumerate(self.contagens) if contagem
+        }
+
+
+class _LeituraEstoque:
+    """
+    consultas comuns ao StockData e aos seus instantâneos: só leem `_matriz`,
+    `historico_consumo`, os agregados e a tabela de materiais.
+    """
     def get_estoque(self, unidade, material=None):
         """retorna o estoque de um material específico ou de toda a unidade."""
-        if unidade not in self.estoque:
-            return None if material else {}
         if material:
-            return self.estoque[unidade].get(material)
-        return self.estoque[unidade]
+            return self._matriz.obter("estoque", unidade, material)
+        return self._matriz.linha("estoque", unidade)
+
+    def nome_material(self, material_id):
+        """retorna o nome do material a partir do seu id."""
+        return self._materiais[material_id]
+
+    @property
+    def num_materiais(self):
+        return len(self._materiais)
+
+    def get_historico_consumo(self, unidade, material=None, inicio=None, fim=None):
+        """
+        retorna o histórico de uma unidade como lista de dicts (visão de compatibilidade),
+        em ordem de tempo e opcionalmente filtrado por material e intervalo [inicio, fim).
+        """
+        historico = self.historico_consumo.get(unidade)
+        if historico is None:
+            return []
+        if material is None and inicio is None and fim is None:
+            return list(historico)
+        if material is not None and material not in self._ids_materiais:
+            return []
+        posicoes = historico.posicoes(
+            None if material is None else self._ids_materiais[material],
+            None if inicio is None else _para_epoch_us(inicio),
+            None if fim is None else _para_epoch_us(fim)
+        )
+        return [historico.registro(i) for i in posicoes]
+
+    def agregar_janela(self, dias, unidade=None, material=None, referencia=None):
+        """
+        soma, contagem e máximo do consumo nos últimos `dias` dias até `referencia`
+        (agora, por padrão), para uma unidade ou para a rede inteira.
+        """
+        referencia = referencia or datetime.datetime.now()
+        fim_us = _para_epoch_us(referencia)
+        inicio_us = fim_us - round(dias * 86_400 * 1_000_000)
+        if material is not None and material not in self._ids_materiais:
+            return {"soma": 0.0, "contagem": 0, "maximo": None}
+        material_id = None if material is None else self._ids_materiais[material]
+
+        soma, contagem, maximo = 0.0, 0, None
+        unidades = self.historico_consumo if unidade is None else [unidade]
+        for un in unidades:
+            historico = self.historico_consumo.get(un)
+            if historico is None:
+                continue
+            s, c, m = historico.agregar(material_id, inicio_us, fim_us)
+            soma += s
+            contagem += c
+            if m is not None and (maximo is None or m > maximo):
+                maximo = m
+        return {"soma": soma, "contagem": contagem, "maximo": maximo}
+
+    def unidades_com_historico(self):
+        """retorna as unidades que possuem histórico de consumo."""
+        return list(self.historico_consumo)
+
+    def get_colunas_consumo(self, unidade):
+        """retorna as colunas (materiais, quantidades, timestamps) do histórico da unidade, em ordem de tempo e sem cópia."""
+        historico = self.historico_consumo.get(unidade)
+        if historico is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64)
+        return historico.colunas()
+
+    def get_contagens_consumo(self, unidade):
+        """número de eventos de cada linha de `get_colunas_consumo` (maior que 1 nos baldes compactados)."""
+        historico = self.historico_consumo.get(unidade)
+        return np.empty(0, dtype=np.int64) if historico is None else historico.contagens()
+
+    def agregar_consumo_por_material(self, unidade=None, inicio=None, fim=None):
+        """
+        retorna {material: {"total_consumido", "num_consumos", ...}}. Sem intervalo
+        de tempo usa os agregados incrementais (O(materiais)); com intervalo,
+        agrega as colunas de histórico.
+        """
+        if inicio is None and fim is None:
+            if unidade is None:
+                return self._agregados.por_material(self._materiais)
+            agregados_unidade = self._agregados_unidade.get(unidade)
+            return agregados_unidade.por_material(self._materiais) if agregados_unidade else {}
+
+        unidades = self.historico_consumo if unidade is None else [unidade]
+        num_materiais = self.num_materiais
+        totais = np.zeros(num_materiais, dtype=np.float64)
+        contagens = np.zeros(num_materiais, dtype=np.int64)
+        inicio_us = None if inicio is None else _para_epoch_us(inicio)
+        fim_us = None if fim is None else _para_epoch_us(fim)
+        for un in unidades:
+            historico = self.historico_consumo.get(un)
+            if historico is None:
+                continue
+            materiais, quantidades, _ = historico.colunas()
+            i, j = historico.intervalo(inicio_us, fim_us)
+            materiais, quantidades = materiais[i:j], quantidades[i:j]
+            totais += np.bincount(materiais, weights=quantidades, minlength=num_materiais)
+            if historico.compactado:
+                contagens += np.bincount(materiais, weights=historico.contagens()[i:j], minlength=num_materiais).astype(np.int64)
+            else:
+                contagens += np.bincount(materiais, minlength=num_materiais)
+
+        return {
+            self._materiais[material_id]: {
+                "total_consumido": float(totais[material_id]),
+                "num_consumos": int(contagens[material_id])
+            }
+            for material_id in np.flatnonzero(contagens)
+        }
+
+    def get_limite_minimo(self, unidade, material):
+        """retorna o limite minimo de um material."""
+        return self._matriz.obter("limite", unidade, material)
+
+    def unidades(self):
+        """todas as unidades com estoque, limite ou histórico."""
+        return list(dict.fromkeys([*self.estoque, *self.alertas, *self.historico_consumo]))
+
+    def exportar_estado(self):
+        """retorna o estado completo em estruturas simples (usado pelos snapshots, a partir de um instantâneo)."""
+        return {
+            "estoque": dict(self.estoque.items()),
+            "alertas": dict(self.alertas.items()),
+            "materiais": self._materiais[:self.num_materiais],
+            "historico": {unidade: historico.colunas() for unidade, historico in self.historico_consumo.items()},
+            "resumo": self._resumos(self.historico_consumo)
+        }
+
+    @staticmethod
+    def _resumos(historicos):
+        # (contagens, máximos) só dos históricos já compactados
+        return {
+            unidade: (historico.contagens(), historico.maximos())
+            for unidade, historico in historicos.items() if historico.compactado
+        }
+
+
+class StockData(_LeituraEstoque):
+    """
+    gerencia o armazenamento de dados de estoque e histórico de consumo.
+    Com `diretorio`, todas as alterações são gravadas em um write-ahead log
+    com snapshots periódicos e o estado é recuperado na inicialização; cada
+    escrita só retorna depois do commit do log que a cobre (várias threads
+    dividem o mesmo fsync). Com `aguardar_commit=False` a durabilidade é
+    assíncrona: uma escrita já retornada pode se perder numa queda, até
+    `intervalo_commit` segundos depois.
+    Escritas em unidades diferentes correm em paralelo: cada unidade tem uma
+    trava (de um conjunto fixo de `TRAVAS_UNIDADES`, por hash) que cobre o
+    seu histórico, os seus agregados, o índice de alertas e o registro no log,
+    e só uma seção global curta (ids de material, agregados totais, matriz e
+    versão) é comum a todas. Instantâneos, snapshots e mudanças estruturais
+    adquirem todas as travas. Ordem de aquisição: travas de unidade, em
+    ordem de índice, e depois a global.
+    Estoque e limites ficam em uma MatrizEstoque (unidade × material, ids
+    inteiros); `estoque` e `alertas` são visões somente leitura dela.
+    `instantaneo()` entrega uma visão somente leitura versionada do estado,
+    sem cópia: a cada instantâneo começa uma nova geração, e a primeira
+    escrita de uma geração em cada estrutura (dicionários, histórico e
+    agregados de uma unidade, bloco da matriz) copia só aquela estrutura.
+    Com `retencao` (PoliticaRetencao), um compactador em segundo plano
+    agrupa o histórico antigo em baldes diários e semanais; as consultas
+    combinam baldes e eventos brutos, e os agregados totais não mudam.
+    """
+    TRAVAS_UNIDADES = 64
+
+    def __init__(self, diretorio=None, intervalo_commit=0.05, intervalo_snapshot=10000, retencao=None,
+                 aguardar_commit=True):
+        self._trava = threading.RLock()  # seção global curta
+        self._travas_unidades = [threading.RLock() for _ in range(self.TRAVAS_UNIDADES)]
+        self._geracao = 0
+        self._versao = 0
+        self._novo_estado([])
+        self.indice_alertas = IndiceAlertas()
+        self._persistencia = None
+        self.aguardar_commit = aguardar_commit
+        self._snapshot_pendente = False
+        self._trava_snapshot = threading.Lock()  # um snapshot por vez; adquirida antes das travas do data store
+        self._local = threading.local()  # último registro do log de cada thread, a aguardar
+        if diretorio is not None:
+            persistencia = PersistenciaEstoque(diretorio, intervalo_commit, intervalo_snapshot)
+            persistencia.recuperar(self)
+            self._persistencia = persistencia
+        self.retencao = retencao
+        self._compactador = None
+        if retencao is not None:
+            self._compactador = CompactadorHistorico(self, retencao)
+            self._compactador.iniciar()
+
+    def _novo_estado(self, materiais):
+        # estruturas novas, que nenhum instantâneo já entregue compartilha
+        self._materiais = list(materiais)  # id -> nome do material (só cresce)
+        self._ids_materiais = {nome: i for i, nome in enumerate(self._materiais)}  # nome do material -> id
+        self._matriz = MatrizEstoque(self._materiais, self._ids_materiais, self.id_material)
+        self.estoque = self._matriz.visao("estoque")
+        self.alertas = self._matriz.visao("limite")
+        self.historico_consumo = {}  # unidade -> HistoricoColunar
+        self._agregados = AgregadosConsumo()
+        self._agregados_unidade = {}  # unidade -> AgregadosConsumo
+        self._geracoes = dict.fromkeys(("historico_consumo", "_agregados", "_agregados_unidade"), self._geracao)
+
+    # --- travas ---
+
+    def _trava_unidade(self, unidade):
+        return self._travas_unidades[hash(unidade) % self.TRAVAS_UNIDADES]
+
+    @contextmanager
+    def _travar_unidades(self, unidades):
+        with ExitStack() as pilha:
+            for i in sorted({hash(unidade) % self.TRAVAS_UNIDADES for unidade in unidades}):
+                pilha.enter_context(self._travas_unidades[i])
+            yield
+
+    @contextmanager
+    def _travar_tudo(self):
+        # exclusivo: nenhuma escrita pela metade em nenhuma unidade
+        with ExitStack() as pilha:
+            for trava in self._travas_unidades:
+                pilha.enter_context(trava)
+            pilha.enter_context(self._trava)
+            yield
+
+    # --- copy-on-write (chamados sob a trava global) ---
+
+    def _exclusivo(self, atributo, copiar):
+        # a primeira escrita da geração copia a estrutura, que pode estar em um instantâneo
+        valor = getattr(self, atributo)
+        if self._geracoes[atributo] != self._geracao:
+            valor = copiar(valor)
+            setattr(self, atributo, valor)
+            self._geracoes[atributo] = self._geracao
+        return valor
+
+    def _exclusivo_da_unidade(self, atributo, unidade, criar, derivar):
+        por_unidade = self._exclusivo(atributo, dict)
+        valor = por_unidade.get(unidade)
+        if valor is None:
+            valor = por_unidade[unidade] = criar()
+        elif valor.geracao != self._geracao:
+            valor = por_unidade[unidade] = derivar(valor)
+        valor.geracao = self._geracao
+        return valor
+
+    def _historico_exclusivo(self, unidade):
+        return self._exclusivo_da_unidade(
+            "historico_consumo", unidade, lambda: HistoricoColunar(self._materiais), HistoricoColunar.derivar
+        )
+
+    def _agregados_exclusivos(self, unidade):
+        return self._exclusivo_da_unidade("_agregados_unidade", unidade, AgregadosConsumo, AgregadosConsumo.copia)
+
+    @property
+    def versao(self):
+        """número de escritas aplicadas até agora; identifica o ponto no tempo de um instantâneo."""
+        return self._versao
+
+    def instantaneo(self):
+        """
+        visão somente leitura e consistente do estado atual, criada sem copiar
+        dados; as escritas seguintes não aparecem nela.
+        """
+        with self._travar_tudo():
+            instantaneo = InstantaneoEstoque(self)
+            self._geracao += 1
+            return instantaneo
+
+    # --- escritas (as versões com _ são chamadas com a trava da unidade adquirida) ---
+
+    def _registrar(self, *registro):
+        # sob a trava da unidade: no log, as operações de cada unidade ficam na ordem em que foram aplicadas
+        if not self._persistencia:
+            return
+        self._local.seq, snapshot = self._persistencia.registrar(*registro)
+        if snapshot:
+            self._snapshot_pendente = True
+
+    def _concluir_escrita(self):
+        # ao fim de cada escrita pública, fora das travas do data store
+        if self._persistencia is None:
+            return
+        self._snapshot_se_pendente()
+        seq = getattr(self._local, "seq", 0)
+        if seq and self.aguardar_commit:
+            self._local.seq = 0
+            self._persistencia.aguardar(seq)
+
+    def _snapshot_se_pendente(self, esperar=False):
+        """
+        grava o snapshot pedido pelo log. Só o instantâneo (copy-on-write) e a
+        rotação do log acontecem com o data store travado; a serialização roda
+        fora das travas, sem parar as escritas. Sem `esperar`, não faz nada se
+        outra thread já estiver gravando um snapshot (o pedido continua pendente).
+        """
+        if not self._snapshot_pendente or not self._trava_snapshot.acquire(blocking=esperar):
+            return
+        try:
+            with self._travar_tudo():
+                if not self._snapshot_pendente:
+                    return
+                self._snapshot_pendente = False
+                instantaneo = InstantaneoEstoque(self)
+                self._geracao += 1
+                seq = self._persistencia.rotacionar_log()
+            self._persistencia.gravar_snapshot(instantaneo.exportar_estado(), seq)
+        finally:
+            self._trava_snapshot.release()
+
+    def _definir(self, campo, unidade, material, valor):
+        with self._trava:
+            self._matriz.definir(campo, unidade, material, valor)
+            self._versao += 1
+        if campo == "estoque":
+            self.indice_alertas.atualizar_estoque(unidade, material, valor)
+        else:
+            self.indice_alertas.definir_limite(unidade, material, valor, self.get_estoque(unidade, material))
+        self._registrar(campo, unidade, material, valor)
 
     def update_estoque(self, unidade, material, quantidade):
         """atualiza a quantidade de um material no estoque."""
-        if unidade not in self.estoque:
-            self.estoque[unidade] = {}
-        self.estoque[unidade][material] = quantidade
+        quantidade = _validar_quantidade(quantidade)
+        with self._trava_unidade(unidade):
+            self._definir("estoque", unidade, material, quantidade)
+        self._concluir_escrita()
+
+    def id_material(self, material):
+        """retorna o id inteiro do material, registrando-o se ainda não existir."""
+        with self._trava:
+            material_id = self._ids_materiais.get(material)
+            if material_id is None:
+                material_id = len(self._materiais)
+                self._materiais.append(material)
+                self._ids_materiais[material] = material_id
+            return material_id
 
     def add_historico_consumo(self, unidade, material, quantidade, timestamp):
         """adiciona um registro ao histórico de consumo."""
-        if unidade not in self.historico_consumo:
-            self.historico_consumo[unidade] = []
-        self.historico_consumo[unidade].append({
-            "material": material,
-            "quantidade": quantidade,
-            "timestamp": timestamp
-        })
-
-    def get_historico_consumo(self, unidade):
-        """retorna o histórico de consumo de uma unidade."""
-        return self.historico_consumo.get(unidade, [])
+        timestamp_us = _para_epoch_us(timestamp)
+        with self._trava_unidade(unidade):
+            with self._trava:
+                material_id = self.id_material(material)
+                historico = self._historico_exclusivo(unidade)
+                agregados_unidade = self._agregados_exclusivos(unidade)
+                self._exclusivo("_agregados", AgregadosConsumo.copia).registrar(material_id, quantidade, timestamp_us)
+                self._versao += 1
+            historico.adicionar(material_id, quantidade, timestamp_us)
+            agregados_unidade.registrar(material_id, quantidade, timestamp_us)
+            self._registrar("consumo", unidade, material, quantidade, timestamp_us)
+        self._concluir_escrita()
+
+    def add_historico_consumo_lote(self, registros):
+        """adiciona vários registros (unidade, material, quantidade, timestamp) agrupando-os por unidade."""
+        por_unidade = {}
+        for unidade, material, quantidade, timestamp in registros:
+            colunas = por_unidade.get(unidade)
+            if colunas is None:
+                colunas = por_unidade[unidade] = ([], [], [])
+            colunas[0].append(material)
+            colunas[1].append(quantidade)
+            colunas[2].append(_para_epoch_us(timestamp))
+        with self._travar_unidades(por_unidade):
+            with self._trava:
+                for colunas in por_unidade.values():
+                    colunas[0][:] = [self.id_material(material) for material in colunas[0]]
+            for unidade, (materiais, quantidades, timestamps) in por_unidade.items():
+                self._estender_historico(unidade, materiais, quantidades, timestamps)
+        self._concluir_escrita()
+
+    def _estender_historico(self, unidade, materiais, quantidades, timestamps):
+        # colunas de uma unidade com ids de material locais
+        with self._trava:
+            historico = self._historico_exclusivo(unidade)
+            agregados_unidade = self._agregados_exclusivos(unidade)
+            self._exclusivo("_agregados", AgregadosConsumo.copia).registrar_colunas(materiais, quantidades, timestamps)
+            self._versao += 1
+            nomes = [self._materiais[m] for m in materiais] if self._persistencia else None
+        historico.estender(materiais, quantidades, timestamps)
+        agregados_unidade.registrar_colunas(materiais, quantidades, timestamps)
+        self._registrar("consumo_lote", unidade, nomes, quantidades, timestamps)
+
+    def update_estoque_lote(self, itens):
+        """
+        atualiza várias quantidades (unidade, material, quantidade) de uma vez;
+        todos os itens são validados antes de o primeiro ser aplicado.
+        """
+        itens = [(unidade, material, _validar_quantidade(quantidade)) for unidade, material, quantidade in itens]
+        celulas = {(unidade, material) for unidade, material, _ in itens}  # chaves não hasheáveis falham aqui
+        with self._travar_unidades({unidade for unidade, _ in celulas}):
+            for unidade, material, quantidade in itens:
+                self._definir("estoque", unidade, material, quantidade)
+        self._concluir_escrita()
+
+    def compactar_historico(self, politica=None, referencia=None):
+        """
+        aplica a política de retenção (a do data store, por padrão) com cortes
+        calculados a partir de `referencia` (agora, por padrão). Cada unidade é
+        compactada sob a sua trava, sem bloquear as escritas das demais;
+        unidades sem nada a compactar não são tocadas. Retorna o número de
+        linhas eliminadas. O log não registra a compactação: após uma
+        recuperação os eventos replicados do log voltam brutos e são
+        compactados na passada seguinte.
+        """
+        politica = politica or self.retencao
+        if politica is None:
+            return 0
+        corte_diario, corte_semanal = politica.cortes(_para_epoch_us(referencia or datetime.datetime.now()))
+        eliminadas = 0
+        for unidade in list(self.historico_consumo):
+            with self._trava_unidade(unidade):
+                historico = self.historico_consumo.get(unidade)
+                if historico is None or not historico.precisa_compactar(corte_diario, corte_semanal):
+                    continue
+                with self._trava:
+                    historico = self._historico_exclusivo(unidade)
+                    self._versao += 1
+                eliminadas += historico.compactar(corte_diario, corte_semanal)
+        return eliminadas
 
     def set_limite_minimo(self, unidade, material, limite):
         """ddefine o limite mínimo para um material em uma unidade."""
-        if unidade not in self.alertas:
-            self.alertas[unidade] = {}
-        self.alertas[unidade][material] = limite
+        with self._trava_unidade(unidade):
+            self._definir("limite", unidade, material, limite)
+        self._concluir_escrita()
 
-    def get_limite_minimo(self, unidade, material):
-        """retorna o limite minimo de um material."""
-        return self.alertas.get(unidade, {}).get(material) 
\ No newline at end of file
+    def matriz_estoque(self):
+        """cópia da MatrizEstoque (estoque e limites unidade × material) para análises vetoriais."""
+        with self._trava:
+            return self._matriz.copia()
+
+    def carregar_estado(self, estado):
+        """substitui o estado atual pelo conteúdo exportado por `exportar_estado`."""
+        with self._travar_tudo():
+            self._novo_estado(estado["materiais"])
+            for campo, dados in (("estoque", estado["estoque"]), ("limite", estado["alertas"])):
+                for unidade, materiais in dados.items():
+                    for material, valor in materiais.items():
+                        self._matriz.definir(campo, unidade, material, valor)
+            self.indice_alertas.reconstruir_pares(self._matriz.pares_com_limite())
+            resumos = estado.get("resumo", {})
+            for unidade, colunas in estado["historico"].items():
+                contagens, maximos = resumos.get(unidade, (None, None))
+                historico = HistoricoColunar.de_colunas(self._materiais, *colunas, contagens, maximos)
+                historico.geracao = self._geracao
+                self.historico_consumo[unidade] = historico
+                self._agregados.registrar_colunas(*colunas, contagens)
+                self._agregados_exclusivos(unidade).registrar_colunas(*colunas, contagens)
+            self._versao += 1
+
+    def exportar_unidades(self, unidades):
+        """estado só das `unidades`, no formato de `exportar_estado` (usado para mover unidades entre partições)."""
+        unidades = set(unidades)
+        with self._travar_tudo():
+            return {
+                "estoque": {u: self._matriz.linha("estoque", u) for u in unidades if u in self.estoque},
+                "alertas": {u: self._matriz.linha("limite", u) for u in unidades if u in self.alertas},
+                "materiais": list(self._materiais),
+                "historico": {
+                    u: tuple(coluna.copy() for coluna in historico.colunas())
+                    for u, historico in self.historico_consumo.items() if u in unidades
+                },
+                "resumo": {
+                    u: (historico.contagens().copy(), historico.maximos().copy())
+                    for u, historico in self.historico_consumo.items() if u in unidades and historico.compactado
+                }
+            }
+
+    def importar_unidades(self, estado):
+        """incorpora unidades exportadas por `exportar_unidades`, remapeando os ids de material."""
+        with self._travar_tudo():
+            for unidade, materiais in estado["estoque"].items():
+                for material, quantidade in materiais.items():
+                    self._definir("estoque", unidade, material, quantidade)
+            for unidade, materiais in estado["alertas"].items():
+                for material, limite in materiais.items():
+                    self._definir("limite", unidade, material, limite)
+            if estado["historico"]:
+                mapa = np.array([self.id_material(nome) for nome in estado["materiais"]], dtype=np.int32)
+                resumos = estado.get("resumo", {})
+                for unidade, (materiais, quantidades, timestamps) in estado["historico"].items():
+                    if unidade in resumos:
+                        self._importar_compactado(unidade, mapa[materiais], quantidades, timestamps, *resumos[unidade])
+                        continue
+                    # listas, como em add_historico_consumo_lote (o registro do log é JSON)
+                    self._estender_historico(
+                        unidade, mapa[materiais].tolist(), quantidades.tolist(), timestamps.tolist()
+                    )
+                if resumos and self._persistencia:
+                    # o log só registra eventos brutos: os baldes ficam no snapshot
+                    self._snapshot_pendente = True
+        self._snapshot_se_pendente(esperar=True)
+        self._concluir_escrita()
+
+    def _importar_compactado(self, unidade, materiais, quantidades, timestamps, contagens, maximos):
+        # histórico compactado de outra partição: a unidade não existe aqui, as colunas entram inteiras
+        historicos = self._exclusivo("historico_consumo", dict)
+        historico = HistoricoColunar.de_colunas(self._materiais, materiais, quantidades, timestamps, contagens, maximos)
+        historico.geracao = self._geracao
+        historicos[unidade] = historico
+        self._exclusivo("_agregados", AgregadosConsumo.copia).registrar_colunas(materiais, quantidades, timestamps, contagens)
+        self._agregados_exclusivos(unidade).registrar_colunas(materiais, quantidades, timestamps, contagens)
+        self._versao += 1
+
+    def remover_unidades(self, unidades):
+        """
+        remove todo o estado das `unidades`. Com persistência, grava um snapshot
+        (o log não tem registro de remoção).
+        """
+        with self._travar_tudo():
+            historicos = self._exclusivo("historico_consumo", dict)
+            agregados_por_unidade = self._exclusivo("_agregados_unidade", dict)
+            for unidade in unidades:
+                self._matriz.remover_unidade(unidade)
+                historicos.pop(unidade, None)
+                agregados_por_unidade.pop(unidade, None)
+            self._agregados = AgregadosConsumo()
+            self._geracoes["_agregados"] = self._geracao
+            for agregados_unidade in agregados_por_unidade.values():
+                self._agregados.combinar(agregados_unidade)
+            self._versao += 1
+            self.indice_alertas.reconstruir_pares(self._matriz.pares_com_limite())
+            if self._persistencia:
+                self._snapshot_pendente = True
+        self._snapshot_se_pendente(esperar=True)
+
+    def gravar_snapshot(self):
+        """força um snapshot e a compactação do log."""
+        if self._persistencia:
+            self._snapshot_pendente = True
+            self._snapshot_se_pendente(esperar=True)
+
+    def sincronizar(self):
+        """aguarda até que todas as alterações estejam gravadas em disco."""
+        if self._persistencia:
+            self._persistencia.sincronizar()
+
+    def fechar(self):
+        """encerra o compactador, grava as alterações pendentes e libera os arquivos de persistência."""
+        if self._compactador is not None:
+            self._compactador.parar()
+            self._compactador = None
+        if self._persistencia:
+            with self._trava_snapshot:  # espera um snapshot em curso
+                self._persistencia.fechar()
+
+
+class InstantaneoEstoque(_LeituraEstoque):
+    """
+    visão somente leitura de um StockData na versão `versao`, para relatórios
+    longos que não podem ver escritas pela metade. Referencia as estruturas
+    do estado vivo daquele momento, que o data store não altera mais (copia
+    antes de escrever); o que não muda continua compartilhado entre os dois.
+    Tem a mesma interface de consulta do StockData.
+    """
+    def __init__(self, data_store):
+        # chamado sob a trava do data store, que abre uma nova geração em seguida
+        self.versao = data_store.versao
+        self._materiais = data_store._materiais
+        self._ids_materiais = data_store._ids_materiais
+        self._num_materiais = len(self._materiais)
+        self._matriz = data_store._matriz.congelar()
+        self.estoque = self._matriz.visao("estoque")
+        self.alertas = self._matriz.visao("limite")
+        self.historico_consumo = data_store.historico_consumo
+        self._agregados = data_store._agregados
+        self._agregados_unidade = data_store._agregados_unidade
+
+    @property
+    def num_materiais(self):
+        # a tabela de materiais só cresce: o instantâneo vê o prefixo da sua versão
+        return self._num_materiais
+
+    def instantaneo(self):
+        return self
+
+    def matriz_estoque(self):
+        """a MatrizEstoque do instantâneo (somente leitura, sem cópia)."""
+        return self._matriz
+
+    def alertas_ativos(self):
+        """materiais abaixo do limite mínimo nesta versão (varredura vetorial da matriz)."""
+        return self._matriz.abaixo_do_limite()
+
+
+def leitura_consistente(data_store):
+    """instantâneo do data store, ou o próprio data store se ele não oferecer instantâneos (SQLite, particionado)."""
+    instantaneo = getattr(data_store, "instantaneo", None)
+    return data_store if instantaneo is None else instantaneo()
@@ -0,0 +1,307 @@
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from algorithms.sorting_and_searching import SortingAndSearching
+from business_logic.stock_management import SistemaGestaoEstoque
+from data_layer.matriz_estoque import _numero
+from data_layer.storage import StockData, _de_epoch_us, leitura_consistente
+from interface.renderizacao import SinkConsole
+
+FORMATOS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+CAMPOS_CONSUMO = ("unidade", "material", "quantidade", "timestamp")
+CAMPOS_ESTOQUE = ("unidade", "material", "quantidade", "limite_minimo")
+MAX_REJEITADOS = 100  # amostra de linhas rejeitadas guardada no resultado
+# epoch em segundos aceito na importação: o que _de_epoch_us converte de volta
+# em datetime (anos 1 a 9999, com um dia de folga para o fuso horário)
+EPOCH_MIN_S = (datetime.datetime(1, 1, 2) - datetime.datetime(1970, 1, 1)).total_seconds()
+EPOCH_MAX_S = (datetime.datetime(9999, 12, 30) - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+def _formato(caminho, formato=None):
+    formato = formato or FORMATOS.get(os.path.splitext(caminho)[1].lower())
+    if formato not in ("csv", "jsonl"):
+        raise ValueError(f"formato não reconhecido para '{caminho}': use csv ou jsonl")
+    return formato
+
+
+def _ler(caminho, formato):
+    """gera (número da linha, registro dict ou None se malformado) sem carregar o arquivo."""
+    with open(caminho, newline="", encoding="utf-8") as arquivo:
+        if formato == "csv":
+            leitor = csv.DictReader(arquivo)
+            for registro in leitor:
+                yield leitor.line_num, registro
+            return
+        for numero, linha in enumerate(arquivo, 1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                registro = None
+            yield numero, registro if isinstance(registro, dict) else None
+
+
+def _em_blocos(itens, tamanho):
+    itens = iter(itens)
+    while bloco := list(islice(itens, tamanho)):
+        yield bloco
+
+
+def _texto(registro, campo):
+    valor = registro.get(campo)
+    if valor is None or valor == "":
+        raise ValueError(f"campo '{campo}' ausente")
+    return str(valor)
+
+
+def _quantidade(registro, campo, opcional=False):
+    valor = registro.get(campo)
+    if valor is None or valor == "":
+        if opcional:
+            return None
+        raise ValueError(f"campo '{campo}' ausente")
+    if isinstance(valor, str):
+        texto = valor.strip()
+        try:
+            valor = int(texto)
+        except ValueError:
+            valor = float(texto)
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor) or valor < 0:
+        raise ValueError(f"valor inválido para {campo}: {registro.get(campo)!r}")
+    return valor
+
+
+def _timestamp_us(registro):
+    # ISO 8601 (formato da exportação) ou epoch em segundos
+    valor = registro.get("timestamp")
+    if isinstance(valor, str) and valor.strip():
+        texto = valor.strip()
+        try:
+            data = datetime.datetime.fromisoformat(texto)
+        except ValueError:
+            valor = float(texto)
+        else:
+            try:
+                valor = data.timestamp()
+            except (OverflowError, OSError, ValueError):
+                raise ValueError(f"timestamp fora do intervalo: {texto!r}") from None
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+        raise ValueError(f"timestamp inválido: {registro.get('timestamp')!r}")
+    if not EPOCH_MIN_S <= valor <= EPOCH_MAX_S:
+        raise ValueError(f"timestamp fora do intervalo: {registro.get('timestamp')!r}")
+    return round(valor * 1_000_000)
+
+
+def _converter_consumo(registro):
+    quantidade = _quantidade(registro, "quantidade")
+    if quantidade == 0:
+        raise ValueError("quantidade deve ser positiva")
+    return _texto(registro, "unidade"), _texto(registro, "material"), quantidade, _timestamp_us(registro)
+
+
+def _converter_estoque(registro):
+    # linhas só com limite (exportadas com a quantidade vazia) não alteram o estoque
+    quantidade = _quantidade(registro, "quantidade", opcional=True)
+    limite = _quantidade(registro, "limite_minimo", opcional=True)
+    if quantidade is None and limite is None:
+        raise ValueError("campos 'quantidade' e 'limite_minimo' ausentes")
+    return _texto(registro, "unidade"), _texto(registro, "material"), quantidade, limite
+
+
+class ArquivosEstoque:
+    """
+    importação e exportação em lote de estoque e histórico de consumo em
+    CSV ou JSON Lines, em streaming: as linhas são lidas por um gerador e
+    aplicadas em blocos de `tamanho_bloco` pelos caminhos em lote do data
+    store (`add_historico_consumo_lote`, `update_estoque_lote`), com memória
+    constante. A exportação lê um instantâneo do data store e grava bloco a
+    bloco, sem montar a lista completa. O progresso (linhas e linhas/s) é
+    emitido no sink a cada `intervalo_progresso` segundos.
+
+    Consumo: unidade, material, quantidade, timestamp (ISO 8601 ou epoch em
+    segundos). Estoque: unidade, material, quantidade, limite_minimo, com pelo
+    menos um dos dois; a quantidade vazia mantém o estoque da célula.
+    """
+    def __init__(self, sistema=None, sink=None, tamanho_bloco=10_000, intervalo_progresso=1.0):
+        self.sistema = sistema if sistema is not None else SistemaGestaoEstoque()
+        self._sink = sink
+        self.tamanho_bloco = tamanho_bloco
+        self.intervalo_progresso = intervalo_progresso
+
+    @property
+    def sink(self):
+        return self._sink if self._sink is not None else self.sistema.sink
+
+    # --- importação ---
+
+    def importar_consumo(self, caminho, formato=None, ordenar=False):
+        """
+        acrescenta o histórico de consumo do arquivo (sem alterar o estoque).
+        Com `ordenar=True` as linhas passam por uma ordenação externa por
+        timestamp antes do data store, para arquivos fora de ordem grandes.
+        """
+        resultado = self._novo_resultado("importar_consumo", caminho)
+        registros = self._validos(_ler(caminho, _formato(caminho, formato)), _converter_consumo, resultado)
+        if ordenar:
+            registros = SortingAndSearching().ordenar_externo(
+                registros, key=lambda registro: registro[3], tamanho_run=max(self.tamanho_bloco, 100_000)
+            )
+        for bloco in _em_blocos(registros, self.tamanho_bloco):
+            self.sistema.data_store.add_historico_consumo_lote(bloco)
+            self._avancar(resultado, len(bloco))
+        return self._concluir(resultado)
+
+    def importar_estoque(self, caminho, formato=None):
+        """define o estoque (valor absoluto) e o limite mínimo informados em cada linha do arquivo."""
+        resultado = self._novo_resultado("importar_estoque", caminho)
+        registros = self._validos(_ler(caminho, _formato(caminho, formato)), _converter_estoque, resultado)
+        data_store = self.sistema.data_store
+        for bloco in _em_blocos(registros, self.tamanho_bloco):
+            with self.sistema.travar_unidades(*{registro[0] for registro in bloco}):
+                data_store.update_estoque_lote([
+                    (unidade, material, quantidade) for unidade, material, quantidade, _ in bloco if quantidade is not None
+                ])
+                for unidade, material, _, limite in bloco:
+                    if limite is not None:
+                        data_store.set_limite_minimo(unidade, material, limite)
+            self._avancar(resultado, len(bloco))
+        return self._concluir(resultado)
+
+    def _validos(self, linhas, converter, resultado):
+        # converte as linhas válidas; as inválidas só entram na contagem (e na amostra) de rejeitadas
+        for numero, registro in linhas:
+            resultado["linhas"] += 1
+            try:
+                if registro is None:
+                    raise ValueError("linha malformada")
+                yield converter(registro)
+            except ValueError as erro:
+                resultado["num_rejeitados"] += 1
+                if len(resultado["rejeitados"]) < MAX_REJEITADOS:
+                    resultado["rejeitados"].append({"linha": numero, "motivo": str(erro)})
+
+    # --- exportação ---
+
+    def exportar_consumo(self, caminho, formato=None, unidades=None):
+        """grava o histórico de consumo (todas as unidades ou só `unidades`), em ordem de tempo por unidade."""
+        resultado = self._novo_resultado("exportar_consumo", caminho)
+        fonte = leitura_consistente(self.sistema.data_store)
+        with self._escrita(caminho, _formato(caminho, formato), CAMPOS_CONSUMO) as escrever:
+            for unidade in (fonte.unidades_com_historico() if unidades is None else unidades):
+                materiais, quantidades, timestamps = fonte.get_colunas_consumo(unidade)
+                for inicio in range(0, len(materiais), self.tamanho_bloco):
+                    fim = inicio + self.tamanho_bloco
+                    linhas = [
+                        (unidade, fonte.nome_material(material), _numero(quantidade), _de_epoch_us(timestamp).isoformat())
+                        for material, quantidade, timestamp in zip(
+                            materiais[inicio:fim].tolist(), quantidades[inicio:fim].tolist(), timestamps[inicio:fim].tolist()
+                        )
+                    ]
+                    escrever(linhas)
+                    resultado["linhas"] += len(linhas)
+                    self._avancar(resultado, len(linhas))
+        return self._concluir(resultado)
+
+    def exportar_estoque(self, caminho, formato=None):
+        """grava estoque e limite mínimo de cada par (unidade, material) com algum dos dois definido."""
+        resultado = self._novo_resultado("exportar_estoque", caminho)
+        matriz = leitura_consistente(self.sistema.data_store).matriz_estoque()
+        with self._escrita(caminho, _formato(caminho, formato), CAMPOS_ESTOQUE) as escrever:
+            for unidade in matriz.nomes_unidades[:matriz.forma[0]]:
+                estoque, limites = matriz.linha("estoque", unidade), matriz.linha("limite", unidade)
+                linhas = [
+                    (unidade, material, estoque.get(material), limites.get(material))
+                    for material in dict.fromkeys([*estoque, *limites])
+                ]
+                if linhas:
+                    escrever(linhas)
+                    resultado["linhas"] += len(linhas)
+                    self._avancar(resultado, len(linhas))
+        return self._concluir(resultado)
+
+    @staticmethod
+    @contextmanager
+    def _escrita(caminho, formato, campos):
+        """abre o arquivo de saída e entrega `escrever(linhas)` para listas de tuplas na ordem de `campos`."""
+        with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+            if formato == "csv":
+                escritor = csv.writer(arquivo)
+                escritor.writerow(campos)
+                yield lambda linhas: escritor.writerows(
+                    tuple("" if valor is None else valor for valor in linha) for linha in linhas
+                )
+            else:
+                yield lambda linhas: arquivo.writelines(
+                    json.dumps(dict(zip(campos, linha)), ensure_ascii=False) + "\n" for linha in linhas
+                )
+
+    # --- progresso ---
+
+    @staticmethod
+    def _novo_resultado(operacao, caminho):
+        return {
+            "operacao": operacao, "arquivo": caminho, "linhas": 0, "aplicados": 0,
+            "num_rejeitados": 0, "rejeitados": [], "_inicio": time.perf_counter(), "_ultimo_aviso": time.perf_counter()
+        }
+
+    def _avancar(self, resultado, quantidade):
+        resultado["aplicados"] += quantidade
+        agora = time.perf_counter()
+        if agora - resultado["_ultimo_aviso"] >= self.intervalo_progresso:
+            resultado["_ultimo_aviso"] = agora
+            self.sink.emitir(
+                "progresso_arquivo", operacao=resultado["operacao"], arquivo=resultado["arquivo"],
+                linhas=resultado["linhas"], aplicados=resultado["aplicados"],
+                linhas_por_s=resultado["linhas"] / (agora - resultado["_inicio"])
+            )
+
+    def _concluir(self, resultado):
+        duracao = time.perf_counter() - resultado.pop("_inicio")
+        del resultado["_ultimo_aviso"]
+        resultado["duracao_s"] = duracao
+        resultado["linhas_por_s"] = resultado["linhas"] / duracao if duracao > 0 else 0.0
+        self.sink.emitir(
+            "arquivo_processado", operacao=resultado["operacao"], arquivo=resultado["arquivo"],
+            linhas=resultado["linhas"], aplicados=resultado["aplicados"],
+            rejeitados=resultado["num_rejeitados"], linhas_por_s=resultado["linhas_por_s"]
+        )
+        return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="importação e exportação em lote de estoque e consumo")
+    parser.add_argument("operacao", choices=["importar-consumo", "importar-estoque", "exportar-consumo", "exportar-estoque"])
+    parser.add_argument("arquivo", help="caminho do arquivo .csv ou .jsonl")
+    parser.add_argument("--diretorio", required=True, help="diretório de persistência do data store")
+    parser.add_argument("--formato", choices=["csv", "jsonl"], help="padrão: pela extensão do arquivo")
+    parser.add_argument("--bloco", type=int, default=10_000, help="linhas por bloco aplicado ao data store")
+    parser.add_argument("--ordenar", action="store_true", help="ordena o consumo por timestamp antes de importar")
+    args = parser.parse_args(argv)
+
+    data_store = StockData(args.diretorio)
+    try:
+        arquivos = ArquivosEstoque(SistemaGestaoEstoque(data_store, sink=SinkConsole()), tamanho_bloco=args.bloco)
+        if args.operacao == "importar-consumo":
+            resultado = arquivos.importar_consumo(args.arquivo, args.formato, ordenar=args.ordenar)
+        elif args.operacao == "importar-estoque":
+            resultado = arquivos.importar_estoque(args.arquivo, args.formato)
+        elif args.operacao == "exportar-consumo":
+            resultado = arquivos.exportar_consumo(args.arquivo, args.formato)
+        else:
+            resultado = arquivos.exportar_estoque(args.arquivo, args.formato)
+    finally:
+        data_store.fechar()
+    for rejeitado in resultado["rejeitados"]:
+        print(f"  linha {rejeitado['linha']}: {rejeitado['motivo']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from business_logic.stock_management import SistemaGestaoEstoque, SistemaGestaoParticionado
+from business_logic.data_analysis import AnalisadorDados
+from business_logic.eventos import SinkSilencioso
+from algorithms.data_structures import Grafo
+from data_layer.particionado import StockDataParticionado
+from data_layer.sqlite_storage import SQLiteStockData
+
+CENARIO_BASE = {"unidades": 20, "materiais": 200, "historico": 20000}
+OPERACOES_ESCRITA = ("ingestao_lote", "ingestao_unitaria")  # alteram o cenário
+
+VARREDURAS = {
+    "unidades": [10, 40, 160],
+    "materiais": [100, 400, 1600],
+    "historico": [10000, 40000, 160000],
+}
+
+
+def medir(operacao, preparar=None, aquecimento=1, repeticoes=5):
+    """
+    cronometra `operacao` com perf_counter: `aquecimento` execuções descartadas
+    e `repeticoes` medidas. `preparar()`, se informado, roda fora do tempo antes
+    de cada execução e seu retorno é passado à operação. Retorna estatísticas em segundos.
+    """
+    def executar():
+        argumento = preparar() if preparar is not None else None
+        inicio = time.perf_counter()
+        if preparar is not None:
+            operacao(argumento)
+        else:
+            operacao()
+        return time.perf_counter() - inicio
+
+    for _ in range(aquecimento):
+        executar()
+    gc_ativo = gc.isenabled()
+    gc.disable()  # coletas do GC no meio da medida só adicionam ruído
+    try:
+        tempos = [executar() for _ in range(repeticoes)]
+    finally:
+        if gc_ativo:
+            gc.enable()
+    return {
+        "mediana_s": statistics.median(tempos),
+        "minimo_s": min(tempos),
+        "media_s": statistics.fmean(tempos),
+        "desvio_s": statistics.pstdev(tempos),
+        "repeticoes": repeticoes,
+    }
+
+
+def medir_memoria(construir):
+    """
+    executa `construir()` sob tracemalloc e retorna (resultado, memória), com os
+    bytes alocados que continuam vivos ao final e o pico durante a construção.
+    Mede toda a estrutura alocada (listas, dicts, arrays NumPy), não só o objeto raiz.
+    """
+    gc.collect()
+    ja_rastreando = tracemalloc.is_tracing()
+    if not ja_rastreando:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+        tracemalloc.reset_peak()
+    antes, _ = tracemalloc.get_traced_memory()
+    resultado = construir()
+    gc.collect()
+    depois, pico = tracemalloc.get_traced_memory()
+    if not ja_rastreando:
+        tracemalloc.stop()
+    return resultado, {"retida_bytes": depois - antes, "pico_bytes": pico - antes}
+
+
+def construir_cenario(unidades, materiais, historico, semente=42):
+    """sistema silencioso com estoque, limites, histórico em lote e uma rede entre as unidades."""
+    aleatorio = random.Random(semente)
+    nomes_unidades = [f"UN{i + 1}" for i in range(unidades)]
+    nomes_materiais = [f"Material{i + 1}" for i in range(materiais)]
+
+    sistema = SistemaGestaoEstoque(sink=SinkSilencioso())
+    reposicoes = [(u, m, aleatorio.randint(100, 1000)) for u in nomes_unidades for m in nomes_materiais]
+    sistema.reabastecer_lote(reposicoes)
+    for unidade in nomes_unidades:
+        for material in aleatorio.sample(nomes_materiais, max(1, materiais // 10)):
+            sistema.definir_limite_minimo(unidade, material, aleatorio.randint(200, 600))
+    consumos = [
+        (aleatorio.choice(nomes_unidades), aleatorio.choice(nomes_materiais), aleatorio.randint(1, 5))
+        for _ in range(historico)
+    ]
+    sistema.registrar_consumo_lote(consumos)
+
+    # anel com atalhos: conexa e com rotas alternativas
+    rede = Grafo()
+    for i, unidade in enumerate(nomes_unidades):
+        rede.adicionar_aresta(unidade, nomes_unidades[(i + 1) % unidades], aleatorio.randint(5, 30))
+        rede.adicionar_aresta(unidade, aleatorio.choice(nomes_unidades), aleatorio.randint(10, 60))
+    analisador = AnalisadorDados(sistema, sink=SinkSilencioso(), rede=rede)
+    return {
+        "sistema": sistema,
+        "analisador": analisador,
+        "rede": rede,
+        "unidades": nomes_unidades,
+        "materiais": nomes_materiais,
+        "aleatorio": aleatorio,
+    }
+
+
+def _operacoes(cenario, estado_inicial, tamanho_lote=1000, consultas=1000):
+    # `estado_inicial`: exportar_estado() do cenário recém-construído, restaurado
+    # (fora do tempo) antes de cada execução das operações que escrevem
+    sistema = cenario["sistema"]
+    analisador = cenario["analisador"]
+    rede = cenario["rede"]
+    unidades, materiais = cenario["unidades"], cenario["materiais"]
+    aleatorio = cenario["aleatorio"]
+
+    def eventos():
+        sistema.data_store.carregar_estado(estado_inicial)
+        return [(aleatorio.choice(unidades), aleatorio.choice(materiais), 1) for _ in range(tamanho_lote)]
+
+    def pares():
+        return [(aleatorio.choice(unidades), aleatorio.choice(materiais)) for _ in range(consultas)]
+
+    def consultar(lista):
+        for unidade, material in lista:
+            sistema.data_store.get_estoque(unidade, material)
+
+    def rotas(lista):
+        for origem, destino in lista:
+            rede.caminho_mais_curto(origem, destino)
+
+    def pares_rede(com_tabela):
+        def preparar():
+            # sem tabela em cache, cada consulta executa o Dijkstra com parada antecipada
+            rede.limpar_cache()
+            if com_tabela:
+                rede.tabela_caminhos()
+            return [tuple(aleatorio.sample(unidades, 2)) for _ in range(100)]
+        return preparar
+
+    def tabela():
+        rede.limpar_cache()  # força o recálculo da tabela de todos os pares
+        rede.tabela_caminhos()
+
+    return {
+        "ingestao_lote": (sistema.registrar_consumo_lote, eventos),
+        "ingestao_unitaria": (lambda lista: [sistema.registrar_consumo(*e) for e in lista], eventos),
+        "consulta_estoque": (consultar, pares),
+        "varredura_alertas": (sistema.verificar_alertas, None),
+        "prioridades_reposicao": (lambda: sistema.prioridades_reposicao(10), None),
+        "analise_padroes": (analisador.analisar_padroes_consumo, None),
+        "analise_padroes_paralela": (lambda: analisador.analisar_padroes_consumo(paralelo=True), None),
+        "previsao": (analisador.prever_necessidades_futuras, None),
+        "previsao_paralela": (lambda: analisador.prever_necessidades_futuras(paralelo=True), None),
+        "janela_7_dias": (lambda: sistema.data_store.agregar_janela(7), None),
+        "otimizacao_distribuicao": (analisador.otimizar_distribuicao_entre_unidades, None),
+        "rotas_ponto_a_ponto": (rotas, pares_rede(com_tabela=False)),
+        "rotas_em_cache": (rotas, pares_rede(com_tabela=True)),
+        "tabela_caminhos": (tabela, None),
+    }
+
+
+def executar_cenario(unidades, materiais, historico, repeticoes=5, aquecimento=1):
+    """mede memória de construção e cada operação em um cenário; retorna a lista de resultados."""
+    parametros = {"unidades": unidades, "materiais": materiais, "historico": historico}
+    cenario, memoria = medir_memoria(lambda: construir_cenario(unidades, materiais, historico))
+    resultados = [{"cenario": parametros, "operacao": "memoria_cenario", **memoria}]
+    # cada execução e cada operação mede o mesmo cenário: as operações que
+    # escrevem partem do estado de construção e o restauram ao terminar
+    data_store = cenario["sistema"].data_store
+    estado_inicial = data_store.instantaneo().exportar_estado()
+    # as operações paralelas abrem um pool de processos: encerrado ao fim do cenário
+    with cenario["analisador"]:
+        for nome, (operacao, preparar) in _operacoes(cenario, estado_inicial).items():
+            resultados.append({
+                "cenario": parametros,
+                "operacao": nome,
+                **medir(operacao, preparar, aquecimento=aquecimento, repeticoes=repeticoes),
+            })
+            if nome in OPERACOES_ESCRITA:
+                data_store.carregar_estado(estado_inicial)
+    return resultados
+
+
+def executar_suite(varreduras=None, base=None, repeticoes=5, aquecimento=1):
+    """
+    roda o cenário base e, para cada dimensão em `varreduras`, os cenários que
+    variam só aquela dimensão. Retorna o documento JSON com metadados e resultados.
+    """
+    base = dict(base or CENARIO_BASE)
+    varreduras = VARREDURAS if varreduras is None else varreduras
+    cenarios = [base]
+    for dimensao, valores in varreduras.items():
+        for valor in valores:
+            cenario = {**base, dimensao: valor}
+            if cenario not in cenarios:
+                cenarios.append(cenario)
+
+    resultados = []
+    for cenario in cenarios:
+        resultados.extend(executar_cenario(repeticoes=repeticoes, aquecimento=aquecimento, **cenario))
+    return {
+        "meta": {
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+        },
+        "resultados": resultados,
+    }
+
+
+def estresse_concorrente(threads=8, operacoes_por_thread=2000, unidades=8, materiais=4, semente=7, data_store=None):
+    """
+    dispara consumos, reabastecimentos, ajustes atômicos e transferências de
+    várias threads sobre as mesmas unidades e confere as invariantes: o estoque
+    total é conservado (inicial + entradas - saídas) e cada consumo gera
+    exatamente um registro de histórico. `data_store` escolhe o backend (StockData
+    em memória, por padrão). Retorna um dict com o resultado.
+    """
+    sistema = SistemaGestaoEstoque(data_store, sink=SinkSilencioso())
+    analisador = AnalisadorDados(sistema, sink=SinkSilencioso())
+    nomes_unidades = [f"UN{i + 1}" for i in range(unidades)]
+    nomes_materiais = [f"Material{i + 1}" for i in range(materiais)]
+    inicial = 1_000_000  # grande o bastante para nenhum consumo ser truncado em zero
+    for unidade in nomes_unidades:
+        for material in nomes_materiais:
+            sistema.reabastecer(unidade, material, inicial)
+
+    entradas = [0] * threads
+    saidas = [0] * threads
+    consumos = [0] * threads
+    barreira = threading.Barrier(threads)
+
+    def trabalhador(indice):
+        aleatorio = random.Random(semente + indice)
+        barreira.wait()
+        for _ in range(operacoes_por_thread):
+            unidade = aleatorio.choice(nomes_unidades)
+            material = aleatorio.choice(nomes_materiais)
+            quantidade = aleatorio.randint(1, 5)
+            sorteio = aleatorio.random()
+            if sorteio < 0.35:
+                sistema.registrar_consumo(unidade, material, quantidade)
+                saidas[indice] += quantidade
+                consumos[indice] += 1
+            elif sorteio < 0.55:
+                sistema.reabastecer(unidade, material, quantidade)
+                entradas[indice] += quantidade
+            elif sorteio < 0.70:
+                if sistema.ajustar_estoque(unidade, material, -quantidade) is not None:
+                    saidas[indice] += quantidade
+            else:
+                destino = aleatorio.choice(nomes_unidades)
+                analisador.transferir_entre_unidades(unidade, destino, material, quantidade)
+
+    inicio = time.perf_counter()
+    trabalhadores = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    try:
+        for t in trabalhadores:
+            t.start()
+        for t in trabalhadores:
+            t.join()
+    finally:
+        analisador.fechar()
+    duracao = time.perf_counter() - inicio
+
+    esperado = inicial * unidades * materiais + sum(entradas) - sum(saidas)
+    total = sum(sum(por_material.values()) for por_material in sistema.estoque.values())
+    registros = sum(len(h) for h in sistema.historico_consumo.values())
+    return {
+        "threads": threads,
+        "operacoes": threads * operacoes_por_thread,
+        "duracao_s": duracao,
+        "estoque_total": total,
+        "estoque_esperado": esperado,
+        "registros_historico": registros,
+        "consumos": sum(consumos),
+        "consistente": total == esperado and registros == sum(consumos),
+    }
+
+
+def escalabilidade_threads(contagens=(1, 2, 4, 8), operacoes_por_thread=2000):
+    """
+    vazão (operações/s) de consumos com cada thread em unidades próprias, para
+    cada número de threads. As threads não disputam travas do data store, mas
+    no CPython com GIL a vazão em memória só cresce onde o trabalho libera o
+    interpretador (espera por disco, operações NumPy grandes).
+    """
+    resultados = []
+    for threads in contagens:
+        sistema = SistemaGestaoEstoque(sink=SinkSilencioso())
+        for i in range(threads):
+            sistema.reabastecer(f"UN{i + 1}", "Material1", 10 * operacoes_por_thread)
+        barreira = threading.Barrier(threads)
+
+        def trabalhador(unidade):
+            barreira.wait()
+            for _ in range(operacoes_por_thread):
+                sistema.registrar_consumo(unidade, "Material1", 1)
+
+        trabalhadores = [threading.Thread(target=trabalhador, args=(f"UN{i + 1}",)) for i in range(threads)]
+        inicio = time.perf_counter()
+        for t in trabalhadores:
+            t.start()
+        for t in trabalhadores:
+            t.join()
+        duracao = time.perf_counter() - inicio
+        resultados.append({
+            "threads": threads,
+            "operacoes_por_s": threads * operacoes_por_thread / duracao,
+        })
+    return resultados
+
+
+def escalabilidade_particoes(contagens=(1, 2, 4), eventos=200_000, unidades=200, materiais=50,
+                             tamanho_lote=20_000, semente=3):
+    """
+    vazão de ingestão (eventos/s) de `SistemaGestaoParticionado.aplicar_movimentos_lote`
+    com 1, 2, 4... nós (processos). Cada lote é dividido por nó e aplicado em
+    paralelo; a aceleração é relativa à primeira contagem e a eficiência é a
+    aceleração por nó (1.0 = linear). Só escala até o número de núcleos livres.
+    """
+    aleatorio = random.Random(semente)
+    operacoes = ("consumo", "reabastecimento", "reabastecimento")
+    movimentos = [
+        (aleatorio.choice(operacoes), f"UN{aleatorio.randrange(unidades)}",
+         f"Material{aleatorio.randrange(materiais)}", aleatorio.randint(1, 20))
+        for _ in range(eventos)
+    ]
+    lotes = [movimentos[i:i + tamanho_lote] for i in range(0, eventos, tamanho_lote)]
+
+    resultados = []
+    for nos in contagens:
+        with StockDataParticionado(num_nos=nos) as store:
+            sistema = SistemaGestaoParticionado(store, sink=SinkSilencioso())
+            sistema.aplicar_movimentos_lote(lotes[0][:100])  # aquece os processos dos nós
+            inicio = time.perf_counter()
+            for lote in lotes:
+                sistema.aplicar_movimentos_lote(lote)
+            duracao = time.perf_counter() - inicio
+        vazao = eventos / duracao
+        aceleracao = vazao / resultados[0]["eventos_por_s"] if resultados else 1.0
+        resultados.append({
+            "nos": nos,
+            "eventos_por_s": vazao,
+            "aceleracao": aceleracao,
+            "eficiencia": aceleracao * contagens[0] / nos,
+        })
+    return resultados
+
+
+def _chave(resultado):
+    cenario = resultado["cenario"]
+    return (cenario["unidades"], cenario["materiais"], cenario["historico"], resultado["operacao"])
+
+
+def comparar(atual, baseline, tolerancia=0.2):
+    """
+    compara dois documentos da suíte; retorna as regressões, isto é, as medidas
+    (mediana de tempo ou memória retida) mais de `tolerancia` acima da baseline.
+    """
+    anteriores = {_chave(r): r for r in baseline["resultados"]}
+    regressoes = []
+    for resultado in atual["resultados"]:
+        anterior = anteriores.get(_chave(resultado))
+        if anterior is None:
+            continue
+        metrica = "retida_bytes" if "retida_bytes" in resultado else "mediana_s"
+        if anterior[metrica] > 0 and resultado[metrica] > anterior[metrica] * (1 + tolerancia):
+            regressoes.append({
+                "cenario": resultado["cenario"],
+                "operacao": resultado["operacao"],
+                "metrica": metrica,
+                "baseline": anterior[metrica],
+                "atual": resultado[metrica],
+                "razao": resultado[metrica] / anterior[metrica],
+            })
+    return regressoes
+
+
+def formatar(resultados):
+    """tabela de texto com uma linha por medida."""
+    linhas = []
+    for r in resultados:
+        c = r["cenario"]
+        rotulo = f"{c['unidades']}u/{c['materiais']}m/{c['historico']}h"
+        if "retida_bytes" in r:
+            valor = f"{r['retida_bytes'] / 2**20:9.2f} MB retidos (pico {r['pico_bytes'] / 2**20:.2f} MB)"
+        else:
+            valor = f"{r['mediana_s'] * 1000:9.3f} ms (mín {r['minimo_s'] * 1000:.3f}, ±{r['desvio_s'] * 1000:.3f})"
+        linhas.append(f"  {rotulo:>20}  {r['operacao']:<24}{valor}")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="suíte de benchmarks do sistema de gestão de estoque")
+    parser.add_argument("--saida", help="grava os resultados em JSON neste arquivo")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora relativa aceita (padrão 0.2)")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--rapido", action="store_true", help="só o cenário base, sem varreduras")
+    parser.add_argument("--estresse", action="store_true",
+                        help="só o teste de concorrência (invariantes + vazão por número de threads)")
+    parser.add_argument("--particoes", type=int, nargs="*", metavar="NOS",
+                        help="só a escalabilidade de ingestão do store particionado (padrão: 1 2 4 nós)")
+    args = parser.parse_args(argv)
+
+    if args.particoes is not None:
+        print(f"  {os.cpu_count()} núcleos disponíveis")
+        for r in escalabilidade_particoes(tuple(args.particoes) or (1, 2, 4)):
+            print(f"  {r['nos']} nós: {r['eventos_por_s']:.0f} eventos/s "
+                  f"(aceleração {r['aceleracao']:.2f}x, eficiência {r['eficiencia']:.0%})")
+        return 0
+
+    if args.estresse:
+        with tempfile.TemporaryDirectory() as diretorio:
+            sqlite = SQLiteStockData(os.path.join(diretorio, "estresse.db"))
+            try:
+                resultados = [("memória", estresse_concorrente()),
+                              ("sqlite", estresse_concorrente(operacoes_por_thread=500, data_store=sqlite))]
+            finally:
+                sqlite.fechar()
+        for backend, resultado in resultados:
+            print(f"  [{backend}] {resultado['operacoes']} operações em {resultado['threads']} threads: "
+                  f"{'consistente' if resultado['consistente'] else 'INCONSISTENTE'} "
+                  f"(estoque {resultado['estoque_total']}/{resultado['estoque_esperado']}, "
+                  f"histórico {resultado['registros_historico']}/{resultado['consumos']})")
+        for r in escalabilidade_threads():
+            print(f"  {r['threads']} threads: {r['operacoes_por_s']:.0f} operações/s")
+        return 0 if all(resultado["consistente"] for _, resultado in resultados) else 1
+
+    documento = executar_suite(varreduras={} if args.rapido else None, repeticoes=args.repeticoes)
+    print(formatar(documento["resultados"]))
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(documento, arquivo, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            regressoes = comparar(documento, json.load(arquivo), args.tolerancia)
+        for r in regressoes:
+            print(f"REGRESSÃO: {r['operacao']} {r['cenario']} {r['metrica']} {r['razao']:.2f}x")
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,8 @@ from business_logic.stock_management import SistemaGestaoEstoque
 from business_logic.data_analysis import AnalisadorDados
 from algorithms.data_structures import ArvoreAVL, MinHeap, Grafo
 from algorithms.sorting_and_searching import SortingAndSearching
-import random
-import time
-import sys
+from interface.renderizacao import SinkConsole
+from interface import benchmark
 
 class DemonstracaoSistema:
     """
@@ -12,8 +11,12 @@ class DemonstracaoSistema:
     incluindo gestão de estoque, estruturas de dados e algoritmos.
     """
     def __init__(self):
-        self.sistema = SistemaGestaoEstoque()
-        self.analisador = AnalisadorDados(self.sistema)
+        self.sistema = SistemaGestaoEstoque(sink=SinkConsole())
+        self.rede = Grafo()
+        for origem, destino, dist in [("UN1", "UN2", 10), ("UN2", "UN3", 12), ("UN3", "UN4", 8),
+                                      ("UN4", "UN5", 15), ("UN1", "UN5", 20), ("UN1", "UN3", 18)]:
+            self.rede.adicionar_aresta(origem, destino, dist)
+        self.analisador = AnalisadorDados(self.sistema, rede=self.rede)
         self.sorting_and_searching = SortingAndSearching()  
 
     def demonstrar_sistema(self):
@@ -49,6 +52,7 @@ class DemonstracaoSistema:
         self.sistema.reabastecer("UN2", "Reagente A", 100)
         self.sistema.registrar_consumo("UN1", "Reagente A", 200)
         self.sistema.registrar_consumo("UN2", "Reagente A", 50)
+        self.sistema.definir_limite_minimo("UN2", "Reagente A", 120)
 
         transferencias = self.analisador.otimizar_distribuicao_entre_unidades()
         if transferencias:
@@ -86,7 +90,8 @@ class DemonstracaoSistema:
             print(f"  ✓ Encontrado: {resultado.chave} com {resultado.valor} unidades")
         
         print("\nTravessia em-ordem (ordem alfabética):")
-        arvore.travessia_em_ordem(arvore.raiz)
+        for nome, qtd in arvore.travessia_em_ordem():
+            print(f"  - {nome}: {qtd}")
         
         print("\n\n2. MIN-HEAP - Fila de Prioridade para Reposição")
         print("-" * 40)
@@ -134,9 +139,10 @@ class DemonstracaoSistema:
             print(f"  - {origem} ↔ {destino}: {dist} km")
         
         print("\nCaminho mais curto de 'Norte' para 'Sul':")
-        distancias = grafo.dijkstra("Norte")
-        if "Sul" in distancias:
-            print(f"  → Distância mínima: {distancias['Sul']} km")
+        resultado = grafo.caminho_mais_curto("Norte", "Sul")
+        if resultado is not None:
+            distancia, caminho = resultado
+            print(f"  → Distância mínima: {distancia} km ({' → '.join(caminho)})")
         
         print("\nBusca em largura a partir de 'Central':")
         visitados = grafo.bfs("Central")
@@ -186,7 +192,7 @@ class DemonstracaoSistema:
             ("Busca Linear", "O(n)", "Percorre todos elementos"),
             ("Busca Binária", "O(log n)", "Divide o espaço de busca pela metade"),
             ("Quick Sort (médio)", "O(n log n)", "Divide e conquista eficiente"),
-            ("Quick Sort (pior)", "O(n²)", "Quando o pivot é sempre o menor/maior"),
+            ("Quick Sort (pior)", "O(n log n)", "Introsort: passa a heapsort em recursão profunda"),
             ("Merge Sort", "O(n log n)", "Sempre divide ao meio"),
             ("Inserção AVL", "O(log n)", "Árvore sempre balanceada"),
             ("Dijkstra", "O((V + E) log V)", "Com heap binário")
@@ -198,49 +204,21 @@ class DemonstracaoSistema:
             print(f"    → {desc}")
     
     def _demonstrar_memoizacao(self):
-        """Demonstra otimização com memoização"""
+        """Demonstra o lote de custo mínimo com descontos por volume e o cache por parâmetros de preço"""
         print("Problema: Calcular quantidade ótima de pedido considerando descontos")
-        print("por volume e minimizando custo total (compra + armazenamento)")
-        
-        memo = {}
-        
-        def calcular_custo_otimo(quantidade, preco_unitario=10, custo_armazenagem=0.5):
-            """Calcula custo ótimo com memoização"""
-            if quantidade in memo:
-                return memo[quantidade]
-            
-            if quantidade >= 1000:
-                desconto = 0.15
-            elif quantidade >= 500:
-                desconto = 0.10
-            elif quantidade >= 100:
-                desconto = 0.05
-            else:
-                desconto = 0
-            
-            custo_compra = quantidade * preco_unitario * (1 - desconto)
-            custo_estoque = quantidade * custo_armazenagem * 30  
-            custo_total = custo_compra + custo_estoque
-            
-            memo[quantidade] = custo_total
-            return custo_total
-        
-        quantidades = [50, 100, 250, 500, 750, 1000, 1500]
-        print("\nAnálise de custos por quantidade:")
-        
-        melhor_qtd = None
-        melhor_custo = float('inf')
-        
-        for qtd in quantidades:
-            custo = calcular_custo_otimo(qtd)
-            print(f"  Quantidade: {qtd:4d} | Custo Total: R$ {custo:,.2f}")
-            
-            if custo < melhor_custo:
-                melhor_custo = custo
-                melhor_qtd = qtd
-        
-        print(f"\n✓ Quantidade ótima: {melhor_qtd} unidades")
-        print(f"✓ Custo mínimo: R$ {melhor_custo:,.2f}")
+        print("por volume e minimizando custo total (compra + pedidos + armazenamento)")
+
+        otimizador = self.analisador.otimizador_pedidos
+        faixas = [(100, 0.05), (500, 0.10), (1000, 0.15)]
+        for material, preco in [("Luvas", 10.0), ("Máscaras", 4.0), ("Reagente A", 35.0)]:
+            otimizador.definir_parametros(material, preco, custo_armazenagem=0.5 / 30, faixas=faixas)
+        self.analisador.planejar_pedidos()
+
+        print("\nReajuste de preço do Reagente A (só esse material é recalculado):")
+        otimizador.definir_parametros("Reagente A", 42.0, custo_armazenagem=0.5 / 30, faixas=faixas)
+        self.analisador.planejar_pedidos()
+        cache = otimizador.info_cache()
+        print(f"\n✓ Cache LRU: {cache['acertos']} acertos, {cache['falhas']} cálculos")
 
     def executar_demonstracao_completa(self):
         """Executa demonstração completa do sistema"""
@@ -261,57 +239,19 @@ class DemonstracaoSistema:
         print("="*80)
     
     def _gerar_relatorio_performance(self):
-        """Gera relatório de performance do sistema"""
+        """Gera relatório de performance do sistema (cenário reduzido da suíte de benchmarks)"""
         print("\n" + "="*60)
         print("RELATÓRIO DE PERFORMANCE")
         print("="*60)
-        
-        
-        print("\nTempo de execução para operações principais:")
-        
-        start = time.time()
-        for i in range(1000):
-            self.sistema.registrar_consumo(
-                f"UN{i%5+1}", 
-                f"Material{i%20+1}", 
-                random.randint(1, 10)
-            )
-        tempo_insercao = time.time() - start
-        print(f"  • Inserção de 1000 registros: {tempo_insercao:.3f}s")
-        
-        
-        start = time.time()
-        for _ in range(100):
-            materiais = list(self.sistema.estoque["UN1"].keys()) 
-            if materiais:
-                self.sistema.consultar_estoque("UN1", random.choice(materiais))
-        tempo_busca = time.time() - start
-        print(f"  • 100 consultas de estoque: {tempo_busca:.3f}s")
-        
-        start = time.time()
-        self.analisador.analisar_padroes_consumo()
-        tempo_analise = time.time() - start
-        print(f"  • Análise de padrões: {tempo_analise:.3f}s")
-        
-        start = time.time()
-        self.analisador.otimizar_distribuicao_entre_unidades()
-        tempo_otimizacao = time.time() - start
-        print(f"  • Otimização de distribuição: {tempo_otimizacao:.3f}s")
-        
+
+        print("\nTempo de execução para operações principais (mediana de 3 execuções, sink silencioso):")
+        resultados = benchmark.executar_cenario(unidades=10, materiais=50, historico=5000, repeticoes=3)
+        print(benchmark.formatar(resultados))
+        print("\n  Suíte completa com varreduras e comparação com baseline: python -m interface.benchmark --help")
+
         print("\nEstatísticas do sistema:")
         total_registros = sum(len(h) for h in self.sistema.historico_consumo.values()) 
         total_materiais = sum(len(e) for e in self.sistema.estoque.values()) 
         
         print(f"  • Total de registros de consumo: {total_registros}")
         print(f"  • Total de materiais em estoque: {total_materiais}")
-        print(f"  • Memória aproximada utilizada: {self._calcular_memoria_utilizada()} MB")
-    
-    def _calcular_memoria_utilizada(self):
-        """Calcula memória aproximada utilizada pelo sistema"""
-        
-        total_size = 0
-        total_size += sys.getsizeof(self.sistema.estoque)
-        total_size += sys.getsizeof(self.sistema.historico_consumo)
-        total_size += sys.getsizeof(self.sistema.alertas)
-        
-        return round(total_size / (1024 * 1024), 2) 
\ No newline at end of file
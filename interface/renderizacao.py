@@ -0,0 +1,106 @@
+class SinkConsole:
+    """
+    renderiza no terminal os eventos emitidos por SistemaGestaoEstoque e
+    AnalisadorDados, com as mensagens da demonstração.
+    """
+    def emitir(self, tipo, **dados):
+        renderizar = getattr(self, f"_render_{tipo}", None)
+        if renderizar is not None:
+            renderizar(**dados)
+
+    # --- gestão de estoque ---
+
+    def _render_erro(self, mensagem):
+        print(f"Erro: {mensagem}")
+
+    def _render_consumo_excede_estoque(self, unidade, material, quantidade, estoque_disponivel):
+        print(f"Alerta: Consumo de {quantidade} unidades de {material} na {unidade} excede o estoque disponível ({estoque_disponivel}).")
+
+    def _render_consumo_registrado(self, unidade, material, quantidade, estoque_atual):
+        print(f"Consumo registrado: {quantidade} unidades de {material} na {unidade}. Estoque atual: {estoque_atual}.")
+
+    def _render_reabastecimento_registrado(self, unidade, material, quantidade, estoque_atual):
+        print(f"reabastecimento registrado: {quantidade} unidades de {material} na {unidade}. Estoque atual: {estoque_atual}.")
+
+    def _render_lote_aplicado(self, operacao, aplicados, rejeitados, itens_atualizados):
+        nome = {"consumo": "Consumo", "reabastecimento": "Reabastecimento"}.get(operacao, "Movimentação")
+        print(f"{nome} em lote: {aplicados} eventos aplicados, {rejeitados} rejeitados, {itens_atualizados} itens atualizados.")
+
+    def _render_estoque_consultado(self, unidade, material, quantidade):
+        if quantidade is not None:
+            print(f"estoque de {material} na {unidade}: {quantidade} unidades.")
+        else:
+            print(f"Material '{material}' não encontrado na unidade '{unidade}'.")
+
+    def _render_estoque_unidade_consultado(self, unidade, estoque):
+        if estoque:
+            print(f"Estoque da unidade {unidade}:")
+            for mat, qtd in estoque.items():
+                print(f"  - {mat}: {qtd} unidades")
+        else:
+            print(f"Unidade '{unidade}' sem materiais registrados ou não encontrada.")
+
+    def _render_limite_definido(self, unidade, material, limite):
+        print(f"Limite mínimo de {limite} para {material} na {unidade} definido.")
+
+    def _render_alerta_minimo(self, unidade, material, estoque_atual, limite_minimo):
+        print(f"*** ALERTA: {material} na {unidade} está abaixo do limite mínimo ({estoque_atual}/{limite_minimo}) ***")
+
+    def _render_alertas_verificados(self, alertas):
+        if alertas:
+            print("\nALERTA: Materiais abaixo do limite mínimo!")
+            for alerta in alertas:
+                print(f"""  - Unidade: {alerta['unidade']}, Material: {alerta['material']},
+                   Estoque: {alerta['estoque_atual']}, Limite: {alerta['limite_minimo']}""")
+        else:
+            print("\nSem alertas de estoque no momento.")
+
+    # --- análise de dados ---
+
+    def _render_padroes_consumo(self, padroes):
+        print("\nAnálise de Padrões de Consumo:")
+        if not padroes:
+            print("  Não há dados de consumo para analisar.")
+        for material, dados in padroes.items():
+            avg_consumo = dados["total_consumido"] / dados["num_consumos"]
+            print(f"  - Material: {material} | Consumo Médio: {avg_consumo:.2f} unidades/registro")
+
+    def _render_previsoes(self, previsoes):
+        print("\nPrevisão de Necessidades Futuras:")
+        if not previsoes:
+            print("  não é possível prever necessidades sem dados de consumo.")
+        for material, previsao in previsoes.items():
+            print(f"  - Material: {material} | Previsão Próximo Período: {previsao:.2f} unidades")
+
+    def _render_pedidos_planejados(self, pedidos):
+        print("\nPlanejamento de Pedidos (lote de custo mínimo):")
+        if not pedidos:
+            print("  nenhum material com preço e consumo para planejar.")
+        for unidade, materiais in pedidos.items():
+            for material, p in materiais.items():
+                print(f"  - {unidade} | {material}: pedir {p['quantidade_pedido']} a R$ {p['preco_unitario']:,.2f} "
+                      f"ao atingir {p['ponto_reposicao']:.1f} unidades (custo R$ {p['custo_diario']:,.2f}/dia)")
+
+    def _render_distribuicao_otimizada(self, transferencias, motivo=None):
+        print("\nOtimização de Distribuição entre Unidades:")
+        if motivo:
+            print(f"  {motivo}")
+        for t in transferencias:
+            distancia = f" ({t['distancia']} km)" if "distancia" in t else ""
+            print(f"  →  transferência de {t['quantidade']} de {t['material']} de {t['origem']} para {t['destino']}{distancia}")
+        if not transferencias and not motivo:
+            print("  nenhuma otimização de distribuição sugerida no momento.")
+
+    # --- importação e exportação de arquivos ---
+
+    def _render_progresso_arquivo(self, operacao, arquivo, linhas, aplicados, linhas_por_s):
+        print(f"  {operacao} {arquivo}: {linhas} linhas lidas, {aplicados} aplicadas ({linhas_por_s:,.0f} linhas/s)")
+
+    def _render_arquivo_processado(self, operacao, arquivo, linhas, aplicados, rejeitados, linhas_por_s):
+        print(f"{operacao} {arquivo}: {linhas} linhas, {aplicados} aplicadas, {rejeitados} rejeitadas ({linhas_por_s:,.0f} linhas/s).")
+
+    def _render_transferencia_realizada(self, origem, destino, material, quantidade):
+        print(f"transferência de {quantidade} de {material} de {origem} para {destino} realizada com sucesso.")
+
+    def _render_erro_transferencia(self, mensagem):
+        print(f"Erro: {mensagem}")
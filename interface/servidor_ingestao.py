@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from collections import deque
+
+from business_logic.stock_management import SistemaGestaoEstoque
+
+OPERACOES_ESCRITA = ("consumo", "reabastecimento")
+
+
+class ServidorIngestao:
+    """
+    servidor TCP local (uma mensagem JSON por linha) para eventos de estoque.
+    Mensagens: {"op": "consumo" | "reabastecimento", "unidade", "material",
+    "quantidade"}, {"op": "consulta", "unidade", "material"} e
+    {"op": "estatisticas"}. Cada mensagem recebe uma resposta JSON, na ordem de
+    envio, o que permite pipeline no cliente.
+
+    As mensagens de todas as conexões entram numa fila limitada e são
+    agrupadas em micro-lotes (até `tamanho_lote` mensagens ou `espera_lote`
+    segundos) e todas as escritas de um lote viram uma única chamada
+    `aplicar_movimentos_lote`. Com a fila cheia, ou com `max_pendentes`
+    respostas de uma conexão ainda não entregues (cliente que não lê), o
+    servidor para de ler o socket, e o controle de fluxo do TCP segura o
+    cliente. Uma linha maior que o limite do leitor recebe uma resposta de
+    erro e encerra a conexão.
+    """
+    def __init__(self, sistema=None, host="127.0.0.1", porta=8765, capacidade_fila=10000,
+                 tamanho_lote=1000, espera_lote=0.002, historico_lotes=1000, max_pendentes=1024):
+        self.sistema = sistema if sistema is not None else SistemaGestaoEstoque()
+        self.host = host
+        self.porta = porta
+        self.capacidade_fila = capacidade_fila
+        self.max_pendentes = max_pendentes
+        self.tamanho_lote = tamanho_lote
+        self.espera_lote = espera_lote
+        self.lotes = deque(maxlen=historico_lotes)  # métricas dos últimos lotes
+        self.total_mensagens = 0
+        self.total_lotes = 0
+        self._fila = None
+        self._servidor = None
+        self._agrupador = None
+        self._conexoes = set()
+
+    async def iniciar(self):
+        """abre o socket e inicia o agrupador de lotes; retorna a porta efetiva."""
+        self._fila = asyncio.Queue(maxsize=self.capacidade_fila)
+        self._agrupador = asyncio.create_task(self._agrupar())
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.porta)
+        self.porta = self._servidor.sockets[0].getsockname()[1]
+        return self.porta
+
+    async def servir_para_sempre(self):
+        await self.iniciar()
+        async with self._servidor:
+            await self._servidor.serve_forever()
+
+    async def encerrar(self):
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        for tarefa in list(self._conexoes):
+            tarefa.cancel()
+        await asyncio.gather(*self._conexoes, return_exceptions=True)
+        if self._agrupador is not None:
+            self._agrupador.cancel()
+            try:
+                await self._agrupador
+            except asyncio.CancelledError:
+                pass
+
+    # --- conexões ---
+
+    async def _atender(self, leitor, escritor):
+        loop = asyncio.get_running_loop()
+        tarefa = asyncio.current_task()
+        self._conexoes.add(tarefa)
+        # futuros das respostas, na ordem das mensagens (None marca o fim da conexão);
+        # cada mensagem lida ocupa uma vaga até a sua resposta ser escrita
+        pendentes = deque()
+        chegou = asyncio.Event()
+        vagas = asyncio.Semaphore(self.max_pendentes)
+        tarefa_escrita = asyncio.create_task(self._escrever_respostas(pendentes, chegou, vagas, escritor))
+        try:
+            while True:
+                await vagas.acquire()
+                try:
+                    linha = await leitor.readline()
+                except (asyncio.LimitOverrunError, ValueError) as erro:
+                    # linha acima do limite do leitor: responde e encerra, já que o resto
+                    # da linha não pode ser separado da mensagem seguinte com segurança
+                    futuro = loop.create_future()
+                    futuro.set_result({"ok": False, "erro": f"mensagem inválida: {erro}"})
+                    pendentes.append(futuro)
+                    break
+                if not linha:
+                    break
+                futuro = loop.create_future()
+                pendentes.append(futuro)
+                chegou.set()
+                try:
+                    mensagem = json.loads(linha)
+                    if not isinstance(mensagem, dict):
+                        raise ValueError("a mensagem deve ser um objeto JSON")
+                except ValueError as erro:
+                    futuro.set_result({"ok": False, "erro": f"mensagem inválida: {erro}"})
+                    continue
+                if mensagem.get("op") == "estatisticas":
+                    futuro.set_result({"ok": True, "estatisticas": self.estatisticas()})
+                    continue
+                # bloqueia a leitura desta conexão enquanto a fila estiver cheia
+                await self._fila.put((mensagem, futuro, time.perf_counter()))
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # encerramento do servidor: descarta as respostas pendentes
+            tarefa_escrita.cancel()
+            escritor.close()
+            return
+        finally:
+            # qualquer que seja a saída, o escritor precisa do marcador de fim
+            self._conexoes.discard(tarefa)
+            pendentes.append(None)
+            chegou.set()
+        await tarefa_escrita
+
+    @staticmethod
+    async def _escrever_respostas(pendentes, chegou, vagas, escritor):
+        conectado = True
+        try:
+            while True:
+                while not pendentes:
+                    chegou.clear()
+                    await chegou.wait()
+                futuro = pendentes.popleft()
+                if futuro is None:
+                    break
+                # junta numa única escrita as respostas seguintes que já estão prontas
+                linhas = [json.dumps(await futuro, ensure_ascii=False)]
+                fim = False
+                while pendentes:
+                    proximo = pendentes[0]
+                    if proximo is not None and not proximo.done():
+                        break
+                    pendentes.popleft()
+                    if proximo is None:
+                        fim = True
+                        break
+                    linhas.append(json.dumps(proximo.result(), ensure_ascii=False))
+                if conectado:
+                    try:
+                        escritor.write(("\n".join(linhas) + "\n").encode())
+                        await escritor.drain()
+                    except ConnectionError:
+                        # cliente desconectou: as respostas seguintes são descartadas, mas as
+                        # vagas continuam sendo liberadas até a leitura ver o fim da conexão
+                        conectado = False
+                        escritor.close()
+                for _ in linhas:
+                    vagas.release()
+                if fim:
+                    break
+        finally:
+            escritor.close()
+
+    # --- micro-lotes ---
+
+    async def _agrupar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._fila.get()]
+            limite = loop.time() + self.espera_lote
+            while len(lote) < self.tamanho_lote:
+                if self._fila.empty():
+                    restante = limite - loop.time()
+                    if restante <= 0:
+                        break
+                    try:
+                        lote.append(await asyncio.wait_for(self._fila.get(), restante))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    lote.append(self._fila.get_nowait())
+
+            inicio = time.perf_counter()
+            # o store é síncrono: aplica em outra thread para não travar o loop de I/O
+            try:
+                respostas = await loop.run_in_executor(None, self._aplicar, [item[0] for item in lote])
+            except Exception as erro:  # um lote com falha não pode derrubar o agrupador
+                respostas = [{"ok": False, "erro": f"falha ao aplicar o lote: {erro}"}] * len(lote)
+            fim = time.perf_counter()
+            for (_, futuro, _), resposta in zip(lote, respostas):
+                if not futuro.done():
+                    futuro.set_result(resposta)
+            self._registrar_lote(len(lote), min(item[2] for item in lote), inicio, fim)
+
+    def _registrar_lote(self, tamanho, enfileirado, inicio, fim):
+        self.total_mensagens += tamanho
+        self.total_lotes += 1
+        self.lotes.append({
+            "tamanho": tamanho,
+            "espera_ms": (inicio - enfileirado) * 1000,
+            "aplicacao_ms": (fim - inicio) * 1000,
+            "latencia_ms": (fim - enfileirado) * 1000,
+        })
+
+    def _aplicar(self, mensagens):
+        """
+        aplica um micro-lote e retorna uma resposta por mensagem. Todas as escritas
+        vão numa única chamada `aplicar_movimentos_lote`; cada consulta é respondida
+        com o estoque que teria na sua posição do lote (vê as escritas anteriores
+        a ela e não as posteriores), simulado sob as mesmas travas.
+        """
+        respostas = [None] * len(mensagens)
+        escritas = []
+        consultas = []
+        for i, mensagem in enumerate(mensagens):
+            op = mensagem.get("op")
+            if op not in OPERACOES_ESCRITA and op != "consulta":
+                respostas[i] = {"ok": False, "erro": f"operação desconhecida: {op}"}
+            elif not all(
+                isinstance(mensagem.get(campo), (str, int)) and not isinstance(mensagem.get(campo), bool)
+                for campo in ("unidade", "material")
+            ):
+                respostas[i] = {"ok": False, "erro": "unidade e material são obrigatórios"}
+            elif op == "consulta":
+                consultas.append(i)
+            elif isinstance(mensagem.get("quantidade"), bool) or not isinstance(mensagem.get("quantidade"), (int, float)):
+                # True seria aceito como 1 por aplicar_movimentos_lote
+                respostas[i] = {"ok": False, "erro": f"quantidade inválida: {mensagem.get('quantidade')!r}"}
+            else:
+                escritas.append(i)
+
+        unidades = {mensagens[i].get("unidade") for i in escritas + consultas}
+        with self.sistema.travar_unidades(*unidades):
+            estoques = self._simular(mensagens, sorted(escritas + consultas))
+            for i in consultas:
+                respostas[i] = {"ok": True, "estoque": estoques[i]}
+            if escritas:
+                self._aplicar_escritas(mensagens, escritas, estoques, respostas)
+        return respostas
+
+    def _simular(self, mensagens, indices):
+        # estoque de cada mensagem na sua posição do lote: antes da consulta,
+        # depois da escrita (mesmas regras de aplicar_movimentos_lote)
+        estoques = {}
+        correntes = {}
+        for i in indices:
+            mensagem = mensagens[i]
+            op = mensagem["op"]
+            par = (mensagem.get("unidade"), mensagem.get("material"))
+            if par not in correntes:
+                correntes[par] = self.sistema.data_store.get_estoque(*par)
+            quantidade = mensagem.get("quantidade")
+            if op in OPERACOES_ESCRITA and not isinstance(quantidade, bool) and quantidade > 0:
+                atual = correntes[par] or 0
+                correntes[par] = max(0, atual - quantidade) if op == "consumo" else atual + quantidade
+            estoques[i] = correntes[par]
+        return estoques
+
+    def _aplicar_escritas(self, mensagens, escritas, estoques, respostas):
+        resultado = self.sistema.aplicar_movimentos_lote([mensagens[i] for i in escritas])
+        rejeitados = {r["indice"]: r["motivo"] for r in resultado["rejeitados"]}
+        excedentes = {e["indice"] for e in resultado["excedentes"]}
+        for k, i in enumerate(escritas):
+            if k in rejeitados:
+                respostas[i] = {"ok": False, "erro": rejeitados[k]}
+            else:
+                respostas[i] = {"ok": True, "estoque_atual": estoques[i], "excedeu_estoque": k in excedentes}
+
+    def estatisticas(self):
+        """totais e percentis de latência (ms) dos últimos lotes."""
+        if not self.lotes:
+            return {"mensagens": self.total_mensagens, "lotes": self.total_lotes}
+        latencias = sorted(l["latencia_ms"] for l in self.lotes)
+        return {
+            "mensagens": self.total_mensagens,
+            "lotes": self.total_lotes,
+            "tamanho_medio_lote": statistics.fmean(l["tamanho"] for l in self.lotes),
+            "latencia_p50_ms": latencias[len(latencias) // 2],
+            "latencia_p95_ms": latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))],
+            "aplicacao_media_ms": statistics.fmean(l["aplicacao_ms"] for l in self.lotes),
+            "fila": self._fila.qsize() if self._fila is not None else 0,
+        }
+
+
+async def gerar_carga(host="127.0.0.1", porta=8765, conexoes=4, eventos_por_conexao=5000, janela=256,
+                      unidades=10, materiais=50, proporcao_consulta=0.05, semente=1):
+    """
+    cliente de carga: abre `conexoes` conexões, cada uma enviando eventos em
+    pipeline com no máximo `janela` respostas pendentes, e mede a vazão de
+    ponta a ponta (do primeiro envio à última resposta).
+    """
+    nomes_unidades = [f"UN{i + 1}" for i in range(unidades)]
+    nomes_materiais = [f"Material{i + 1}" for i in range(materiais)]
+
+    async def conexao(indice):
+        aleatorio = random.Random(semente + indice)
+        leitor, escritor = await asyncio.open_connection(host, porta)
+        pendentes = asyncio.Semaphore(janela)
+        erros = 0
+
+        async def ler():
+            nonlocal erros
+            for _ in range(eventos_por_conexao):
+                resposta = json.loads(await leitor.readline())
+                if not resposta.get("ok"):
+                    erros += 1
+                pendentes.release()
+
+        def mensagem():
+            sorteio = aleatorio.random()
+            dados = {"unidade": aleatorio.choice(nomes_unidades), "material": aleatorio.choice(nomes_materiais)}
+            if sorteio < proporcao_consulta:
+                dados["op"] = "consulta"
+            else:
+                dados["op"] = "consumo" if sorteio < 0.7 else "reabastecimento"
+                dados["quantidade"] = aleatorio.randint(1, 10)
+            return json.dumps(dados)
+
+        leitura = asyncio.create_task(ler())
+        enviados = 0
+        while enviados < eventos_por_conexao:
+            # envia de uma vez tudo o que a janela permite
+            await pendentes.acquire()
+            linhas = [mensagem()]
+            while len(linhas) < eventos_por_conexao - enviados and not pendentes.locked():
+                await pendentes.acquire()
+                linhas.append(mensagem())
+            escritor.write(("\n".join(linhas) + "\n").encode())
+            enviados += len(linhas)
+            await escritor.drain()
+        await escritor.drain()
+        await leitura
+        escritor.close()
+        return erros
+
+    inicio = time.perf_counter()
+    erros = await asyncio.gather(*(conexao(i) for i in range(conexoes)))
+    duracao = time.perf_counter() - inicio
+    total = conexoes * eventos_por_conexao
+    return {"eventos": total, "erros": sum(erros), "duracao_s": duracao, "eventos_por_s": total / duracao}
+
+
+async def _demonstrar(args):
+    servidor = ServidorIngestao(porta=0, capacidade_fila=args.capacidade_fila, tamanho_lote=args.tamanho_lote)
+    porta = await servidor.iniciar()
+    try:
+        resultado = await gerar_carga(porta=porta, conexoes=args.conexoes,
+                                      eventos_por_conexao=args.eventos, janela=args.janela)
+    finally:
+        await servidor.encerrar()
+    return resultado, servidor.estatisticas()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="servidor de ingestão de eventos de estoque")
+    parser.add_argument("modo", choices=["servir", "carga", "demo"],
+                        help="servir: só o servidor; carga: só o gerador; demo: os dois no mesmo processo")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--conexoes", type=int, default=4)
+    parser.add_argument("--eventos", type=int, default=5000, help="eventos por conexão")
+    parser.add_argument("--janela", type=int, default=256, help="respostas pendentes por conexão")
+    parser.add_argument("--capacidade-fila", type=int, default=10000)
+    parser.add_argument("--tamanho-lote", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.modo == "servir":
+        servidor = ServidorIngestao(host=args.host, porta=args.porta, capacidade_fila=args.capacidade_fila,
+                                    tamanho_lote=args.tamanho_lote)
+        try:
+            asyncio.run(servidor.servir_para_sempre())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.modo == "carga":
+        resultado = asyncio.run(gerar_carga(args.host, args.porta, args.conexoes, args.eventos, args.janela))
+        estatisticas = None
+    else:
+        resultado, estatisticas = asyncio.run(_demonstrar(args))
+    print(f"{resultado['eventos']} eventos em {resultado['duracao_s']:.2f}s: "
+          f"{resultado['eventos_por_s']:.0f} eventos/s ({resultado['erros']} erros)")
+    if estatisticas:
+        print(f"lotes: {estatisticas['lotes']}, tamanho médio {estatisticas.get('tamanho_medio_lote', 0):.1f}, "
+              f"latência p50 {estatisticas.get('latencia_p50_ms', 0):.2f} ms, "
+              f"p95 {estatisticas.get('latencia_p95_ms', 0):.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
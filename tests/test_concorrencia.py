@@ -0,0 +1,163 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+
+from business_logic.eventos import SinkSilencioso
+from business_logic.stock_management import SistemaGestaoEstoque
+from data_layer.sqlite_storage import SQLiteStockData
+from data_layer.storage import StockData
+
+UNIDADES = [f"UN{i + 1}" for i in range(6)]
+MATERIAIS = [f"Material{i + 1}" for i in range(3)]
+INICIAL = 1_000_000  # nenhum consumo chega a ser truncado em zero
+
+
+def executar_concorrente(sistema, threads=8, operacoes_por_thread=600, semente=11):
+    """
+    dispara consumos, reabastecimentos, ajustes, transferências e lotes de
+    várias threads; cada thread anota o efeito de cada operação aceita.
+    Retorna (variações por (unidade, material), consumos por (unidade, material)).
+    """
+    for unidade in UNIDADES:
+        for material in MATERIAIS:
+            sistema.reabastecer(unidade, material, INICIAL)
+    anotacoes = [([], []) for _ in range(threads)]  # (variações, consumos) de cada thread
+    barreira = threading.Barrier(threads)
+    erros = []
+
+    def trabalhador(indice):
+        aleatorio = random.Random(semente + indice)
+        variacoes, consumos = anotacoes[indice]
+        barreira.wait()
+        try:
+            for _ in range(operacoes_por_thread):
+                unidade, material = aleatorio.choice(UNIDADES), aleatorio.choice(MATERIAIS)
+                quantidade = aleatorio.randint(1, 5)
+                sorteio = aleatorio.random()
+                if sorteio < 0.3:
+                    sistema.registrar_consumo(unidade, material, quantidade)
+                    variacoes.append((unidade, material, -quantidade))
+                    consumos.append((unidade, material))
+                elif sorteio < 0.5:
+                    sistema.reabastecer(unidade, material, quantidade)
+                    variacoes.append((unidade, material, quantidade))
+                elif sorteio < 0.65:
+                    if sistema.ajustar_estoque(unidade, material, -quantidade) is not None:
+                        variacoes.append((unidade, material, -quantidade))
+                elif sorteio < 0.85:
+                    destino = aleatorio.choice(UNIDADES)
+                    if sistema.transferir(unidade, destino, material, quantidade) is not None:
+                        variacoes.append((unidade, material, -quantidade))
+                        variacoes.append((destino, material, quantidade))
+                else:
+                    lote = [("consumo" if aleatorio.random() < 0.5 else "reabastecimento",
+                             aleatorio.choice(UNIDADES), aleatorio.choice(MATERIAIS), aleatorio.randint(1, 5))
+                            for _ in range(4)]
+                    sistema.aplicar_movimentos_lote(lote)
+                    for operacao, u, m, q in lote:
+                        variacoes.append((u, m, -q if operacao == "consumo" else q))
+                        if operacao == "consumo":
+                            consumos.append((u, m))
+        except Exception as erro:  # a falha aparece no assert da thread principal
+            erros.append(erro)
+
+    trabalhadores = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    for t in trabalhadores:
+        t.join()
+    if erros:
+        raise erros[0]
+
+    esperado = Counter({(u, m): INICIAL for u in UNIDADES for m in MATERIAIS})
+    contagens = Counter()
+    for variacoes, consumos in anotacoes:
+        for unidade, material, delta in variacoes:
+            esperado[(unidade, material)] += delta
+        contagens.update(consumos)
+    return esperado, contagens
+
+
+class TesteConcorrencia(unittest.TestCase):
+    """o estoque final de cada célula é o replay das operações aceitas, em todos os backends."""
+
+    def setUp(self):
+        # trocas de thread frequentes: uma leitura-alteração-escrita sem trava perde atualizações
+        self._intervalo = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self._diretorio = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        sys.setswitchinterval(self._intervalo)
+        self._diretorio.cleanup()
+
+    def conferir(self, data_store, esperado, contagens):
+        for (unidade, material), quantidade in esperado.items():
+            self.assertEqual(data_store.get_estoque(unidade, material), quantidade, (unidade, material))
+        for unidade in UNIDADES:
+            registros = Counter((unidade, r["material"]) for r in data_store.get_historico_consumo(unidade))
+            self.assertEqual(registros, Counter({k: v for k, v in contagens.items() if k[0] == unidade}))
+
+    def test_memoria(self):
+        data_store = StockData()
+        parar = threading.Event()
+        inconsistentes = []
+
+        def contar(instantaneo):
+            registros = sum(len(h) for h in instantaneo.historico_consumo.values())
+            agregados = sum(a["num_consumos"] for a in instantaneo.agregar_consumo_por_material().values())
+            return registros, agregados
+
+        def instantaneos():
+            # cada instantâneo vê cada escrita inteira ou não a vê, e não muda depois de criado
+            while not parar.is_set():
+                instantaneo = data_store.instantaneo()
+                antes = contar(instantaneo)
+                time.sleep(0.001)
+                depois = contar(instantaneo)
+                if antes[0] != antes[1] or depois != antes:
+                    inconsistentes.append((antes, depois))
+
+        leitor = threading.Thread(target=instantaneos)
+        leitor.start()
+        try:
+            esperado, contagens = executar_concorrente(SistemaGestaoEstoque(data_store, sink=SinkSilencioso()))
+        finally:
+            parar.set()
+            leitor.join()
+        self.conferir(data_store, esperado, contagens)
+        self.assertEqual(inconsistentes, [])
+
+    def test_memoria_com_log(self):
+        # o log grava cada unidade na ordem de aplicação: a recuperação chega ao mesmo estado
+        diretorio = os.path.join(self._diretorio.name, "wal")
+        data_store = StockData(diretorio, intervalo_snapshot=500)
+        try:
+            esperado, contagens = executar_concorrente(SistemaGestaoEstoque(data_store, sink=SinkSilencioso()))
+            self.conferir(data_store, esperado, contagens)
+        finally:
+            data_store.fechar()
+        recuperado = StockData(diretorio)
+        try:
+            self.conferir(recuperado, esperado, contagens)
+        finally:
+            recuperado.fechar()
+
+    def test_sqlite(self):
+        data_store = SQLiteStockData(os.path.join(self._diretorio.name, "estoque.db"))
+        try:
+            esperado, contagens = executar_concorrente(
+                SistemaGestaoEstoque(data_store, sink=SinkSilencioso()), operacoes_por_thread=200
+            )
+            self.conferir(data_store, esperado, contagens)
+        finally:
+            data_store.fechar()
+
+
+if __name__ == "__main__":
+    unittest.main()
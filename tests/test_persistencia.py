@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from data_layer.persistence import PersistenciaEstoque
+from data_layer.storage import StockData
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def executar_e_derrubar(diretorio, codigo):
+    """roda `codigo` com `store` aberto em `diretorio` num processo que termina sem fechar nada (queda)."""
+    programa = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {RAIZ!r})
+        from data_layer import persistence
+        from data_layer.storage import StockData
+    """) + textwrap.dedent(codigo) + "\nos._exit(0)\n"
+    subprocess.run([sys.executable, "-c", programa.replace("DIRETORIO", repr(diretorio))], check=True)
+
+
+class TestePersistencia(unittest.TestCase):
+    def setUp(self):
+        self._diretorio = tempfile.TemporaryDirectory()
+        self.diretorio = self._diretorio.name
+
+    def tearDown(self):
+        self._diretorio.cleanup()
+
+    def test_escrita_retornada_sobrevive_a_queda(self):
+        # intervalo de commit longo: só o aguardo do commit deixa o registro em disco antes do retorno
+        executar_e_derrubar(self.diretorio, """
+            store = StockData(DIRETORIO, intervalo_commit=10)
+            store.update_estoque("UN1", "Luvas", 42)
+        """)
+        store = StockData(self.diretorio)
+        try:
+            self.assertEqual(store.get_estoque("UN1", "Luvas"), 42)
+        finally:
+            store.fechar()
+
+    def test_queda_durante_snapshot(self):
+        # o log rotacionado continua valendo até o snapshot que o cobre estar em disco
+        executar_e_derrubar(self.diretorio, """
+            persistence.PersistenciaEstoque.gravar_snapshot = lambda *args: os._exit(0)
+            store = StockData(DIRETORIO, intervalo_snapshot=5)
+            for i in range(8):
+                store.update_estoque("UN1", "Luvas", i)
+        """)
+        self.assertTrue(os.path.exists(os.path.join(self.diretorio, PersistenciaEstoque.ARQUIVO_LOG_ANTERIOR)))
+        store = StockData(self.diretorio, intervalo_snapshot=5)
+        try:
+            self.assertEqual(store.get_estoque("UN1", "Luvas"), 4)
+            for i in range(6):
+                store.update_estoque("UN2", "Luvas", i)
+        finally:
+            store.fechar()
+        self.assertFalse(os.path.exists(os.path.join(self.diretorio, PersistenciaEstoque.ARQUIVO_LOG_ANTERIOR)))
+        store = StockData(self.diretorio)
+        try:
+            self.assertEqual((store.get_estoque("UN1", "Luvas"), store.get_estoque("UN2", "Luvas")), (4, 5))
+        finally:
+            store.fechar()
+
+
+if __name__ == "__main__":
+    unittest.main()